@@ -0,0 +1,46 @@
+from typing import List, Any, Callable, Optional, Awaitable
+from fastapi import Request, Response # type: ignore
+from fastapi.encoders import jsonable_encoder # type: ignore
+from shared.cache import cache, CACHE_TTL
+from shared.logger import logger
+import hashlib, json
+
+
+def cache_key(request: Request) -> str:
+    '''
+    Builds a cache key from the endpoint path and the sorted query parameters.
+    '''
+    params = '&'.join(f'{k}={v}' for k, v in sorted(request.query_params.multi_items()))
+    return f'{request.url.path}?{params}'
+
+
+async def cached_response(request: Request, tags: List[str], build: Callable[[], Awaitable[Any]], ttl: Optional[int] = None) -> Response:
+    '''
+    Returns the cached JSON body for a request or builds, encodes and caches it.
+    Adds ETag and Cache-Control headers and answers with 304 Not Modified if the client's If-None-Match matches.
+
+    Args:
+        request: The incoming request
+        tags: Cache tags used to invalidate the entry when the underlying data changes, e.g. product:1
+        build: Coroutine function returning the response data on a cache miss
+        ttl: Seconds to keep the entry, defaults to CACHE_TTL
+    '''
+    ttl = ttl or CACHE_TTL
+    key = cache_key(request)
+    try:
+        body = cache.get(key)
+    except Exception as e:
+        logger.error(f'Error reading from cache: {e}')
+        body = None
+    if body is None:
+        body = json.dumps(jsonable_encoder(await build()), separators=(',', ':')).encode()
+        try:
+            cache.set(key, body, ttl, tags)
+        except Exception as e:
+            logger.error(f'Error writing to cache: {e}')
+
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={min(ttl, 60)}'}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
@@ -0,0 +1,33 @@
+from fastapi import FastAPI, Request # type: ignore
+from prometheus_client import Histogram, make_asgi_app # type: ignore
+from shared.db.instrumentation import track_queries
+
+
+REQUEST_DB_QUERIES = Histogram(
+    'api_request_db_queries', 'Database statements per request', ['route'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+REQUEST_DB_SECONDS = Histogram(
+    'api_request_db_seconds', 'Database time per request', ['route'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+
+def add_query_instrumentation(app: FastAPI):
+    '''
+    Adds the number of database statements and the database time of every request as X-DB-Queries and
+    X-DB-Time-Ms response headers and Prometheus histograms per route, served on /metrics.
+    Statements are only counted on engines instrumented with DB_INSTRUMENT=1.
+    '''
+    @app.middleware('http')
+    async def count_queries(request: Request, call_next):
+        with track_queries() as stats:
+            response = await call_next(request)
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')
+        REQUEST_DB_QUERIES.labels(route=route).observe(stats.count)
+        REQUEST_DB_SECONDS.labels(route=route).observe(stats.duration)
+        response.headers['X-DB-Queries'] = str(stats.count)
+        response.headers['X-DB-Time-Ms'] = f'{stats.duration * 1000:.1f}'
+        return response
+
+    app.mount('/metrics', make_asgi_app())
@@ -1,21 +1,93 @@
 import sys
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+import datetime, threading
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple, Literal
 
 project_root = str(Path(__file__).parent.parent)
 sys.path.append(project_root)
 
-from fastapi import FastAPI, Query # type: ignore
+from fastapi import FastAPI, Query, HTTPException, Request # type: ignore
+from apscheduler.schedulers.background import BackgroundScheduler # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
-from shared.db.database import Database
-from shared.schemas import ProductSchema, PriceSchema, ProductListingSchema
-from shared.db.services.product_service import ProductService
-from shared.db.services.price_service import PriceService
+from shared.db.database import Database, AsyncDatabase
+from shared.schemas import ProductSchema, PriceSchema, ProductListingSchema, ProductOfferSchema, SimilarProductSchema
+from shared.db.services.product_service import ProductService, decode_listing_cursor
 from shared.db.services.retailer_service import RetailerService
+from shared.db.services.async_product_service import AsyncProductService
+from shared.db.services.async_price_service import AsyncPriceService
+from shared.db.services.async_offer_summary_service import AsyncOfferSummaryService
+from shared.db.services.async_similarity_service import AsyncSimilarityService
+from shared.logger import logger, setup_logging
+from shared.search_index import ProductSearchIndex
+from api.http_cache import cached_response
+from api.instrumentation import add_query_instrumentation
 
 
-app = FastAPI()
+setup_logging()
 db = Database()
+async_db = AsyncDatabase()
+
+# Product page views are counted in memory and flushed periodically, so cached product responses need no database write
+view_counts = Counter()
+view_counts_lock = threading.Lock()
+
+
+def flush_view_counts():
+    with view_counts_lock:
+        counts = dict(view_counts)
+        view_counts.clear()
+    if not counts:
+        return
+    try:
+        with db.get_session() as session:
+            ProductService(session).record_views(counts)
+    except Exception as e:
+        logger.error(f'Error flushing view counts: {e}')
+
+
+# In-memory product search index, refreshed incrementally from products changed since the last refresh
+search_index = ProductSearchIndex()
+search_index_state = {'changed_since': None, 'after_id': 0}
+
+
+def refresh_search_index():
+    try:
+        with db.get_session() as session:
+            product_service = ProductService(session)
+            documents = product_service.get_search_documents(**search_index_state)
+            product_ids = product_service.get_ids()
+    except Exception as e:
+        logger.error(f'Error refreshing search index: {e}')
+        return
+    removed = search_index.retain(product_ids)
+    if removed:
+        logger.info(f'Removed {removed} deleted products from search')
+    if not documents:
+        return
+    search_index.upsert(documents)
+    changed = [d['created_at'] for d in documents if d['created_at']]
+    if changed:
+        search_index_state['changed_since'] = max([search_index_state['changed_since'] or changed[0], *changed])
+    search_index_state['after_id'] = max(search_index_state['after_id'], *[d['id'] for d in documents])
+    logger.info(f'Indexed {len(documents)} products for search')
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    refresh_search_index()
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(flush_view_counts, 'interval', seconds=60)
+    scheduler.add_job(refresh_search_index, 'interval', seconds=60)
+    scheduler.start()
+    yield
+    scheduler.shutdown(wait=False)
+    flush_view_counts()
+    await async_db.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -23,15 +95,18 @@ app.add_middleware(
     allow_origins=['http://localhost:3000'],
     allow_credentials=True,
     allow_methods=['GET'],
-    allow_headers=['Authorization', 'Content-Type']
+    allow_headers=['Authorization', 'Content-Type'],
+    expose_headers=['X-DB-Queries', 'X-DB-Time-Ms']
 )
+add_query_instrumentation(app)
 
 
 @app.get('/manufacturers', response_model=List[Dict[str, Any]])
-async def get_manufacturers():
+def get_manufacturers():
     '''
     NOT CURRENTLY USED.
     Returns a list of manufacturer names and their ID.
+    Declared without async so FastAPI runs the synchronous session in its threadpool.
     '''
     with db.get_session() as session:
         retailer_service = RetailerService(session)
@@ -52,50 +127,150 @@ async def get_product_autocomplete():
     NOT CURRENTLY USED. autocompleteProducts store is populated through the products.json.
     Gets ID and name for all products for the autocomplete search.
     '''
-    with db.get_session() as session:
-        product_service = ProductService(session)
-        return product_service.get_autocomplete()
+    async with async_db.get_session() as session:
+        product_service = AsyncProductService(session)
+        return await product_service.get_autocomplete()
+
+
+@app.get('/products/search', response_model=List[Dict[str, Any]])
+async def search_products(
+    q: str = Query(min_length=1, max_length=100),
+    limit: int = Query(default=10, le=50),
+    manufacturer: Optional[str] = None
+):
+    '''
+    Returns the best matching products for a search text, manufacturer_id or EAN.
+    Matches words by prefix and falls back to fuzzy matching. Replaces downloading the whole catalog for autocomplete.
+    '''
+    return [
+        {
+            'id': d['id'],
+            'manufacturer': d['manufacturer'],
+            'manufacturer_id': d['manufacturer_id'],
+            'name': d['name']
+        }
+        for d in search_index.search(q, k=limit, manufacturer=manufacturer)
+    ]
+
+
+@app.get('/products/best_offers', response_model=List[ProductOfferSchema])
+async def get_best_offers(
+    request: Request,
+    manufacturer: Optional[str] = None,
+    sort: Literal['price', 'discount'] = 'price',
+    min_discount: Optional[float] = None,
+    max_price: Optional[float] = None,
+    limit: int = 20,
+    offset: int = 0
+):
+    '''
+    Returns products with at least one price in stock with their best offer,
+    sorted by lowest price or by highest discount vs the rrp.
+    '''
+    async def build():
+        async with async_db.get_session() as session:
+            offer_summary_service = AsyncOfferSummaryService(session)
+            return await offer_summary_service.get_best_offers(
+                manufacturer=manufacturer,
+                sort=sort,
+                min_discount=min_discount,
+                max_price=max_price,
+                limit=limit,
+                offset=offset
+            )
+    return await cached_response(request, ['best_offers'], build)
 
 
 @app.get('/products/{id}', response_model=ProductSchema)
-async def get_product(id: int):
+async def get_product(id: int, request: Request):
     '''
     USED: Product detail page.
     Returns a product by its ID.
     '''
-    with db.get_session() as session:
-        product_service = ProductService(session)
-        return product_service.get_by_id(id)
+    async def build():
+        async with async_db.get_session() as session:
+            product_service = AsyncProductService(session)
+            product = await product_service.get_by_id(id)
+        if not product:
+            raise HTTPException(status_code=404, detail=f'Product {id} not found')
+        return product
+    response = await cached_response(request, [f'product:{id}'], build)
+    with view_counts_lock:
+        view_counts[id] += 1
+    return response
     
 
 @app.get('/products/{product_id}/prices', response_model=List[PriceSchema])
-async def get_product_prices(product_id: int):
+async def get_product_prices(
+    request: Request,
+    product_id: int,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    resolution: Optional[Literal['hour', 'day', 'week', 'month']] = None
+):
     '''
     USED: Product detail page.
     Returns a list of prices for a given product.
+    The price history can be limited to a time range and downsampled to the lowest price per hour, day, week or month.
     '''
-    with db.get_session() as session:
-        price_service = PriceService(session)
-        return price_service.get_by_product_id(product_id)
+    async def build():
+        async with async_db.get_session() as session:
+            price_service = AsyncPriceService(session)
+            return await price_service.get_by_product_id(product_id, start=start, end=end, resolution=resolution)
+    return await cached_response(request, [f'product:{product_id}'], build)
+    
+
+@app.get('/products/{product_id}/similar', response_model=List[SimilarProductSchema])
+async def get_similar_products(
+    request: Request,
+    product_id: int,
+    limit: int = Query(default=10, le=50),
+    manufacturer: Optional[str] = None,
+    in_stock: bool = False
+):
+    '''
+    Returns the products most similar to a product by their content embeddings, most similar first.
+    Can be restricted to a manufacturer and to products with at least one price in stock.
+    '''
+    async def build():
+        async with async_db.get_session() as session:
+            similarity_service = AsyncSimilarityService(session)
+            return await similarity_service.get_similar_products(product_id, k=limit, manufacturer=manufacturer, in_stock=in_stock)
+    tags = [f'product:{product_id}'] + (['best_offers'] if in_stock else [])
+    return await cached_response(request, tags, build)
     
 
-@app.get('/manufacturers/{manufacturer}/product_listings', response_model=Tuple[List[ProductListingSchema], int])
+@app.get('/manufacturers/{manufacturer}/product_listings', response_model=Tuple[List[ProductListingSchema], Optional[int], Optional[str]])
 async def get_product_listings(
+    request: Request,
     manufacturer: str,
     release_year: List[int] = Query(default=[]),
     limit: int = 20,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    include_total: bool = True
 ):
     '''
     USED: Manufacturer product listing page.
-    Incrementally returns a list of ProductListingSchemas for a given manufacturer.
+    Incrementally returns a list of ProductListingSchemas for a given manufacturer, the total count and a cursor for the next page.
+    Pass the cursor of the previous response to get the next page (offset is ignored then) and set include_total=false
+    to skip counting when the total is already known.
     Allows specifying a list of release years. Will only return products with at least one price in stock.
     '''
-    with db.get_session() as session:
-        product_service = ProductService(session)
-        return product_service.get_available_products_by_manufacturer(
-            manufacturer=manufacturer,
-            release_year=release_year,
-            limit=limit,
-            offset=offset
-        )
\ No newline at end of file
+    if cursor:
+        try:
+            decode_listing_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f'Invalid cursor: {cursor}')
+    async def build():
+        async with async_db.get_session() as session:
+            product_service = AsyncProductService(session)
+            return await product_service.get_available_products_by_manufacturer(
+                manufacturer=manufacturer,
+                release_year=release_year,
+                limit=limit,
+                offset=offset,
+                cursor=cursor,
+                include_total=include_total
+            )
+    return await cached_response(request, [f'manufacturer:{manufacturer}'], build)
\ No newline at end of file
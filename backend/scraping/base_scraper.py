@@ -1,10 +1,18 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple, Iterable, Iterator, Set
+from concurrent.futures import ThreadPoolExecutor
 from seleniumbase import Driver # type: ignore
+from selenium.webdriver.support.ui import WebDriverWait # type: ignore
+from selenium.common.exceptions import TimeoutException # type: ignore
+from scraping.http_client import HttpClient
+from scraping.driver_pool import DriverPool, DriverKey, driver_pool as shared_driver_pool
+from scraping.sitemap_crawler import SitemapCrawler
+from scraping.metrics import RunMetrics, record_driver_pool
+from scraping.resource_policy import resource_settings, blocked_url_patterns, apply_blocked_urls
 from shared.db.models import Product
 from shared.schemas import ProductSchema, PriceSchema, RetailerConfig
 from shared.logger import logger
-import os, datetime
+import os, datetime, itertools, logging, threading, time
 
 
 class BaseScraper(ABC):
@@ -12,60 +20,143 @@ class BaseScraper(ABC):
     Abstract class for a product data scraper.
     TODO: scraping_mode is redundant, also contained in RetailerConfig
     '''
-    def __init__(self, retailer_config: RetailerConfig):
+    def __init__(
+        self,
+        retailer_config: RetailerConfig,
+        driver_factory: Optional[Callable[[], Driver]] = None,
+        driver_pool: Optional[DriverPool] = None
+    ):
         self.take_screenshots = retailer_config.take_screenshots
         self.retailer_config = retailer_config
         self.scraping_mode = retailer_config.scraping_method
         self.selenium_settings = retailer_config.selenium_settings
+        self.resource_settings = resource_settings(self.selenium_settings)
+        self.blocked_url_patterns = blocked_url_patterns(self.selenium_settings)
+        self.page_stats = {'pages': 0, 'load_ms': 0.0, 'bytes': 0, 'selector_timeouts': 0} # see _open_page
+        self._page_stats_lock = threading.Lock()
+        self.retailer_label = str(getattr(retailer_config, 'name', None) or retailer_config.id or retailer_config.base_url) # metrics label
+        self._run_metrics: Optional[RunMetrics] = None # set by run
+        self.concurrency = max(1, retailer_config.concurrency)
+        self.driver_recycle_after = retailer_config.driver_recycle_after
+        self._driver_factory = driver_factory # e.g. a FakeDriver in tests, bypasses the driver pool
+        self.driver_pool = driver_pool or shared_driver_pool
+        self.http_settings = retailer_config.http_settings
+        self.http_client = HttpClient(
+            max_connections_per_host=self.http_settings.get('max_connections_per_host', 4),
+            timeout=self.http_settings.get('timeout', 15)
+        )
+        self.sitemap_settings = retailer_config.sitemap_settings
+        self.known_lastmods: Dict[str, Optional[datetime.datetime]] = {} # set from SitemapService.get_lastmods before run
+        self.scraped_lastmods: Dict[str, Tuple[int, Optional[datetime.datetime]]] = {} # to persist with SitemapService.save_lastmods after run
+        self.skipped_product_ids: Set[int] = set() # products the last run skipped: unchanged lastmod or not in the sitemap
+        self._sitemap_urls: Dict[int, Tuple[str, Optional[datetime.datetime]]] = {}
+        self._proxy_warning_logged = False
     
 
-    def _initialize_driver(self) -> Driver:
+    def _driver_key(self, fallback: bool = False) -> DriverKey:
         '''
-        Creates a Selenium driver using Selenium Base using the configs in RetailerConfig.
+        Returns the driver pool key for the configs in RetailerConfig. Retailers with the same key share warm drivers.
+
+        Args:
+            fallback: The driver scrapes products with scrape_product_ui after their plain HTTP request failed,
+                so the restrictions for capturing API requests with the driver do not apply
         '''
-        if self.scraping_mode == 'ui':
-            if self.selenium_settings['mode'] == 'uc':
-                try:
-                    driver = Driver(uc=True, headless=not self.selenium_settings['headed'], proxy=self.selenium_settings['proxy'])
-                    driver.set_window_size(1920, 1080)
-                    return driver
-                except Exception as e:
-                    raise Exception(f'Error initializing driver: {e}')
-            else:
-                try:
-                    driver = Driver(wire=True, headless=self.selenium_settings['headed'], proxy=self.selenium_settings['proxy'])
-                    driver.set_window_size(1920, 1080)
-                    return driver
-                except Exception as e:
-                    raise Exception(f'Error initializing driver: {e}')
-        elif self.scraping_mode == 'api':
-            self._log_event('warning', 'Using a proxy will probably interfere with capturing API requests. Use UI or SITEMAP mode instead.')
+        if self.scraping_mode not in ('ui', 'api', 'sitemap'):
+            raise ValueError(f'Invalid value for scraping_method: {self.scraping_mode}')
+        if self.scraping_mode == 'api' and not fallback:
+            if self.selenium_settings['proxy'] and not self._proxy_warning_logged:
+                self._proxy_warning_logged = True
+                self._log_event('warning', 'Using a proxy will probably interfere with capturing API requests. Use UI or SITEMAP mode instead.')
             if self.selenium_settings['mode'] == 'uc':
                 raise Exception('UC mode is not supported for API scraping. Use UI or SITEMAP mode instead.')
-            else:
-                try:
-                    driver = Driver(wire=True, headless=self.selenium_settings['headed'], proxy=self.selenium_settings['proxy'])
-                    driver.set_window_size(1920, 1080)
-                    return driver
-                except Exception as e:
-                    raise Exception(f'Error initializing driver: {e}')
-        elif self.scraping_mode == 'sitemap':
-            if self.selenium_settings['mode'] == 'uc':
-                try:
-                    driver = Driver(uc=True, headless=not self.selenium_settings['headed'], proxy=self.selenium_settings['proxy'])
-                    driver.set_window_size(1920, 1080)
-                    return driver
-                except Exception as e:
-                    raise Exception(f'Error initializing driver: {e}')
-            else:
-                try:
-                    driver = Driver(wire=True, headless=self.selenium_settings['headed'], proxy=self.selenium_settings['proxy'])
-                    driver.set_window_size(1920, 1080)
-                    return driver
-                except Exception as e:
-                    raise Exception(f'Error initializing driver: {e}')
-        else:
-            raise ValueError(f'Invalid value for scraping_method: {e}')
+        mode = 'uc' if self.selenium_settings['mode'] == 'uc' else 'wire'
+        return (mode, not self.selenium_settings['headed'], self.selenium_settings['proxy'], self.resource_settings['page_load_strategy'])
+
+
+    def _lease_driver(self, fallback: bool = False) -> Driver:
+        '''
+        Leases a warm driver from the driver pool, or creates one with driver_factory if it was given,
+        and blocks the resources configured in selenium_settings for this retailer.
+
+        Args:
+            fallback: The driver is used for products that failed with plain HTTP, see _driver_key
+        '''
+        start = time.perf_counter()
+        driver = self._driver_factory() if self._driver_factory else self.driver_pool.lease(self._driver_key(fallback))
+        if self._run_metrics:
+            self._run_metrics.observe_driver_init(time.perf_counter() - start)
+        if self.blocked_url_patterns:
+            try:
+                apply_blocked_urls(driver, self.blocked_url_patterns)
+            except Exception as e:
+                self._log_event('warning', f'Error blocking resources: {str(e)}')
+        return driver
+
+
+    def _release_driver(self, driver: Driver, pages: int = 0, discard: bool = False):
+        '''
+        Returns a driver to the driver pool (or quits it if it came from driver_factory).
+        '''
+        if self._driver_factory:
+            self._quit_driver(driver)
+            return
+        self.driver_pool.release(driver, pages=pages, discard=discard)
+
+
+    def _open_page(self, driver: Driver, url: str):
+        '''
+        Opens a page and waits for wait_for_selector from selenium_settings if set, instead of relying on the full page load.
+        Records the load time and the bytes transferred by the page in page_stats. Scrapers open product pages with this.
+        '''
+        start = time.perf_counter()
+        driver.get(url)
+        selector = self.resource_settings['wait_for_selector']
+        timed_out = False
+        if selector:
+            try:
+                WebDriverWait(driver, self.resource_settings['wait_timeout']).until(
+                    lambda d: d.find_elements('css selector', selector)
+                )
+            except TimeoutException:
+                timed_out = True
+                self._log_event('warning', f'Timed out waiting for {selector}', sample_rate=0.1, url=url)
+        load_ms = (time.perf_counter() - start) * 1000
+        transferred = self._transferred_bytes(driver)
+        with self._page_stats_lock:
+            self.page_stats['pages'] += 1
+            self.page_stats['load_ms'] += load_ms
+            self.page_stats['bytes'] += transferred
+            self.page_stats['selector_timeouts'] += timed_out
+
+
+    def _transferred_bytes(self, driver: Driver) -> int:
+        '''
+        Returns the bytes transferred over the network for the current page and its resources (Resource Timing API).
+        '''
+        try:
+            return int(driver.execute_script(
+                "return performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))"
+                ".reduce((total, entry) => total + (entry.transferSize || 0), 0)"
+            ) or 0)
+        except Exception:
+            return 0
+
+
+    def _log_page_stats(self):
+        with self._page_stats_lock:
+            stats = dict(self.page_stats)
+        if not stats['pages']:
+            return
+        self._log_event(
+            'info',
+            'Page stats',
+            pages=stats['pages'],
+            avg_load_ms=round(stats['load_ms'] / stats['pages'], 1),
+            avg_kb=round(stats['bytes'] / stats['pages'] / 1024, 1),
+            selector_timeouts=stats['selector_timeouts'],
+            page_load_strategy=self.resource_settings['page_load_strategy'],
+            blocked_patterns=len(self.blocked_url_patterns)
+        )
 
 
     def _take_screenshot(self, driver: Driver):
@@ -81,21 +172,21 @@ class BaseScraper(ABC):
         driver.save_screenshot(screenshot_path)
 
 
-    def _log_event(self, level, message, **kwargs):
+    def _log_event(self, level, message, sample_rate: float = 1.0, **kwargs):
         '''
-        Logs an event with the given level and message.
+        Logs an event with the given level and message. The retailer, scraper and kwargs become fields of the JSON log line.
 
         Args:
             level: The log level (e.g., 'info', 'warning', 'error')
             message: The log message
-            **kwargs: Additional keyword arguments for formatting the message
+            sample_rate: Fraction of these events to log, for high-volume per-product events that are also counted as metrics
+            **kwargs: Additional fields
         '''
-        log_data = {
-            'retailer': getattr(self.retailer_config, 'name', None),
-            'scraper': self.__class__.__name__,
-            **kwargs
-        }
-        getattr(logger, level)(f'{message} | {log_data}')
+        log = getattr(logger, level)
+        if not logger.isEnabledFor(getattr(logging, level.upper())):
+            return
+        fields = {'retailer': self.retailer_label, 'scraper': self.__class__.__name__, **kwargs}
+        log(message, extra={'fields': fields, 'sample_rate': sample_rate})
 
 
     @abstractmethod
@@ -109,20 +200,42 @@ class BaseScraper(ABC):
         pass
 
 
-    @abstractmethod
-    def scrape_product_api(self, driver: Driver, product: ProductSchema) -> Optional[PriceSchema]:
+    def get_product_url(self, product: ProductSchema) -> Optional[str]:
         '''
-        Implement later
+        Returns the URL to fetch without a browser for a product: a JSON endpoint in api mode, the product page in sitemap mode.
+        Defaults to the URL found in the sitemap. Scrapers using the api mode override this.
+        Returns None if the product has no known URL.
         '''
-        pass
+        entry = self._sitemap_urls.get(product.id)
+        return entry[0] if entry else None
 
 
-    @abstractmethod
-    def scrape_product_sitemap(self, driver: Driver, product: ProductSchema) -> Optional[PriceSchema]:
+    def scrape_product_api(self, driver: Optional[Driver], product: ProductSchema) -> Optional[PriceSchema]:
         '''
-        Implement later
+        Fetches the JSON endpoint from get_product_url with plain HTTP and passes the decoded JSON to _parse_price_schema.
+
+        Args:
+            driver: Not used, the request is made by self.http_client
+            product: ProductSchema to scrape
         '''
-        pass
+        url = self.get_product_url(product)
+        if not url:
+            return None
+        return self._parse_price_schema(product, self.http_client.get_json(url))
+
+
+    def scrape_product_sitemap(self, driver: Optional[Driver], product: ProductSchema) -> Optional[PriceSchema]:
+        '''
+        Fetches the product page from get_product_url with plain HTTP and passes {'url': ..., 'html': ...} to _parse_price_schema.
+
+        Args:
+            driver: Not used, the request is made by self.http_client
+            product: ProductSchema to scrape
+        '''
+        url = self.get_product_url(product)
+        if not url:
+            return None
+        return self._parse_price_schema(product, {'url': url, 'html': self.http_client.get(url)})
 
     
     @abstractmethod
@@ -133,9 +246,167 @@ class BaseScraper(ABC):
         pass
 
 
+    def _is_driver_alive(self, driver: Driver) -> bool:
+        '''
+        Checks whether the browser behind a driver still responds.
+        '''
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+
+    def _quit_driver(self, driver: Driver):
+        '''
+        Quits a driver, ignoring errors from browsers that already crashed.
+        '''
+        try:
+            driver.quit()
+        except Exception as e:
+            self._log_event('warning', f'Error quitting driver: {str(e)}')
+
+
+    def _run_worker(
+        self,
+        products: List[ProductSchema],
+        scrape: Callable[[Driver, ProductSchema], Optional[PriceSchema]],
+        mode: str = 'ui'
+    ) -> List[PriceSchema]:
+        '''
+        Scrapes a list of products sequentially with one leased driver.
+        The driver is replaced after driver_recycle_after pages and whenever it crashed.
+        Errors are isolated per product.
+
+        Args:
+            products: List of ProductSchema instances to scrape
+            scrape: The scrape method to call for each product, e.g. scrape_product_ui
+            mode: Metrics label, 'ui' or 'fallback' for products that failed with plain HTTP
+        '''
+        results = []
+        driver = self._lease_driver(fallback=mode == 'fallback')
+        pages = 0
+        try:
+            for product in products:
+                if self.driver_recycle_after and pages >= self.driver_recycle_after:
+                    self._log_event('info', f'Recycling driver after {pages} pages')
+                    self._release_driver(driver, pages, discard=True)
+                    driver = self._lease_driver(fallback=mode == 'fallback')
+                    pages = 0
+                pages += 1
+                start = time.perf_counter()
+                try:
+                    result: Optional[PriceSchema] = scrape(driver, product)
+                    self._observe(mode, start, 'success' if result else 'not_found')
+                    if result:
+                        results.append(result)
+                except Exception as e:
+                    self._observe(mode, start, 'failure')
+                    self._log_event('error', f'Error scraping product {product.manufacturer_id}. Now scraping next product: {str(e)}')
+                    if not self._is_driver_alive(driver):
+                        self._log_event('warning', 'Driver crashed. Starting a new driver')
+                        self._release_driver(driver, pages, discard=True)
+                        driver = self._lease_driver(fallback=mode == 'fallback')
+                        pages = 0
+                    continue
+            return results
+        finally:
+            if driver:
+                self._release_driver(driver, pages)
+
+
+    def _run_pool(self, products: List[ProductSchema], scrape: Callable[[Driver, ProductSchema], Optional[PriceSchema]]) -> List[PriceSchema]:
+        '''
+        Shards the products across self.concurrency drivers that scrape in parallel threads and merges their results.
+        A worker that fails entirely (e.g. its driver cannot be started) only loses its own shard.
+
+        Args:
+            products: List of ProductSchema instances to scrape
+            scrape: The scrape method to call for each product
+        '''
+        shards = [products[i::self.concurrency] for i in range(self.concurrency)]
+        shards = [shard for shard in shards if shard]
+        if not self._driver_factory:
+            self.driver_pool.warm(self._driver_key(), len(shards)) # start the browsers in parallel
+        results = []
+        with ThreadPoolExecutor(max_workers=len(shards) or 1) as executor:
+            futures = [executor.submit(self._run_worker, shard, scrape) for shard in shards]
+            for i, future in enumerate(futures):
+                try:
+                    results.extend(future.result())
+                except Exception as e:
+                    self._log_event('error', f'Worker {i} failed. Skipping {len(shards[i])} products: {str(e)}')
+        return results
+
+
+    def _run_http(self, products: List[ProductSchema], scrape: Callable[[Optional[Driver], ProductSchema], Optional[PriceSchema]]) -> List[PriceSchema]:
+        '''
+        Scrapes a list of products with plain HTTP requests in a thread pool.
+        Products whose request or parsing failed are scraped again with the driver via scrape_product_ui,
+        unless fallback_to_ui is disabled in http_settings.
+
+        Args:
+            products: List of ProductSchema instances to scrape
+            scrape: scrape_product_api or scrape_product_sitemap
+        '''
+        results = []
+        failed = []
+
+        def scrape_one(product: ProductSchema) -> Optional[PriceSchema]:
+            start = time.perf_counter()
+            try:
+                result = scrape(None, product)
+                self._observe('http', start, 'success' if result else 'not_found')
+                return result
+            except Exception as e:
+                self._observe('http', start, 'failure')
+                self._log_event('warning', f'HTTP scraping failed for product {product.manufacturer_id}: {str(e)}', sample_rate=0.1)
+                failed.append(product)
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.http_settings.get('workers', 8)) as executor:
+            for result in executor.map(scrape_one, products):
+                if result:
+                    results.append(result)
+
+        if failed and self.http_settings.get('fallback_to_ui', True):
+            self._log_event('info', f'Falling back to the driver for {len(failed)} products')
+            try:
+                results.extend(self._run_worker(failed, self.scrape_product_ui, mode='fallback'))
+            except Exception as e:
+                self._log_event('error', f'Driver fallback failed: {str(e)}')
+            self._log_page_stats()
+        return results
+
+
+    def _observe(self, mode: str, start: float, outcome: str):
+        if self._run_metrics:
+            self._run_metrics.observe(mode, time.perf_counter() - start, outcome)
+
+
+    def _select_sitemap_products(self, products: List[ProductSchema]) -> List[ProductSchema]:
+        '''
+        Reads the sitemap from sitemap_settings and returns only the products whose page is new or changed
+        since the lastmods in self.known_lastmods. Products that are not in the sitemap are skipped.
+        The skipped products are kept in self.skipped_product_ids, so callers can tell them from failed ones.
+        '''
+        crawler = SitemapCrawler(self.http_client, self.sitemap_settings.get('product_url_pattern'))
+        changed = crawler.find_changed(self.sitemap_settings['url'], products, self.known_lastmods)
+        self._sitemap_urls = {product.id: (url, lastmod) for product, url, lastmod in changed}
+        self.skipped_product_ids = {product.id for product in products} - set(self._sitemap_urls)
+        self._log_event('info', f'Sitemap: {len(changed)} of {len(products)} products to scrape')
+        return [product for product, _, _ in changed]
+
+
     def run(self, products: List[ProductSchema]) -> List[PriceSchema]:
         '''
         Scrapes prices for a list of products for the retailer defined in retailer_config.
+        Uses several drivers in parallel if concurrency is set to more than 1 in RetailerConfig.
+        Drivers are leased from the process-wide DriverPool, so consecutive runs reuse warm browsers.
+        The api and sitemap modes fetch products with plain HTTP and only start a driver for failed products.
+        With a sitemap URL configured, the sitemap mode only scrapes products whose page lastmod changed.
+        Records per-product latency, outcomes, driver init time and queue depth in the Prometheus metrics
+        (scraping/metrics.py) and logs a JSON summary line per run.
         Some scraper implementations override this method.
 
         Args:
@@ -144,24 +415,50 @@ class BaseScraper(ABC):
         Returns:
             List of PriceSchema objects containing the scraped price data
         '''
+        start = time.perf_counter()
+        self.skipped_product_ids = set()
+        self._run_metrics = RunMetrics(self.retailer_label, len(products))
+        try:
+            return self._run_mode(products)
+        finally:
+            self._log_event('info', 'Scrape run finished', mode=self.scraping_mode, **self._run_metrics.summary(time.perf_counter() - start))
+            record_driver_pool(self.driver_pool.metrics())
+
+
+    def run_batches(self, products: Iterable[ProductSchema], batch_size: int = 100) -> Iterator[List[PriceSchema]]:
+        '''
+        Scrapes products from an iterable, e.g. ProductService.iter_products_to_scrape, with one run per batch_size
+        products and yields the results of each run. Scraping starts as soon as the first batch is read,
+        and results can be saved per batch with PriceService.bulk_upsert.
+
+        Args:
+            products: Iterable of ProductSchema instances to scrape
+            batch_size: Number of products per run
+        '''
+        iterator = iter(products)
+        while batch := list(itertools.islice(iterator, batch_size)):
+            yield self.run(batch)
+
+
+    def _run_mode(self, products: List[ProductSchema]) -> List[PriceSchema]:
         if self.scraping_mode == 'ui':
-            driver = self._initialize_driver()
-            results = []
-            try:
-                for product in products:
-                    try:
-                        result: Optional[PriceSchema] = self.scrape_product_ui(driver, product)
-                        if result:
-                            results.append(result)
-                    except Exception as e:
-                        self._log_event('error', f'Error scraping product {product.manufacturer_id}. Now scraping next product: {str(e)}')
-                        continue
-                return results
-            finally:
-                driver.quit()
+            if self.concurrency > 1:
+                results = self._run_pool(products, self.scrape_product_ui)
+            else:
+                results = self._run_worker(products, self.scrape_product_ui)
+            self._log_event('info', 'Driver pool', **self.driver_pool.metrics())
+            self._log_page_stats()
+            return results
         elif self.scraping_mode == 'api':
-            pass
-            # implement later
+            return self._run_http(products, self.scrape_product_api)
         elif self.scraping_mode == 'sitemap':
-            pass
-            # implement later
\ No newline at end of file
+            if self.sitemap_settings.get('url'):
+                products = self._select_sitemap_products(products)
+                self._run_metrics.set_total(len(products))
+            results = self._run_http(products, self.scrape_product_sitemap)
+            for result in results:
+                if result.product_id in self._sitemap_urls:
+                    url, lastmod = self._sitemap_urls[result.product_id]
+                    self.scraped_lastmods[url] = (result.product_id, lastmod)
+            return results
+        raise ValueError(f'Invalid value for scraping_method: {self.scraping_mode}')
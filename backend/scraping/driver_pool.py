@@ -0,0 +1,263 @@
+from typing import Dict, List, Optional, Callable, Tuple, Any
+from collections import Counter
+from dataclasses import dataclass, field
+from seleniumbase import Driver # type: ignore
+from shared.logger import logger
+import psutil # type: ignore
+import threading, time
+
+
+DriverKey = Tuple[str, bool, Optional[str], str] # (mode, headless, proxy, page_load_strategy)
+
+
+def create_driver(key: DriverKey) -> Driver:
+    '''
+    Starts a SeleniumBase driver for a pool key: mode 'uc' (undetected Chrome) or 'wire' (selenium-wire, captures requests).
+    The page load strategy 'eager' returns from get() at DOMContentLoaded instead of waiting for all images and scripts.
+    '''
+    mode, headless, proxy, page_load_strategy = key
+    try:
+        if mode == 'uc':
+            driver = Driver(uc=True, headless=headless, proxy=proxy, page_load_strategy=page_load_strategy)
+        else:
+            driver = Driver(wire=True, headless=headless, proxy=proxy, page_load_strategy=page_load_strategy)
+        driver.set_window_size(1920, 1080)
+        return driver
+    except Exception as e:
+        raise Exception(f'Error initializing driver: {e}')
+
+
+@dataclass
+class PooledDriver:
+    driver: Any
+    key: DriverKey
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    pages: int = 0
+    leases: int = 0
+
+
+class DriverPool:
+    '''
+    Keeps started browsers warm between scraper runs and shares them across retailers with the same
+    (mode, headless, proxy, page_load_strategy).
+
+    Scrapers lease a driver, scrape and release it with the number of pages loaded. On release the driver is reset
+    (cookies and blocked URLs cleared, about:blank) and kept idle, unless it is unhealthy, loaded max_pages pages, uses more than
+    max_memory_mb or the key already has max_idle_per_key idle drivers; then it is quit. Idle drivers are
+    health-checked before they are leased again and quit after max_idle_seconds. Thread-safe.
+    '''
+    def __init__(
+        self,
+        factory: Callable[[DriverKey], Any] = create_driver,
+        max_idle_per_key: int = 2,
+        max_pages: Optional[int] = 500,
+        max_memory_mb: Optional[int] = 1500,
+        max_idle_seconds: int = 600
+    ):
+        '''
+        Args:
+            factory: Starts a driver for a key, e.g. a FakeDriver factory in tests
+            max_idle_per_key: Max number of idle drivers kept per key
+            max_pages: Recycle a driver after this many pages over all its leases
+            max_memory_mb: Recycle a driver whose browser processes use more memory (RSS) than this
+            max_idle_seconds: Quit drivers that were idle for longer than this
+        '''
+        self.factory = factory
+        self.max_idle_per_key = max_idle_per_key
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.max_idle_seconds = max_idle_seconds
+        self._idle: Dict[DriverKey, List[PooledDriver]] = {}
+        self._leased: Dict[int, PooledDriver] = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+
+    def lease(self, key: DriverKey) -> Any:
+        '''
+        Returns a healthy idle driver for the key or starts a new one.
+        '''
+        self._expire_idle()
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                pooled = idle.pop() if idle else None
+            if pooled is None:
+                pooled = PooledDriver(self.factory(key), key)
+                self._count('created')
+                break
+            if self._is_alive(pooled.driver):
+                self._count('reused')
+                break
+            self._discard(pooled, 'unhealthy')
+        pooled.leases += 1
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._leased[id(pooled.driver)] = pooled
+        return pooled.driver
+
+
+    def release(self, driver: Any, pages: int = 0, discard: bool = False):
+        '''
+        Returns a leased driver to the pool.
+
+        Args:
+            driver: A driver returned by lease
+            pages: Number of pages loaded during the lease
+            discard: Quit the driver instead of keeping it, e.g. after a crash
+        '''
+        with self._lock:
+            pooled = self._leased.pop(id(driver), None)
+        if pooled is None:
+            self._quit(driver)
+            return
+        pooled.pages += pages
+        pooled.last_used = time.monotonic()
+        reason = 'discarded' if discard else self._recycle_reason(pooled)
+        if reason:
+            self._discard(pooled, reason)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(pooled.key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(pooled)
+                return
+        self._discard(pooled, 'pool_full')
+
+
+    def warm(self, key: DriverKey, count: int = 1):
+        '''
+        Starts drivers for a key in parallel ahead of a run until count drivers are idle.
+        '''
+        with self._lock:
+            missing = min(count, self.max_idle_per_key) - len(self._idle.get(key, []))
+        threads = [threading.Thread(target=self._warm_one, args=(key,)) for _ in range(max(0, missing))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+    def metrics(self) -> Dict[str, Any]:
+        '''
+        Returns counters (created, reused, recycled_<reason>) and the current number of idle and leased drivers per key.
+        '''
+        with self._lock:
+            idle = {'/'.join(map(str, key)): len(drivers) for key, drivers in self._idle.items()}
+            leased = Counter('/'.join(map(str, pooled.key)) for pooled in self._leased.values())
+            stats = dict(self.stats)
+        return {**stats, 'idle': idle, 'leased': dict(leased)}
+
+
+    def close(self):
+        '''
+        Quits all idle drivers. Leased drivers are quit when they are released.
+        '''
+        with self._lock:
+            idle = [pooled for drivers in self._idle.values() for pooled in drivers]
+            self._idle.clear()
+        for pooled in idle:
+            self._quit(pooled.driver)
+
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+
+    def _warm_one(self, key: DriverKey):
+        try:
+            pooled = PooledDriver(self.factory(key), key)
+        except Exception as e:
+            logger.error(f'Error warming driver {key}: {e}')
+            return
+        self._count('created')
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(pooled)
+                return
+        self._quit(pooled.driver)
+
+
+    def _recycle_reason(self, pooled: PooledDriver) -> Optional[str]:
+        if self.max_pages and pooled.pages >= self.max_pages:
+            return 'max_pages'
+        if self.max_memory_mb:
+            memory = self._memory_mb(pooled.driver)
+            if memory is not None and memory > self.max_memory_mb:
+                return 'max_memory'
+        if not self._reset(pooled.driver):
+            return 'unhealthy'
+        return None
+
+
+    def _expire_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = []
+            for key, drivers in self._idle.items():
+                expired += [pooled for pooled in drivers if now - pooled.last_used > self.max_idle_seconds]
+                self._idle[key] = [pooled for pooled in drivers if now - pooled.last_used <= self.max_idle_seconds]
+        for pooled in expired:
+            self._discard(pooled, 'idle_timeout')
+
+
+    def _discard(self, pooled: PooledDriver, reason: str):
+        self._count(f'recycled_{reason}')
+        logger.info(f'Recycling driver {pooled.key} after {pooled.pages} pages and {pooled.leases} leases: {reason}')
+        self._quit(pooled.driver)
+
+
+    def _is_alive(self, driver: Any) -> bool:
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+
+    def _reset(self, driver: Any) -> bool:
+        '''
+        Clears the state a retailer left behind so the next lease starts clean. Returns False if the browser does not respond.
+        '''
+        try:
+            if hasattr(driver, 'execute_cdp_cmd'):
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': []})
+            elif hasattr(driver, 'delete_all_cookies'):
+                driver.delete_all_cookies()
+            driver.get('about:blank')
+            return True
+        except Exception:
+            return False
+
+
+    def _memory_mb(self, driver: Any) -> Optional[float]:
+        '''
+        Returns the resident memory of the driver's browser process tree, or None if it cannot be determined.
+        '''
+        pid = getattr(driver, 'browser_pid', None)
+        if pid is None:
+            service = getattr(driver, 'service', None)
+            process = getattr(service, 'process', None)
+            pid = getattr(process, 'pid', None)
+        if pid is None:
+            return None
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / 1024 / 1024
+        except Exception:
+            return None
+
+
+    def _quit(self, driver: Any):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f'Error quitting driver: {e}')
+
+
+driver_pool = DriverPool() # shared by all scrapers in the process
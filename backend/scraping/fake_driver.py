@@ -0,0 +1,60 @@
+from typing import Dict, List, Optional
+
+
+class FakeDriver:
+    '''
+    In-process stand-in for a SeleniumBase Driver to run scrapers without a browser.
+
+    Serves page sources from a dict of URL -> HTML. Pass a factory to BaseScraper, e.g.
+    MyScraper(retailer_config, driver_factory=lambda: FakeDriver(pages)).
+    Set crash_on to a set of URLs whose get() simulates a browser crash.
+    '''
+    def __init__(self, pages: Optional[Dict[str, str]] = None, crash_on: Optional[set] = None):
+        self.pages = pages or {}
+        self.crash_on = crash_on or set()
+        self.visited: List[str] = []
+        self.quit_called = False
+        self.crashed = False
+        self._current_url = 'about:blank'
+
+
+    def _check_alive(self):
+        if self.crashed or self.quit_called:
+            raise Exception('invalid session id')
+
+
+    @property
+    def current_url(self) -> str:
+        self._check_alive()
+        return self._current_url
+
+
+    @property
+    def page_source(self) -> str:
+        self._check_alive()
+        return self.pages.get(self._current_url, '')
+
+
+    def get(self, url: str):
+        self._check_alive()
+        self.visited.append(url)
+        if url in self.crash_on:
+            self.crashed = True
+            raise Exception(f'Browser crashed loading {url}')
+        self._current_url = url
+
+
+    def open(self, url: str):
+        self.get(url)
+
+
+    def set_window_size(self, width: int, height: int):
+        pass
+
+
+    def save_screenshot(self, path: str) -> bool:
+        return True
+
+
+    def quit(self):
+        self.quit_called = True
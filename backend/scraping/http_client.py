@@ -0,0 +1,154 @@
+from typing import Dict, Any, Optional, Tuple, Iterator, IO
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import threading, json, gzip
+import requests # type: ignore
+from requests.adapters import HTTPAdapter # type: ignore
+from urllib3.util.retry import Retry # type: ignore
+
+
+class HttpClient:
+    '''
+    Pooled HTTP client for scraping without a browser.
+
+    Keeps connections alive per host, limits the number of concurrent requests per host,
+    requests gzip-compressed responses and revalidates previously fetched URLs with
+    ETag/If-Modified-Since so unchanged pages are answered with 304 Not Modified.
+    The validators and bodies of the max_cached_urls most recently fetched URLs are kept for revalidation.
+    Safe to share between threads.
+    '''
+    def __init__(
+        self,
+        max_connections_per_host: int = 4,
+        timeout: float = 15,
+        retries: int = 2,
+        user_agent: Optional[str] = None,
+        max_cached_urls: int = 5000
+    ):
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.max_cached_urls = max_cached_urls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=max_connections_per_host,
+            max_retries=Retry(total=retries, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504])
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        self._lock = threading.Lock()
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._validators: OrderedDict[str, Tuple[Optional[str], Optional[str], str]] = OrderedDict() # url -> (etag, last_modified, body), LRU
+        self.stats = {'requests': 0, 'not_modified': 0}
+
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+            return self._host_limits[host]
+
+
+    def _cached(self, url: str) -> Optional[Tuple[Optional[str], Optional[str], str]]:
+        with self._lock:
+            cached = self._validators.get(url)
+            if cached:
+                self._validators.move_to_end(url)
+            return cached
+
+
+    def _cache(self, url: str, etag: Optional[str], last_modified: Optional[str], body: str):
+        with self._lock:
+            self._validators[url] = (etag, last_modified, body)
+            self._validators.move_to_end(url)
+            while len(self._validators) > self.max_cached_urls:
+                self._validators.popitem(last=False)
+
+
+    def _send(self, url: str, headers: Dict[str, str]) -> requests.Response:
+        with self._host_limit(url):
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        with self._lock:
+            self.stats['requests'] += 1
+        return response
+
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> str:
+        '''
+        Fetches a URL and returns the response body.
+        Returns the cached body if the server answers a conditional request with 304.
+        A 304 without a cached body (e.g. evicted in the meantime) is retried without the conditional headers.
+        Raises requests.HTTPError for error responses.
+
+        Args:
+            url: The URL to fetch
+            headers: Optional additional request headers
+        '''
+        request_headers = dict(headers or {})
+        cached = self._cached(url)
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                request_headers['If-None-Match'] = etag
+            if last_modified:
+                request_headers['If-Modified-Since'] = last_modified
+
+        response = self._send(url, request_headers)
+        if response.status_code == 304:
+            if cached:
+                with self._lock:
+                    self.stats['not_modified'] += 1
+                return cached[2]
+            unconditional = {
+                key: value for key, value in request_headers.items()
+                if key.lower() not in ('if-none-match', 'if-modified-since')
+            }
+            response = self._send(url, unconditional)
+            if response.status_code == 304:
+                raise requests.HTTPError(f'304 Not Modified without a cached body for {url}', response=response)
+        response.raise_for_status()
+
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self._cache(url, etag, last_modified, response.text)
+        return response.text
+
+
+    def get_json(self, url: str, headers: Optional[Dict[str, str]] = None) -> Any:
+        '''
+        Fetches a URL and parses the body as JSON.
+        '''
+        return json.loads(self.get(url, {'Accept': 'application/json', **(headers or {})}))
+
+
+    @contextmanager
+    def stream(self, url: str) -> Iterator[IO[bytes]]:
+        '''
+        Opens a URL as a decompressed binary stream without reading the body into memory.
+        Handles both gzip Content-Encoding and gzipped files such as sitemap.xml.gz.
+
+        Args:
+            url: The URL to fetch
+        '''
+        with self._host_limit(url):
+            response = self.session.get(url, timeout=self.timeout, stream=True)
+            with self._lock:
+                self.stats['requests'] += 1
+            try:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                if url.endswith('.gz') and response.headers.get('Content-Encoding') != 'gzip':
+                    yield gzip.GzipFile(fileobj=response.raw)
+                else:
+                    yield response.raw
+            finally:
+                response.close()
+
+
+    def close(self):
+        self.session.close()
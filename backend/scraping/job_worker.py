@@ -0,0 +1,178 @@
+from typing import List, Dict, Any, Optional, Callable
+from shared.db.database import Database
+from shared.db.services.scrape_job_service import ScrapeJobService
+from shared.db.services.product_service import ProductService
+from shared.db.services.price_service import PriceService
+from shared.db.services.retailer_service import RetailerService
+from shared.db.services.sitemap_service import SitemapService
+from shared.schemas import RetailerConfig, PriceSchema, ProductSchema
+from shared.logger import logger, setup_logging
+import os, socket, threading, uuid
+
+
+def default_worker_id() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+
+
+class ScrapeWorker:
+    '''
+    Scrapes the jobs of one retailer from the scrape_jobs table (see ScrapeJobService) and saves the prices.
+    Any number of workers can run on any number of nodes against the same database, each claims disjoint batches.
+
+    While a batch is scraped, a heartbeat thread extends its leases. If the worker dies, the leases expire
+    and the jobs are handed out again by the next worker's expire_leases. Products without a scraped price
+    are retried after retry_after seconds and marked as failed after max_attempts.
+
+    In sitemap mode the scraper only fetches pages whose lastmod changed: the known lastmods are loaded with the
+    scraper and the lastmods of scraped pages are saved with the prices. Products the scraper skipped (unchanged
+    or not in the sitemap) are completed without a price.
+    '''
+    def __init__(
+        self,
+        db: Database,
+        retailer_id: int,
+        scraper_factory: Callable[[RetailerConfig], Any],
+        worker_id: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        lease_seconds: int = 300,
+        heartbeat_interval: int = 60,
+        max_attempts: int = 3,
+        retry_after: int = 600
+    ):
+        '''
+        Args:
+            db: Database instance
+            retailer_id: The ID of the retailer to scrape jobs for
+            scraper_factory: Creates the scraper (a BaseScraper subclass) for the retailer's RetailerConfig
+            worker_id: Unique ID of the worker, defaults to hostname, process ID and a random suffix
+            batch_size: Jobs per claim, defaults to scrape_budget in the retailer's RetailerConfig
+            lease_seconds: Lease duration, must be longer than heartbeat_interval
+            heartbeat_interval: Seconds between lease extensions while a batch is scraped
+            max_attempts: Attempts before a job is marked as failed
+            retry_after: Seconds before a job without a scraped price is handed out again
+        '''
+        if heartbeat_interval >= lease_seconds:
+            raise ValueError('heartbeat_interval must be shorter than lease_seconds')
+        self.db = db
+        self.retailer_id = retailer_id
+        self.scraper_factory = scraper_factory
+        self.worker_id = worker_id or default_worker_id()
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.max_attempts = max_attempts
+        self.retry_after = retry_after
+        self._scraper = None
+
+
+    def _get_scraper(self, session) -> Any:
+        if self._scraper is None:
+            retailer = RetailerService(session).get_by_id(self.retailer_id)
+            if not retailer:
+                raise ValueError(f'No retailer with id {self.retailer_id}')
+            config = retailer.scraping_config
+            config.id = config.id or retailer.id
+            self.batch_size = self.batch_size or config.scrape_budget
+            self._scraper = self.scraper_factory(config)
+            if config.scraping_method == 'sitemap' and hasattr(self._scraper, 'known_lastmods'):
+                self._scraper.known_lastmods = SitemapService(session).get_lastmods(self.retailer_id)
+        return self._scraper
+
+
+    def _save_lastmods(self, session, scraper: Any):
+        '''
+        Saves the lastmods of the pages the scraper fetched, so they are skipped until they change.
+        '''
+        scraped = getattr(scraper, 'scraped_lastmods', None)
+        if not scraped:
+            return
+        SitemapService(session).save_lastmods(self.retailer_id, scraped)
+        scraper.known_lastmods.update({url: lastmod for url, (_, lastmod) in scraped.items()})
+        scraper.scraped_lastmods = {}
+
+
+    def _heartbeat(self, job_ids: List[int], stop: threading.Event):
+        '''
+        Extends the leases of job_ids every heartbeat_interval seconds until stop is set.
+        '''
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                with self.db.get_session() as session:
+                    held = ScrapeJobService(session).heartbeat(job_ids, self.worker_id, self.lease_seconds)
+                if held < len(job_ids):
+                    logger.warning(
+                        f'Worker {self.worker_id} lost {len(job_ids) - held} of {len(job_ids)} leases',
+                        extra={'fields': {'worker_id': self.worker_id, 'retailer_id': self.retailer_id}}
+                    )
+            except Exception as e:
+                logger.error(f'Heartbeat of worker {self.worker_id} failed: {str(e)}')
+
+
+    def run_once(self) -> Dict[str, int]:
+        '''
+        Claims one batch of jobs, scrapes it and saves the prices. Returns the counts of claimed, completed,
+        skipped (completed without a price, see the class docstring) and retried jobs, plus the counts of
+        PriceService.bulk_upsert.
+        '''
+        with self.db.get_session() as session:
+            scraper = self._get_scraper(session)
+            jobs_service = ScrapeJobService(session)
+            expired = jobs_service.expire_leases(self.max_attempts)
+            if expired:
+                logger.info(f'Expired {expired} scrape job leases')
+            jobs = jobs_service.claim(self.retailer_id, self.worker_id, self.batch_size, self.lease_seconds)
+            if not jobs:
+                return {'claimed': 0}
+            products: List[ProductSchema] = ProductService(session).get_by_ids([job['product_id'] for job in jobs])
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=([job['id'] for job in jobs], stop), daemon=True)
+        heartbeat.start()
+        try:
+            results: List[PriceSchema] = scraper.run(products)
+        except Exception as e:
+            logger.error(f'Scraping {len(jobs)} jobs failed: {str(e)}', extra={'fields': {'worker_id': self.worker_id}})
+            with self.db.get_session() as session:
+                ScrapeJobService(session).fail([job['id'] for job in jobs], self.worker_id, str(e), self.retry_after, self.max_attempts)
+            return {'claimed': len(jobs), 'completed': 0, 'retried': len(jobs)}
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        scraped = {result.product_id for result in results}
+        skipped = getattr(scraper, 'skipped_product_ids', set()) - scraped
+        done = [job['id'] for job in jobs if job['product_id'] in scraped or job['product_id'] in skipped]
+        missing = [job['id'] for job in jobs if job['product_id'] not in scraped and job['product_id'] not in skipped]
+        with self.db.get_session() as session:
+            prices = PriceService(session)
+            counts = prices.bulk_upsert(results)
+            self._save_lastmods(session, scraper)
+            prices.mark_checked([(product_id, self.retailer_id) for product_id in skipped])
+            jobs_service = ScrapeJobService(session)
+            completed = jobs_service.complete(done, self.worker_id)
+            jobs_service.fail(missing, self.worker_id, 'No price scraped', self.retry_after, self.max_attempts)
+        if completed < len(done):
+            logger.warning(f'Worker {self.worker_id} finished {len(done) - completed} jobs after losing their lease')
+        return {'claimed': len(jobs), 'completed': completed, 'skipped': len(skipped), 'retried': len(missing), **counts}
+
+
+    def run(self, stop: Optional[threading.Event] = None, idle_seconds: int = 30, max_batches: Optional[int] = None):
+        '''
+        Processes batches until stop is set or max_batches were processed. Sleeps idle_seconds when the queue is empty.
+        Sets up logging for the process if that has not happened yet.
+        '''
+        setup_logging()
+        stop = stop or threading.Event()
+        batches = 0
+        while not stop.is_set() and (max_batches is None or batches < max_batches):
+            try:
+                stats = self.run_once()
+            except Exception as e:
+                logger.error(f'Worker {self.worker_id} failed to process a batch: {str(e)}')
+                stop.wait(idle_seconds)
+                continue
+            if not stats['claimed']:
+                stop.wait(idle_seconds)
+                continue
+            batches += 1
+            logger.info('Scrape batch finished', extra={'fields': {'worker_id': self.worker_id, 'retailer_id': self.retailer_id, **stats}})
@@ -0,0 +1,112 @@
+from typing import Dict, Any, List, Optional
+from collections import Counter
+from prometheus_client import Histogram, Counter as PrometheusCounter, Gauge, start_http_server # type: ignore
+import os, statistics, threading
+
+
+SCRAPE_SECONDS = Histogram(
+    'scraper_product_seconds', 'Time to scrape one product', ['retailer', 'mode'],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+)
+DRIVER_INIT_SECONDS = Histogram(
+    'scraper_driver_init_seconds', 'Time to lease a driver, including starting the browser if none was idle', ['retailer'],
+    buckets=(0.01, 0.1, 0.5, 1, 2, 5, 10, 20, 40)
+)
+SCRAPED_PRODUCTS = PrometheusCounter(
+    'scraper_products_total', 'Scraped products by outcome: success, not_found (no price) or failure (exception)',
+    ['retailer', 'mode', 'outcome']
+)
+QUEUE_DEPTH = Gauge('scraper_queue_depth', 'Products left to scrape in the current run', ['retailer'])
+SCHEDULER_QUEUE_DEPTH = Gauge('scraper_scheduler_queue_depth', 'Products in the scheduler priority queue', ['retailer_id'])
+DRIVER_POOL_DRIVERS = Gauge('scraper_driver_pool_drivers', 'Drivers in the driver pool by key and state', ['key', 'state'])
+
+_server_lock = threading.Lock()
+_server_started = False
+_driver_pool_lock = threading.Lock()
+_driver_pool_keys: set = set() # keys recorded by record_driver_pool
+
+
+def start_metrics_server(port: Optional[int] = None) -> bool:
+    '''
+    Serves the metrics for Prometheus on http://0.0.0.0:<port>/metrics (METRICS_PORT, default 9100) once per process.
+    Returns False if the server was already started.
+    '''
+    global _server_started
+    with _server_lock:
+        if _server_started:
+            return False
+        start_http_server(port or int(os.getenv('METRICS_PORT', 9100)))
+        _server_started = True
+        return True
+
+
+def record_driver_pool(metrics: Dict[str, Any]):
+    '''
+    Sets the driver pool gauges from DriverPool.metrics(). Keys that are no longer in the pool are set to 0.
+    '''
+    with _driver_pool_lock:
+        for state in ('idle', 'leased'):
+            _driver_pool_keys.update(metrics.get(state, {}))
+        for state in ('idle', 'leased'):
+            counts = metrics.get(state, {})
+            for key in _driver_pool_keys:
+                DRIVER_POOL_DRIVERS.labels(key=key, state=state).set(counts.get(key, 0))
+
+
+class RunMetrics:
+    '''
+    Collects the outcomes and latencies of one scraper run, records them in the Prometheus metrics
+    and summarizes them for the run's JSON log line. Thread-safe.
+    '''
+    def __init__(self, retailer: str, total: int):
+        self.retailer = retailer
+        self.outcomes = Counter()
+        self.latencies: List[float] = []
+        self.driver_init: List[float] = []
+        self._remaining = total
+        self._lock = threading.Lock()
+        QUEUE_DEPTH.labels(retailer=retailer).set(total)
+
+
+    def set_total(self, total: int):
+        '''
+        Resets the products left to scrape, e.g. after the sitemap mode skipped unchanged products.
+        '''
+        with self._lock:
+            self._remaining = total
+        QUEUE_DEPTH.labels(retailer=self.retailer).set(total)
+
+
+    def observe(self, mode: str, seconds: float, outcome: str):
+        SCRAPE_SECONDS.labels(retailer=self.retailer, mode=mode).observe(seconds)
+        SCRAPED_PRODUCTS.labels(retailer=self.retailer, mode=mode, outcome=outcome).inc()
+        with self._lock:
+            self.outcomes[f'{mode}_{outcome}'] += 1
+            self.latencies.append(seconds)
+            if mode != 'fallback':
+                self._remaining -= 1
+                QUEUE_DEPTH.labels(retailer=self.retailer).set(max(0, self._remaining))
+
+
+    def observe_driver_init(self, seconds: float):
+        DRIVER_INIT_SECONDS.labels(retailer=self.retailer).observe(seconds)
+        with self._lock:
+            self.driver_init.append(seconds)
+
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            summary = {
+                'event': 'scrape_run',
+                'retailer': self.retailer,
+                'duration_s': round(duration, 2),
+                'products': len(latencies),
+                **dict(self.outcomes),
+                'driver_inits': len(self.driver_init),
+                'driver_init_s': round(sum(self.driver_init), 2)
+            }
+        if latencies:
+            summary['p50_s'] = round(statistics.median(latencies), 3)
+            summary['p95_s'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3)
+        return summary
@@ -0,0 +1,59 @@
+from typing import Dict, List, Any
+
+
+# URL patterns for Network.setBlockedURLs per resource type, * matches any characters
+RESOURCE_PATTERNS = {
+    'image': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.avif*', '*.svg*', '*.ico*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*', '*.ogg*'],
+    'font': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*'],
+    'stylesheet': ['*.css*']
+}
+
+# Common ad, analytics and tag manager domains, used with 'blocked_domains': ['trackers']
+TRACKER_DOMAINS = [
+    'googletagmanager.com', 'google-analytics.com', 'doubleclick.net', 'googlesyndication.com', 'googleadservices.com',
+    'facebook.net', 'connect.facebook.net', 'hotjar.com', 'criteo.com', 'criteo.net', 'taboola.com', 'outbrain.com',
+    'adnxs.com', 'bing.com', 'clarity.ms', 'tiktok.com', 'pinterest.com', 'usercentrics.eu', 'cookiebot.com', 'onetrust.com'
+]
+
+# Per-retailer defaults, merged with RetailerConfig.selenium_settings (retailers saved before these settings existed lack them)
+DEFAULT_SETTINGS = {
+    'page_load_strategy': 'normal', # normal, eager (DOMContentLoaded) or none
+    'block_resources': [], # resource types from RESOURCE_PATTERNS
+    'blocked_domains': [], # domains, 'trackers' for TRACKER_DOMAINS
+    'wait_for_selector': None, # CSS selector to wait for after opening a page
+    'wait_timeout': 10
+}
+
+
+def resource_settings(selenium_settings: Dict[str, Any]) -> Dict[str, Any]:
+    return {**DEFAULT_SETTINGS, **{k: v for k, v in selenium_settings.items() if k in DEFAULT_SETTINGS and v is not None}}
+
+
+def blocked_url_patterns(selenium_settings: Dict[str, Any]) -> List[str]:
+    '''
+    Returns the URL patterns to block in the browser for a retailer's selenium_settings.
+    '''
+    settings = resource_settings(selenium_settings)
+    patterns = []
+    for resource_type in settings['block_resources']:
+        if resource_type not in RESOURCE_PATTERNS:
+            raise ValueError(f'Invalid resource type to block: {resource_type}')
+        patterns += RESOURCE_PATTERNS[resource_type]
+    for domain in settings['blocked_domains']:
+        for blocked in (TRACKER_DOMAINS if domain == 'trackers' else [domain]):
+            patterns.append(f'*://*.{blocked}/*')
+            patterns.append(f'*://{blocked}/*')
+    return patterns
+
+
+def apply_blocked_urls(driver: Any, patterns: List[str]) -> bool:
+    '''
+    Blocks requests matching the patterns through the Chrome DevTools Protocol until they are cleared with an empty list.
+    Returns False for drivers without CDP support (e.g. FakeDriver).
+    '''
+    if not hasattr(driver, 'execute_cdp_cmd'):
+        return False
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    return True
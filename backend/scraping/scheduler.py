@@ -0,0 +1,194 @@
+from typing import List, Dict, Any, Optional, Tuple
+from apscheduler.schedulers.background import BackgroundScheduler # type: ignore
+from shared.db.database import Database
+from shared.db.services.scrape_schedule_service import ScrapeScheduleService
+from shared.db.services.product_service import ProductService
+from shared.db.services.retailer_service import RetailerService
+from shared.db.services.scrape_job_service import ScrapeJobService
+from shared.schemas import ProductSchema
+from shared.logger import logger, setup_logging
+from scraping.metrics import SCHEDULER_QUEUE_DEPTH, start_metrics_server
+import datetime, heapq, math, threading
+
+
+DEFAULT_WEIGHTS = {
+    'price_changes': 0.5, # per price change within the window
+    'stock_flips': 1.0,   # per in-stock/out-of-stock flip within the window
+    'views': 0.25         # per log(1 + page views)
+}
+
+
+class ScrapeScheduler:
+    '''
+    Priority-based replacement for the fixed release_year buckets of ProductService.get_products_to_scrape.
+
+    Keeps a priority queue per retailer. Each product is scored by the time since its last scrape, multiplied by
+    a boost for observed price volatility, in-stock flips and page views, so products whose prices actually move
+    are scraped more often than stable old sets. Queues are rebuilt periodically by an APScheduler job and
+    next_batch hands out at most RetailerConfig.scrape_budget products per call.
+
+    With several scraper processes or nodes, the queues are published to the scrape_jobs table instead
+    (start(publish_jobs=True)) and workers claim disjoint batches from it, see scraping/job_worker.py.
+    '''
+    def __init__(
+        self,
+        db: Database,
+        weights: Optional[Dict[str, float]] = None,
+        min_interval: int = 3600,
+        refresh_interval: int = 900,
+        window_days: int = 30
+    ):
+        '''
+        Args:
+            db: Database instance
+            weights: Overrides for DEFAULT_WEIGHTS
+            min_interval: Seconds before a product is handed out again for the same retailer
+            refresh_interval: Seconds between queue rebuilds when started
+            window_days: Days of price history to consider for volatility and in-stock flips
+        '''
+        self.db = db
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.min_interval = min_interval
+        self.refresh_interval = refresh_interval
+        self.window_days = window_days
+        self._queues: Dict[int, List[Tuple[float, int]]] = {}
+        self._handed_out: Dict[int, Dict[int, datetime.datetime]] = {}
+        self._lock = threading.Lock()
+        self._scheduler = BackgroundScheduler()
+
+
+    def score(self, candidate: Dict[str, Any], now: datetime.datetime) -> Optional[float]:
+        '''
+        Returns the priority of a candidate from ScrapeScheduleService.get_candidates, higher is more urgent.
+        Returns None if the product was scraped less than min_interval seconds ago.
+        '''
+        last_checked = candidate['last_checked']
+        if last_checked is None:
+            return math.inf
+        if last_checked.tzinfo:
+            last_checked = last_checked.astimezone(datetime.UTC).replace(tzinfo=None)
+        age = (now - last_checked).total_seconds()
+        if age < self.min_interval:
+            return None
+        boost = 1 + (
+            self.weights['price_changes'] * candidate['price_changes']
+            + self.weights['stock_flips'] * candidate['stock_flips']
+            + self.weights['views'] * math.log1p(candidate['view_count'])
+        )
+        return age / 3600 * boost
+
+
+    def refresh(self, retailer_id: int):
+        '''
+        Rebuilds the priority queue of a retailer from the database.
+        '''
+        now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+        with self.db.get_session() as session:
+            candidates = ScrapeScheduleService(session).get_candidates(retailer_id, self.window_days)
+        with self._lock:
+            handed_out = {
+                product_id: at for product_id, at in self._handed_out.get(retailer_id, {}).items()
+                if (now - at).total_seconds() < self.min_interval
+            }
+            queue = []
+            for candidate in candidates:
+                if candidate['product_id'] in handed_out:
+                    continue
+                score = self.score(candidate, now)
+                if score is not None:
+                    queue.append((-score, candidate['product_id']))
+            heapq.heapify(queue)
+            self._queues[retailer_id] = queue
+            self._handed_out[retailer_id] = handed_out
+        SCHEDULER_QUEUE_DEPTH.labels(retailer_id=str(retailer_id)).set(len(queue))
+        logger.info(f'Refreshed scrape queue for retailer {retailer_id}: {len(queue)} of {len(candidates)} products due')
+
+
+    def refresh_all(self):
+        '''
+        Rebuilds the priority queues of all retailers.
+        '''
+        with self.db.get_session() as session:
+            retailer_ids = [retailer.id for retailer in RetailerService(session).get_all()]
+        for retailer_id in retailer_ids:
+            try:
+                self.refresh(retailer_id)
+            except Exception as e:
+                logger.error(f'Error refreshing scrape queue for retailer {retailer_id}: {str(e)}')
+
+
+    def publish(self, retailer_id: int) -> int:
+        '''
+        Rebuilds the priority queue of a retailer and writes it to the scrape_jobs table, where workers on any node
+        claim it with ScrapeJobService.claim. Jobs done less than min_interval seconds ago are not reopened.
+        Returns the number of jobs added or updated.
+        '''
+        self.refresh(retailer_id)
+        with self._lock:
+            queue = self._queues.pop(retailer_id, [])
+        # Never scraped products have an infinite score, keep them first with a finite priority
+        jobs = [(product_id, retailer_id, min(-score, 1e12)) for score, product_id in queue]
+        with self.db.get_session() as session:
+            written = ScrapeJobService(session).enqueue(jobs, reopen_after=self.min_interval)
+        logger.info(f'Published {written} scrape jobs for retailer {retailer_id}')
+        return written
+
+
+    def publish_all(self):
+        '''
+        Publishes the priority queues of all retailers to the scrape_jobs table.
+        '''
+        with self.db.get_session() as session:
+            retailer_ids = [retailer.id for retailer in RetailerService(session).get_all()]
+            stats = ScrapeJobService(session).get_stats()
+        for retailer_id in retailer_ids:
+            try:
+                self.publish(retailer_id)
+            except Exception as e:
+                logger.error(f'Error publishing scrape jobs for retailer {retailer_id}: {str(e)}')
+        logger.info('Scrape jobs', extra={'fields': stats})
+
+
+    def next_batch(self, retailer_id: int, budget: Optional[int] = None) -> List[ProductSchema]:
+        '''
+        Pops the highest priority products of a retailer, ordered by priority.
+
+        Args:
+            retailer_id: The ID of the retailer
+            budget: Max number of products, defaults to scrape_budget in the retailer's RetailerConfig
+        '''
+        if retailer_id not in self._queues:
+            self.refresh(retailer_id)
+        with self.db.get_session() as session:
+            if budget is None:
+                budget = RetailerService(session).get_by_id(retailer_id).scraping_config.scrape_budget
+            now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+            with self._lock:
+                queue = self._queues.get(retailer_id, [])
+                product_ids = [heapq.heappop(queue)[1] for _ in range(min(budget, len(queue)))]
+                handed_out = self._handed_out.setdefault(retailer_id, {})
+                for product_id in product_ids:
+                    handed_out[product_id] = now
+                SCHEDULER_QUEUE_DEPTH.labels(retailer_id=str(retailer_id)).set(len(queue))
+            products = {p.id: p for p in ProductService(session).get_by_ids(product_ids)}
+        return [products[product_id] for product_id in product_ids if product_id in products]
+
+
+    def start(self, publish_jobs: bool = False):
+        '''
+        Builds all queues and keeps rebuilding them every refresh_interval seconds in a background thread.
+        Also sets up logging for the process and serves the scraper metrics for Prometheus on METRICS_PORT.
+
+        Args:
+            publish_jobs: Publish the queues to the scrape_jobs table for workers instead of keeping them for next_batch
+        '''
+        setup_logging()
+        start_metrics_server()
+        job = self.publish_all if publish_jobs else self.refresh_all
+        job()
+        self._scheduler.add_job(job, 'interval', seconds=self.refresh_interval, id='refresh_scrape_queues', replace_existing=True)
+        self._scheduler.start()
+
+
+    def shutdown(self):
+        self._scheduler.shutdown(wait=False)
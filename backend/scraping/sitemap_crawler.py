@@ -0,0 +1,135 @@
+from typing import List, Dict, Optional, Tuple, Iterator
+import xml.etree.ElementTree as ET
+import datetime, re
+from scraping.http_client import HttpClient
+from shared.schemas import ProductSchema
+from shared.logger import logger
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime.datetime]:
+    '''
+    Parses a W3C datetime from a sitemap into a naive UTC datetime. Returns None for missing or invalid values.
+    '''
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(datetime.UTC).replace(tzinfo=None)
+    return parsed
+
+
+class SitemapCrawler:
+    '''
+    Streams a retailer's sitemap (or sitemap index) and maps its URLs to products.
+
+    The XML is parsed incrementally with iterparse and every <url>/<sitemap> element is discarded
+    after reading, so memory stays flat regardless of the sitemap size.
+    '''
+    def __init__(self, http_client: HttpClient, product_url_pattern: Optional[str] = None):
+        self.http_client = http_client
+        self.product_url_pattern = re.compile(product_url_pattern) if product_url_pattern else None
+
+
+    def iter_urls(self, sitemap_url: str) -> Iterator[Tuple[str, Optional[datetime.datetime]]]:
+        '''
+        Yields (loc, lastmod) for every page in a sitemap. Sitemap indexes are followed recursively.
+
+        Args:
+            sitemap_url: URL of a sitemap or sitemap index, optionally gzipped
+        '''
+        child_sitemaps = []
+        with self.http_client.stream(sitemap_url) as stream:
+            context = ET.iterparse(stream, events=('start', 'end'))
+            root = None
+            for event, element in context:
+                if event == 'start':
+                    if root is None:
+                        root = element
+                    continue
+                name = _local_name(element.tag)
+                if name not in ('url', 'sitemap'):
+                    continue
+                loc, lastmod = None, None
+                for child in element:
+                    child_name = _local_name(child.tag)
+                    if child_name == 'loc':
+                        loc = (child.text or '').strip()
+                    elif child_name == 'lastmod':
+                        lastmod = parse_lastmod(child.text)
+                if loc:
+                    if name == 'sitemap':
+                        child_sitemaps.append(loc)
+                    else:
+                        yield loc, lastmod
+                root.clear()
+        for child_sitemap in child_sitemaps:
+            try:
+                yield from self.iter_urls(child_sitemap)
+            except Exception as e:
+                logger.error(f'Error reading sitemap {child_sitemap}: {str(e)}')
+
+
+    def match_product(
+        self,
+        url: str,
+        products_by_manufacturer_id: Dict[str, ProductSchema],
+        products_by_ean: Dict[str, ProductSchema]
+    ) -> Optional[ProductSchema]:
+        '''
+        Maps a URL to a product using the product_url_pattern.
+        Without a pattern, the first number in the URL path that matches a manufacturer_id or EAN is used.
+        '''
+        if self.product_url_pattern:
+            match = self.product_url_pattern.search(url)
+            if not match:
+                return None
+            groups = match.groupdict()
+            if groups.get('ean'):
+                return products_by_ean.get(groups['ean'])
+            if groups.get('manufacturer_id'):
+                return products_by_manufacturer_id.get(groups['manufacturer_id'])
+            return None
+        for token in re.findall(r'\d+', url.split('://', 1)[-1].split('/', 1)[-1]):
+            product = products_by_ean.get(token) or products_by_manufacturer_id.get(token)
+            if product:
+                return product
+        return None
+
+
+    def find_changed(
+        self,
+        sitemap_url: str,
+        products: List[ProductSchema],
+        known_lastmods: Dict[str, Optional[datetime.datetime]]
+    ) -> List[Tuple[ProductSchema, str, Optional[datetime.datetime]]]:
+        '''
+        Returns (product, url, lastmod) for all products whose page is new or changed since the lastmod in known_lastmods.
+        Pages without a lastmod are always returned.
+
+        Args:
+            sitemap_url: URL of a sitemap or sitemap index
+            products: Products to look for
+            known_lastmods: URL -> lastmod from previous runs, e.g. from SitemapService.get_lastmods
+        '''
+        products_by_manufacturer_id = {p.manufacturer_id: p for p in products if p.manufacturer_id}
+        products_by_ean = {p.ean: p for p in products if p.ean}
+        changed = {}
+        num_urls, num_unchanged = 0, 0
+        for url, lastmod in self.iter_urls(sitemap_url):
+            num_urls += 1
+            product = self.match_product(url, products_by_manufacturer_id, products_by_ean)
+            if not product or product.id in changed:
+                continue
+            if lastmod and known_lastmods.get(url) == lastmod:
+                num_unchanged += 1
+                continue
+            changed[product.id] = (product, url, lastmod)
+        logger.info(f'Read {num_urls} sitemap URLs: {len(changed)} of {len(products)} products changed, {num_unchanged} unchanged')
+        return list(changed.values())
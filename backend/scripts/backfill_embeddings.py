@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse
+from shared.db.database import Database
+from shared.db.services.similarity_service import SimilarityService, INDEX_METHODS
+from shared.logger import logger, setup_logging
+
+try:
+    from sentence_transformers import SentenceTransformer # type: ignore
+except ImportError:
+    SentenceTransformer = None
+
+
+def main():
+    '''
+    Computes embeddings for product_content rows without one and optionally creates the ANN index.
+    The default model produces the 384 dimensions of product_content.embedding.
+    '''
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Backfill product_content embeddings')
+    parser.add_argument('--model', default='sentence-transformers/all-MiniLM-L6-v2', help='sentence-transformers model with 384 dimensions')
+    parser.add_argument('--content-type', help='Only backfill this content type')
+    parser.add_argument('--batch-size', type=int, default=100, help='Rows embedded and committed per batch')
+    parser.add_argument('--create-index', choices=INDEX_METHODS, help='Create the ANN index after the backfill')
+    args = parser.parse_args()
+
+    if SentenceTransformer is None:
+        raise ImportError('The sentence-transformers package is required to compute embeddings')
+    model = SentenceTransformer(args.model)
+
+    def embed(texts):
+        return model.encode(texts, batch_size=args.batch_size, normalize_embeddings=True)
+
+    db = Database()
+    with db.get_session() as session:
+        similarity_service = SimilarityService(session)
+        updated = similarity_service.backfill_embeddings(embed, content_type=args.content_type, batch_size=args.batch_size)
+        logger.info(f'Backfilled {updated} embeddings')
+        if args.create_index:
+            similarity_service.create_index(args.create_index)
+            logger.info(f'Created {args.create_index} index on product_content.embedding')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse, datetime, json, random, time
+from typing import Dict, Any, Callable
+from sqlalchemy import create_engine, insert, select # type: ignore
+from sqlalchemy.orm import sessionmaker # type: ignore
+from shared.db.models import Product, Prices
+from shared.db.services.product_service import PRODUCT_COLUMNS, to_product_schema
+from shared.db.services.price_service import PRICE_COLUMNS, to_price_schemas, to_history
+from shared.schemas import ProductSchema, PriceSchema, PriceHistory, parse_timestamp
+
+
+def per_row_us(fn: Callable[[], int], iterations: int) -> float:
+    '''
+    Returns the best time per row in microseconds of iterations calls of fn, which returns the number of rows it built.
+    '''
+    best = float('inf')
+    for _ in range(iterations):
+        start = time.perf_counter()
+        rows = fn()
+        best = min(best, (time.perf_counter() - start) / rows)
+    return best * 1e6
+
+
+def main():
+    '''
+    Measures the per-row overhead of turning query results into schemas, before (ORM entities validated
+    through __dict__, price histories validated entry by entry) and after (projected columns validated
+    as plain dicts, histories passed through, cached timestamp parsing). Runs against an in-memory SQLite database.
+    '''
+    parser = argparse.ArgumentParser(description='Benchmark the per-row cost of building schemas from query results')
+    parser.add_argument('--rows', type=int, default=5000, help='Number of products and prices')
+    parser.add_argument('--history', type=int, default=50, help='Price history entries per price')
+    parser.add_argument('--iterations', type=int, default=5, help='Runs per benchmark, the best one is reported')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    now = datetime.datetime(2025, 1, 1)
+    engine = create_engine('sqlite://')
+    Product.__table__.create(engine)
+    Prices.__table__.create(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.execute(insert(Product), [
+            {'id': i, 'manufacturer_id': str(10000 + i), 'name': f'set {i}', 'manufacturer': 'lego', 'piece_count': rng.randint(50, 5000),
+             'release_year': rng.randint(2015, 2025), 'ean': str(5700000000000 + i), 'rrp': 49.99, 'created_at': now}
+            for i in range(1, args.rows + 1)
+        ])
+        session.execute(insert(Prices), [
+            {'id': i, 'product_id': i, 'retailer_id': 1, 'price': 39.99, 'shipping_cost': 0.0, 'in_stock': True,
+             'url': f'https://example.com/{i}', 'last_updated': now}
+            for i in range(1, args.rows + 1)
+        ])
+        session.commit()
+
+    history = [(now - datetime.timedelta(hours=h), 40.0 + h % 7) for h in range(args.history)]
+    history_rows = [(retailer_id, ts, price) for retailer_id in range(20) for ts, price in history] * (args.rows // (20 * args.history) or 1)
+    legacy_history = [{'datetime': ts.isoformat(), 'price': price} for ts, price in history]
+
+    def products_before():
+        with Session() as session:
+            return len([ProductSchema.model_validate(p.__dict__) for p in session.query(Product).all()])
+
+    def products_after():
+        with Session() as session:
+            return len([to_product_schema(row) for row in session.execute(select(*PRODUCT_COLUMNS)).all()])
+
+    def prices_before():
+        with Session() as session:
+            prices = session.execute(select(Prices)).scalars().all()
+            return len([
+                PriceSchema.model_validate({
+                    **{column.key: getattr(p, column.key) for column in PRICE_COLUMNS},
+                    'price_history': PriceHistory()
+                })
+                for p in prices
+            ])
+
+    def prices_after():
+        with Session() as session:
+            return len(to_price_schemas(session.execute(select(*PRICE_COLUMNS)).all(), {}))
+
+    def history_before():
+        grouped: Dict[int, list] = {}
+        for retailer_id, observed, price in history_rows:
+            grouped.setdefault(retailer_id, []).append((observed, price))
+        return len([PriceHistory(history=entries) for entries in grouped.values()]) and len(history_rows)
+
+    def history_after():
+        return len(to_history(history_rows)) and len(history_rows)
+
+    def legacy_history_before():
+        return len([
+            PriceHistory(history=[(datetime.datetime.fromisoformat(x['datetime']), x['price']) for x in legacy_history])
+            for _ in range(args.rows // 10)
+        ])
+
+    def legacy_history_after():
+        parse_timestamp.cache_clear()
+        return len([PriceSchema.parse_price_history(legacy_history) for _ in range(args.rows // 10)])
+
+    benchmarks: Dict[str, Dict[str, Callable[[], int]]] = {
+        'products': {'before': products_before, 'after': products_after},
+        'prices': {'before': prices_before, 'after': prices_after},
+        'price_history_entries': {'before': history_before, 'after': history_after},
+        'legacy_price_history': {'before': legacy_history_before, 'after': legacy_history_after}
+    }
+    results: Dict[str, Any] = {}
+    for name, variants in benchmarks.items():
+        results[name] = {variant: round(per_row_us(fn, args.iterations), 2) for variant, fn in variants.items()}
+        results[name]['speedup'] = round(results[name]['before'] / results[name]['after'], 1)
+        print(f'{name:<24} before {results[name]["before"]:>8.2f} us/row   after {results[name]["after"]:>8.2f} us/row   {results[name]["speedup"]}x')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse, datetime, json, os, random, statistics, threading, time
+from typing import Dict, Any, List, Callable
+
+
+MANUFACTURERS = ['lego', 'cobi', 'cada', 'bluebrixx', 'pantasy']
+WORDS = ['castle', 'star', 'ship', 'police', 'fire', 'station', 'train', 'city', 'tank', 'jet', 'tower', 'dragon', 'harbor', 'bridge', 'truck']
+
+
+class QueryCounter:
+    '''
+    Counts the statements executed on the attached engines. Counts across threads, since the API
+    benchmarks run the app in the TestClient's event loop thread, so benchmarks have to run one at a time.
+    '''
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        from sqlalchemy import event # type: ignore
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def seed(db, start: int, end: int, num_retailers: int, retailers_per_product: int, observations_per_price: int, years: int, rng: random.Random):
+    '''
+    Inserts products with IDs start + 1 to end, their prices at retailers_per_product random retailers and
+    observations_per_price observations each, spread over the last years. Creates the retailers on the first call.
+    '''
+    from sqlalchemy import insert # type: ignore
+    from shared.db.models import Product, Prices, PriceObservation, Retailer
+    from shared.schemas import RetailerConfig
+    from shared.logger import logger
+
+    now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    current_year = now.year
+    with db.get_session() as session:
+        if start == 0:
+            session.execute(insert(Retailer), [
+                {
+                    'id': i,
+                    'name': f'retailer-{i}',
+                    'base_url': f'https://retailer-{i}.example.com',
+                    'scraping_config': RetailerConfig(base_url=f'https://retailer-{i}.example.com', scraping_method='ui').model_dump(),
+                    'scrape_intervals': {'current_year': 6 * 3600, 'previous_year': 12 * 3600, 'older': 24 * 3600},
+                    'excluded_brands': []
+                }
+                for i in range(1, num_retailers + 1)
+            ])
+        chunk_size = 2000
+        for chunk_start in range(start + 1, end + 1, chunk_size):
+            ids = range(chunk_start, min(end, chunk_start + chunk_size - 1) + 1)
+            products, prices, observations = [], [], []
+            for product_id in ids:
+                rrp = round(rng.uniform(10, 500), 2)
+                products.append({
+                    'id': product_id,
+                    'manufacturer': rng.choice(MANUFACTURERS),
+                    'manufacturer_id': str(10000 + product_id),
+                    'name': ' '.join(rng.sample(WORDS, 3)),
+                    'release_year': rng.randint(current_year - 8, current_year),
+                    'ean': str(4000000000000 + product_id),
+                    'rrp': rrp,
+                    'piece_count': rng.randint(50, 5000),
+                    'created_at': now
+                })
+                for retailer_id in rng.sample(range(1, num_retailers + 1), min(retailers_per_product, num_retailers)):
+                    price = round(rrp * rng.uniform(0.6, 1.1), 2)
+                    prices.append({
+                        'product_id': product_id,
+                        'retailer_id': retailer_id,
+                        'price': price,
+                        'shipping_cost': 4.99,
+                        'in_stock': rng.random() < 0.8,
+                        'last_updated': now - datetime.timedelta(hours=rng.uniform(0, 72))
+                    })
+                    step = datetime.timedelta(days=365 * years) / max(1, observations_per_price)
+                    for i in range(observations_per_price):
+                        observations.append({
+                            'product_id': product_id,
+                            'retailer_id': retailer_id,
+                            'observed_at': now - step * (observations_per_price - i),
+                            'price': round(price * rng.uniform(0.9, 1.1), 2),
+                            'shipping_cost': 4.99,
+                            'in_stock': rng.random() < 0.9
+                        })
+            session.execute(insert(Product), products)
+            session.execute(insert(Prices), prices)
+            if observations:
+                session.execute(insert(PriceObservation), observations)
+            session.commit()
+            logger.info(f'Seeded products up to {ids[-1]}')
+
+    with db.get_session() as session:
+        from shared.db.services.offer_summary_service import OfferSummaryService
+        try:
+            OfferSummaryService(session).refresh()
+        except Exception as e:
+            session.rollback()
+            logger.warning(f'Could not refresh offer summaries on {db.engine.dialect.name}: {e}')
+
+
+def service_benchmarks(db, size: int, num_retailers: int, rng: random.Random) -> Dict[str, Callable[[], Any]]:
+    from shared.db.models import Prices
+    from shared.db.services.product_service import ProductService
+    from shared.db.services.price_service import PriceService
+    from shared.db.services.offer_summary_service import OfferSummaryService
+    from shared.schemas import PriceSchema
+
+    def listings_first_page():
+        with db.get_session() as session:
+            return ProductService(session).get_available_products_by_manufacturer('lego', [], limit=20, include_total=True)
+
+    def listings_cursor_page():
+        with db.get_session() as session:
+            service = ProductService(session)
+            _, _, cursor = service.get_available_products_by_manufacturer('lego', [], limit=20, include_total=False)
+            return service.get_available_products_by_manufacturer('lego', [], limit=20, cursor=cursor, include_total=False)
+
+    def products_to_scrape():
+        with db.get_session() as session:
+            return ProductService(session).get_products_to_scrape(('older', 24 * 3600), rng.randint(1, num_retailers))
+
+    def update_price():
+        with db.get_session() as session:
+            product_id, retailer_id = session.query(Prices.product_id, Prices.retailer_id).filter(Prices.product_id == rng.randint(1, size)).first()
+            return PriceService(session).update_price(
+                PriceSchema(product_id=product_id, retailer_id=retailer_id, price=round(rng.uniform(10, 500), 2), in_stock=True)
+            )
+
+    def price_history():
+        with db.get_session() as session:
+            return PriceService(session).get_by_product_id(rng.randint(1, size), resolution='day')
+
+    def best_offers():
+        with db.get_session() as session:
+            return OfferSummaryService(session).get_best_offers(sort='discount', limit=20)
+
+    return {
+        'listings_first_page': listings_first_page,
+        'listings_cursor_page': listings_cursor_page,
+        'products_to_scrape': products_to_scrape,
+        'update_price': update_price,
+        'price_history': price_history,
+        'best_offers': best_offers
+    }
+
+
+def api_benchmarks(client, size: int, rng: random.Random) -> Dict[str, Callable[[], Any]]:
+    from shared.cache import cache
+
+    def get(path):
+        def request():
+            cache.clear() # measure the database path, not the response cache
+            response = client.get(path())
+            if response.status_code >= 400:
+                raise Exception(f'{response.status_code} {response.text[:200]}')
+            return response
+        return request
+
+    return {
+        'api_product': get(lambda: f'/products/{rng.randint(1, size)}'),
+        'api_prices': get(lambda: f'/products/{rng.randint(1, size)}/prices?resolution=week'),
+        'api_listings': get(lambda: '/manufacturers/lego/product_listings?limit=20'),
+        'api_best_offers': get(lambda: '/products/best_offers?sort=discount')
+    }
+
+
+def measure(fn: Callable[[], Any], counter: QueryCounter, iterations: int, warmup: int = 2) -> Dict[str, Any]:
+    '''
+    Runs fn warmup + iterations times and returns latency percentiles and the mean number of queries per call.
+    '''
+    for _ in range(warmup):
+        fn()
+    latencies, queries = [], []
+    for _ in range(iterations):
+        counter.reset()
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+    return {
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'queries': round(statistics.mean(queries), 1)
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta_ms: float = 1.0) -> List[str]:
+    '''
+    Returns a message per benchmark whose p50 latency grew by more than threshold (and min_delta_ms, to ignore noise
+    on sub-millisecond calls) or that issues more queries than the baseline.
+    '''
+    regressions = []
+    for size, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            previous = baseline.get(size, {}).get(name)
+            if not previous or 'error' in result or 'error' in previous:
+                continue
+            if result['p50_ms'] > previous['p50_ms'] * (1 + threshold) and result['p50_ms'] - previous['p50_ms'] > min_delta_ms:
+                regressions.append(f'{name} at {size} products: p50 {previous["p50_ms"]} ms -> {result["p50_ms"]} ms')
+            if result['queries'] > previous['queries']:
+                regressions.append(f'{name} at {size} products: {previous["queries"]} -> {result["queries"]} queries')
+    return regressions
+
+
+def main():
+    '''
+    Seeds a synthetic catalog into DATABASE_URL (an empty database, Postgres or a SQLite file as a stand-in) in steps of
+    the given sizes and runs the service and API hot paths at every size. Queries using Postgres-only SQL are reported
+    as errors on SQLite. Compares the results to a baseline file and exits with 1 on regressions.
+
+    Example:
+        DATABASE_URL=postgresql://localhost/bench python scripts/benchmark_services.py --sizes 1000 10000 100000 --baseline bench.json
+    '''
+    from shared.logger import setup_logging
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Benchmark the service and API hot paths on a synthetic catalog')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='Catalog sizes (number of products) to benchmark at')
+    parser.add_argument('--retailers', type=int, default=20, help='Number of retailers')
+    parser.add_argument('--retailers-per-product', type=int, default=3, help='Number of retailers with a price per product')
+    parser.add_argument('--observations-per-price', type=int, default=24, help='Price observations per product and retailer')
+    parser.add_argument('--history-years', type=int, default=2, help='Years the observations are spread over')
+    parser.add_argument('--iterations', type=int, default=20, help='Measured calls per benchmark')
+    parser.add_argument('--skip-api', action='store_true', help='Only benchmark the services')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the catalog and the benchmark inputs')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--baseline', help='JSON file with results of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative p50 latency increase vs the baseline')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore p50 increases smaller than this')
+    args = parser.parse_args()
+
+    if not os.getenv('DATABASE_URL'):
+        raise ValueError('Set DATABASE_URL to an empty database to seed')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from shared.db.database import Database
+    from shared.logger import logger
+
+    rng = random.Random(args.seed)
+    db = Database()
+    db.init_db()
+    counter = QueryCounter()
+    counter.attach(db.engine)
+
+    client = None
+    if not args.skip_api:
+        from fastapi.testclient import TestClient # type: ignore
+        from api import main as api
+        counter.attach(api.async_db.engine.sync_engine)
+        counter.attach(api.db.engine)
+        client = TestClient(api.app)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    seeded = 0
+    for size in sorted(args.sizes):
+        start = time.perf_counter()
+        seed(db, seeded, size, args.retailers, args.retailers_per_product, args.observations_per_price, args.history_years, rng)
+        seeded = size
+        logger.warning(f'Seeded {size} products in {time.perf_counter() - start:.1f} s')
+
+        benchmarks = service_benchmarks(db, size, args.retailers, rng)
+        if client:
+            benchmarks.update(api_benchmarks(client, size, rng))
+        results[str(size)] = {}
+        for name, fn in benchmarks.items():
+            try:
+                results[str(size)][name] = measure(fn, counter, args.iterations)
+            except Exception as e:
+                results[str(size)][name] = {'error': str(e).splitlines()[0][:200]}
+            logger.warning(f'{size} products, {name}: {results[str(size)][name]}')
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.baseline and Path(args.baseline).exists():
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.threshold, args.min_delta_ms)
+        for regression in regressions:
+            logger.error(f'Regression: {regression}')
+        if regressions:
+            sys.exit(1)
+    elif args.baseline:
+        Path(args.baseline).write_text(json.dumps(results, indent=2))
+        logger.warning(f'Saved baseline to {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse, json, random, statistics, time
+import numpy as np
+from sqlalchemy import select # type: ignore
+from shared.db.database import Database
+from shared.db.models import ProductContent
+from shared.db.services.similarity_service import SimilarityService, DEFAULT_CONTENT_TYPE, cosine_top_k
+from shared.logger import logger, setup_logging
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    '''
+    Measures recall@k and latency of the ANN index for several ef_search values against exact NumPy search
+    over the whole catalog, to pick ef_search for get_similar_products.
+    '''
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Benchmark recall vs latency of similar product search')
+    parser.add_argument('--content-type', default=DEFAULT_CONTENT_TYPE, help='Content type whose embeddings are compared')
+    parser.add_argument('--queries', type=int, default=100, help='Number of random products to query')
+    parser.add_argument('--k', type=int, default=10, help='Number of similar products per query')
+    parser.add_argument('--ef-search', type=int, nargs='+', default=[10, 20, 40, 80, 160], help='HNSW ef_search values to compare')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    db = Database()
+    results = []
+    with db.get_session() as session:
+        rows = session.execute(
+            select(ProductContent.product_id, ProductContent.embedding).where(
+                ProductContent.content_type == args.content_type,
+                ProductContent.embedding.isnot(None)
+            )
+        ).all()
+        if not rows:
+            logger.error(f'No embeddings for content type {args.content_type}')
+            return
+        product_ids = np.array([row.product_id for row in rows])
+        matrix = np.array([row.embedding for row in rows], dtype=np.float32)
+        samples = random.sample(range(len(rows)), min(args.queries, len(rows)))
+
+        exact, latencies = {}, []
+        for index in samples:
+            start = time.perf_counter()
+            top, _ = cosine_top_k(matrix[index], matrix, args.k + 1)
+            latencies.append((time.perf_counter() - start) * 1000)
+            exact[index] = [int(product_ids[i]) for i in top if i != index][:args.k]
+        results.append({
+            'method': 'numpy', 'catalog_size': len(rows), 'recall': 1.0,
+            'p50_ms': round(statistics.median(latencies), 2), 'p95_ms': round(percentile(latencies, 95), 2)
+        })
+        logger.info(results[-1])
+
+        similarity_service = SimilarityService(session)
+        for ef_search in args.ef_search:
+            recalls, latencies = [], []
+            for index in samples:
+                start = time.perf_counter()
+                similar = similarity_service.get_nearest(
+                    matrix[index].tolist(), args.content_type, args.k, exclude_product_id=int(product_ids[index]), ef_search=ef_search
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+                expected = exact[index]
+                recalls.append(len({p.id for p in similar} & set(expected)) / max(1, len(expected)))
+            results.append({
+                'method': 'ann', 'ef_search': ef_search, 'catalog_size': len(rows), 'recall': round(statistics.mean(recalls), 3),
+                'p50_ms': round(statistics.median(latencies), 2), 'p95_ms': round(percentile(latencies, 95), 2)
+            })
+            logger.info(results[-1])
+            session.commit() # ends the transaction, so SET LOCAL hnsw.ef_search is reset
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse
+from shared.db.database import Database
+from shared.catalog_export import CatalogExport
+from shared.logger import logger, setup_logging
+
+
+def main():
+    '''
+    Exports the products with their best current price as sharded, content-hashed static JSON files (with gzip and,
+    if the brotli package is installed, brotli variants) and a manifest.json. Only shards whose contents changed
+    since the last export are written, so unchanged shard files keep their names and cached copies stay valid.
+    '''
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Export the catalog as static, content-hashed JSON shards')
+    parser.add_argument(
+        '--output',
+        default=str(Path(project_root).parent / 'ic' / 'src' / 'ic_frontend' / 'static' / 'catalog'),
+        help='Output directory, defaults to the frontend\'s static/catalog'
+    )
+    parser.add_argument('--shard-size', type=int, default=1000, help='Product IDs per shard')
+    args = parser.parse_args()
+
+    db = Database()
+    with db.get_session() as session:
+        stats = CatalogExport(args.output, args.shard_size).run(session)
+    logger.info('Catalog exported', extra={'fields': {'output': args.output, **stats}})
+
+
+if __name__ == '__main__':
+    main()
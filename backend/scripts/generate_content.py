@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse
+from shared.db.database import Database
+from shared.content_pipeline import ContentPipeline, StubContentGenerator
+from shared.logger import logger, setup_logging
+
+
+GENERATORS = {
+    'stub': StubContentGenerator
+}
+TEST_GENERATORS = {'stub'} # write placeholder content, only for test databases
+
+
+def main():
+    '''
+    Generates missing product content of a content type for the whole catalog. Safe to interrupt and rerun.
+    The generator has to be named explicitly, and test generators such as the stub only run with --allow-test-generator.
+    '''
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Generate missing product content in batches')
+    parser.add_argument('--generator', choices=GENERATORS, required=True, help='Content generator to use')
+    parser.add_argument('--allow-test-generator', action='store_true', help='Allow a test generator to write placeholder content to DATABASE_URL')
+    parser.add_argument('--content-type', help='Content type to generate, defaults to the generator\'s')
+    parser.add_argument('--batch-size', type=int, default=50, help='Products per batch')
+    parser.add_argument('--max-batches', type=int, help='Stop after this many batches')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and retry products that failed before')
+    args = parser.parse_args()
+    if args.generator in TEST_GENERATORS and not args.allow_test_generator:
+        parser.error(f'--generator {args.generator} writes placeholder content, pass --allow-test-generator to run it against a test database')
+
+    generator = GENERATORS[args.generator](args.content_type) if args.content_type else GENERATORS[args.generator]()
+    db = Database()
+    db.init_db()
+    stats = ContentPipeline(db, generator, args.batch_size).run(max_batches=args.max_batches, restart=args.restart)
+    logger.info(f'Finished: {stats}')
+
+
+if __name__ == '__main__':
+    main()
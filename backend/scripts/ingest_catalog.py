@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse
+from shared.db.database import Database
+from shared.catalog_ingestion import CatalogIngestion, PARSERS, read_rows
+from shared.logger import logger, setup_logging
+
+
+def main():
+    '''
+    Loads a catalog dump (CSV, optionally gzipped) into the products table, streaming the file so it may be larger
+    than memory. Existing products are matched by manufacturer and manufacturer_id or EAN and updated, new ones inserted.
+    '''
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Bulk ingest a product catalog dump')
+    parser.add_argument('path', help='CSV file, .gz for gzipped')
+    parser.add_argument('--format', choices=PARSERS, default='merlin', help='Row format of the source')
+    parser.add_argument('--delimiter', default=',', help='CSV delimiter')
+    parser.add_argument('--no-header', action='store_true', help='The file has no header row')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per validation batch and COPY')
+    args = parser.parse_args()
+
+    db = Database()
+    db.init_db()
+    ingestion = CatalogIngestion(db, PARSERS[args.format], args.batch_size)
+    stats = ingestion.run(read_rows(args.path, args.delimiter, skip_header=not args.no_header))
+    logger.info('Catalog ingested', extra={'fields': stats})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse, json, statistics, time
+from concurrent.futures import ThreadPoolExecutor
+import requests # type: ignore
+from shared.logger import logger, setup_logging
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(base_url, paths, concurrency, num_requests, no_cache):
+    '''
+    Sends num_requests GET requests spread over paths from concurrency threads and returns throughput and latency stats.
+    With no_cache, every request gets a unique query parameter so the response cache is bypassed.
+    '''
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def request(i):
+        path = paths[i % len(paths)]
+        if no_cache:
+            path += ('&' if '?' in path else '?') + f'nocache={i}'
+        start = time.perf_counter()
+        response = session.get(base_url + path)
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(request, range(num_requests)))
+    duration = time.perf_counter() - start
+    latencies = [latency * 1000 for latency, _ in results]
+    return {
+        'concurrency': concurrency,
+        'requests': num_requests,
+        'errors': sum(1 for _, status in results if status >= 400),
+        'requests_per_second': round(num_requests / duration, 1),
+        'p50_ms': round(statistics.median(latencies), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'p99_ms': round(percentile(latencies, 99), 1)
+    }
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Measure concurrent request throughput of the API')
+    parser.add_argument('--base-url', default='http://localhost:8000', help='API base URL')
+    parser.add_argument('--paths', nargs='+', default=['/products/1', '/products/1/prices'], help='Paths to request')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50], help='Concurrent clients, one run per value')
+    parser.add_argument('--requests', type=int, default=1000, help='Number of requests per run')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the response cache to measure database throughput')
+    parser.add_argument('--label', default='current', help='Label for the results, e.g. sync or async')
+    parser.add_argument('--output', help='JSON file to append results to, to compare runs before and after a change')
+    args = parser.parse_args()
+
+    results = []
+    for concurrency in args.concurrency:
+        result = {'label': args.label, **run(args.base_url, args.paths, concurrency, args.requests, args.no_cache)}
+        logger.info(result)
+        results.append(result)
+
+    if args.output:
+        path = Path(args.output)
+        previous = json.loads(path.read_text()) if path.exists() else []
+        path.write_text(json.dumps(previous + results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
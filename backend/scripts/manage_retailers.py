@@ -8,18 +8,24 @@ from shared.db.models import Retailer
 from shared.schemas import RetailerConfig
 import argparse
 from shared.db.database import Database
-from shared.logger import logger
+from shared.logger import logger, setup_logging
 
 
-def add_retailer(session, name, base_url, scraping_method='ui', scrape_intervals=None, affiliate_tag=None, selenium_mode='uc', selenium_headed=True, selenium_proxy=None, excluded_brands=None, take_screenshots=False, base_image_url=None):
+def add_retailer(session, name, base_url, scraping_method='ui', scrape_intervals=None, affiliate_tag=None, selenium_mode='uc', selenium_headed=True, selenium_proxy=None, excluded_brands=None, take_screenshots=False, base_image_url=None, concurrency=1, driver_recycle_after=None, page_load_strategy='normal', block_resources=None, blocked_domains=None, wait_for_selector=None):
     config = RetailerConfig(
         base_url=base_url,
         scraping_method=scraping_method,
         take_screenshots=take_screenshots,
+        concurrency=concurrency,
+        driver_recycle_after=driver_recycle_after,
         selenium_settings={
             'mode': selenium_mode,
             'headed': selenium_headed,
-            'proxy': selenium_proxy
+            'proxy': selenium_proxy,
+            'page_load_strategy': page_load_strategy,
+            'block_resources': block_resources or [],
+            'blocked_domains': blocked_domains or [],
+            'wait_for_selector': wait_for_selector
         }
     )
     
@@ -83,20 +89,28 @@ def update_retailer(session, retailer_id, **kwargs):
         retailer.excluded_brands = kwargs['excluded_brands']
 
     # Update scraping_config
-    if any(k in kwargs for k in ['scraping_method', 'take_screenshots', 'selenium_mode', 'selenium_headed', 'selenium_proxy']):
+    selenium_keys = ['selenium_mode', 'selenium_headed', 'selenium_proxy', 'page_load_strategy', 'block_resources', 'blocked_domains', 'wait_for_selector']
+    if any(k in kwargs for k in ['scraping_method', 'take_screenshots', 'concurrency', 'driver_recycle_after'] + selenium_keys):
         config = RetailerConfig.model_validate(retailer.scraping_config)
         
         if 'scraping_method' in kwargs:
             config.scraping_method = kwargs['scraping_method']
         if 'take_screenshots' in kwargs:
             config.take_screenshots = kwargs['take_screenshots']
-        if any(k in kwargs for k in ['selenium_mode', 'selenium_headed', 'selenium_proxy']):
+        if 'concurrency' in kwargs:
+            config.concurrency = kwargs['concurrency']
+        if 'driver_recycle_after' in kwargs:
+            config.driver_recycle_after = kwargs['driver_recycle_after']
+        if any(k in kwargs for k in selenium_keys):
             if 'selenium_mode' in kwargs:
                 config.selenium_settings['mode'] = kwargs['selenium_mode']
             if 'selenium_headed' in kwargs:
                 config.selenium_settings['headed'] = kwargs['selenium_headed']
             if 'selenium_proxy' in kwargs:
                 config.selenium_settings['proxy'] = kwargs['selenium_proxy']
+            for key in ['page_load_strategy', 'block_resources', 'blocked_domains', 'wait_for_selector']:
+                if key in kwargs:
+                    config.selenium_settings[key] = kwargs[key]
         
         retailer.scraping_config = config.model_dump()
 
@@ -119,6 +133,7 @@ def update_retailer(session, retailer_id, **kwargs):
 
 
 def main():
+    setup_logging()
     parser = argparse.ArgumentParser(description='Manage retailers in the database')
     parser.add_argument('action', choices=['add', 'list', 'update'], help='Action to perform')
     parser.add_argument('--id', type=int, help='Retailer ID (required for update)')
@@ -135,6 +150,12 @@ def main():
     parser.add_argument('--excluded-brands', nargs='+', help='List of brands to exclude from scraping')
     parser.add_argument('--take-screenshots', type=str, choices=['True', 'False'], help='Take screenshots during scraping (True/False)')
     parser.add_argument('--base-image-url', help='Base image URL for the retailer')
+    parser.add_argument('--concurrency', type=int, help='Number of drivers scraping in parallel')
+    parser.add_argument('--driver-recycle-after', type=int, help='Restart a driver after this many pages')
+    parser.add_argument('--page-load-strategy', choices=['normal', 'eager', 'none'], help='Page load strategy, eager returns at DOMContentLoaded')
+    parser.add_argument('--block-resources', nargs='+', choices=['image', 'media', 'font', 'stylesheet'], help='Resource types to block in the browser')
+    parser.add_argument('--blocked-domains', nargs='+', help='Domains to block in the browser, "trackers" for common ad and analytics domains')
+    parser.add_argument('--wait-for-selector', help='CSS selector to wait for after opening a page')
     args = parser.parse_args()
     db = Database()
     
@@ -165,7 +186,13 @@ def main():
                     args.selenium_proxy,
                     args.excluded_brands,
                     args.take_screenshots.lower() == 'true',
-                    args.base_image_url
+                    args.base_image_url,
+                    args.concurrency or 1,
+                    args.driver_recycle_after,
+                    args.page_load_strategy or 'normal',
+                    args.block_resources,
+                    args.blocked_domains,
+                    args.wait_for_selector
                 )
             elif args.action == 'list':
                 list_retailers(session)
@@ -189,6 +216,12 @@ def main():
                 if args.take_screenshots is not None: 
                     update_kwargs['take_screenshots'] = args.take_screenshots.lower() == 'true'
                 if args.base_image_url: update_kwargs['base_image_url'] = args.base_image_url
+                if args.concurrency: update_kwargs['concurrency'] = args.concurrency
+                if args.driver_recycle_after: update_kwargs['driver_recycle_after'] = args.driver_recycle_after
+                if args.page_load_strategy: update_kwargs['page_load_strategy'] = args.page_load_strategy
+                if args.block_resources: update_kwargs['block_resources'] = args.block_resources
+                if args.blocked_domains: update_kwargs['blocked_domains'] = args.blocked_domains
+                if args.wait_for_selector: update_kwargs['wait_for_selector'] = args.wait_for_selector
                 
                 update_retailer(session, args.id, **update_kwargs)
         except Exception as e:
@@ -0,0 +1,117 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse
+import datetime
+from sqlalchemy import insert, func # type: ignore
+from shared.db.models import Prices, PriceObservation
+from shared.db.database import Database
+from shared.logger import logger, setup_logging
+
+
+def explode_price_history(price: Prices) -> list:
+    '''
+    Turns the legacy JSON price_history of a price entry into price_observations rows.
+    Legacy entries hold the previous price and the time it was recorded, the current price is added as the latest observation.
+    '''
+    rows = [
+        {
+            'product_id': price.product_id,
+            'retailer_id': price.retailer_id,
+            'observed_at': datetime.datetime.fromisoformat(entry['datetime']),
+            'price': entry['price'],
+            'shipping_cost': None,
+            'in_stock': None
+        }
+        for entry in (price.price_history or [])
+        if isinstance(entry, dict) and 'datetime' in entry
+    ]
+    rows.append({
+        'product_id': price.product_id,
+        'retailer_id': price.retailer_id,
+        'observed_at': price.last_updated or datetime.datetime.now(datetime.UTC),
+        'price': price.price,
+        'shipping_cost': price.shipping_cost,
+        'in_stock': price.in_stock
+    })
+    return rows
+
+
+def as_utc(value: datetime.datetime) -> datetime.datetime:
+    '''
+    Makes naive (UTC) and aware datetimes comparable.
+    '''
+    return value.replace(tzinfo=datetime.UTC) if value.tzinfo is None else value.astimezone(datetime.UTC)
+
+
+def migrate(session, batch_size=1000, clear_json=False):
+    '''
+    Copies the JSON price_history of all price entries into price_observations.
+    Walks the prices table by ID in batches and commits after every batch. For price entries that already
+    have observations (written by PriceService since the deploy, or by an earlier run) only the legacy entries
+    older than their earliest observation are copied, so no history is lost and the migration can be rerun after a crash.
+    PriceService records the value it overwrites as the first observation of an entry, so the migration can run
+    after the new write path went live.
+
+    Args:
+        session: Database session
+        batch_size: Number of price entries per batch
+        clear_json: Set price_history to NULL after migrating a price entry
+    '''
+    earliest = {
+        (product_id, retailer_id): as_utc(observed_at)
+        for product_id, retailer_id, observed_at in session.query(
+            PriceObservation.product_id,
+            PriceObservation.retailer_id,
+            func.min(PriceObservation.observed_at)
+        ).group_by(PriceObservation.product_id, PriceObservation.retailer_id)
+    }
+    last_id = 0
+    num_prices, num_observations = 0, 0
+    while True:
+        prices = session.query(Prices).filter(Prices.id > last_id).order_by(Prices.id).limit(batch_size).all()
+        if not prices:
+            break
+        rows = []
+        for price in prices:
+            first_observed = earliest.get((price.product_id, price.retailer_id))
+            missing = [
+                row for row in explode_price_history(price)
+                if first_observed is None or as_utc(row['observed_at']) < first_observed
+            ]
+            if missing:
+                rows.extend(missing)
+                num_prices += 1
+            if clear_json:
+                price.price_history = None
+        if rows:
+            session.execute(insert(PriceObservation), rows)
+            num_observations += len(rows)
+        last_id = prices[-1].id
+        session.commit()
+        logger.info(f'Migrated price history up to price ID {last_id} ({num_prices} prices, {num_observations} observations)')
+    logger.info(f'Done: migrated {num_prices} prices into {num_observations} observations')
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Migrate the JSON price_history column into the price_observations table')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Number of price entries per batch')
+    parser.add_argument('--clear-json', action='store_true', help='Set price_history to NULL after migrating')
+    args = parser.parse_args()
+    db = Database()
+    db.init_db()
+
+    with db.get_session() as session:
+        try:
+            migrate(session, args.batch_size, args.clear_json)
+        except Exception as e:
+            logger.error(f'Migration failed: {str(e)}')
+            raise
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse, json
+from shared.db.database import Database
+from shared.db.services.scrape_plan_service import ScrapePlanService
+from shared.db.services.scrape_job_service import ScrapeJobService
+from shared.logger import logger, setup_logging
+
+
+# Job priorities for --enqueue, newer sets first
+BUCKET_PRIORITIES = {'current_year': 3.0, 'previous_year': 2.0, 'older': 1.0}
+
+
+def main():
+    '''
+    Prints the due products and estimated runtime of a scrape cycle per retailer, computed with one query
+    across all retailers and release_year buckets. Optionally enqueues the due work in the scrape_jobs table.
+    '''
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Plan a scrape cycle across all retailers')
+    parser.add_argument('--seconds-per-product', type=json.loads, default={}, help='Measured seconds per product by retailer ID as JSON, e.g. \'{"1": 6.5}\'')
+    parser.add_argument('--json', action='store_true', help='Print the plan as JSON')
+    parser.add_argument('--enqueue', action='store_true', help='Add the due work to the scrape_jobs table')
+    args = parser.parse_args()
+
+    db = Database()
+    with db.get_session() as session:
+        plan = ScrapePlanService(session).get_plan({int(k): v for k, v in args.seconds_per_product.items()})
+    if args.json:
+        print(json.dumps(plan, indent=2))
+    else:
+        print(f'{"retailer":<24} {"method":<8} {"current":>8} {"previous":>9} {"older":>8} {"total":>8} {"batches":>8} {"est. hours":>10}')
+        for entry in plan:
+            print(
+                f'{entry["name"][:24]:<24} {entry["scraping_method"]:<8} {entry["current_year"]:>8} {entry["previous_year"]:>9} '
+                f'{entry["older"]:>8} {entry["total"]:>8} {entry["batches"]:>8} {entry["estimated_seconds"] / 3600:>10.1f}'
+            )
+
+    if args.enqueue:
+        with db.get_session() as session:
+            jobs = [
+                (product_id, retailer_id, BUCKET_PRIORITIES[bucket])
+                for retailer_id, product_id, bucket in ScrapePlanService(session).iter_due_work()
+            ]
+        with db.get_session() as session:
+            written = ScrapeJobService(session).enqueue(jobs)
+        logger.info(f'Enqueued {written} of {len(jobs)} due scrape jobs')
+
+
+if __name__ == '__main__':
+    main()
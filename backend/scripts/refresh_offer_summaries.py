@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from shared.db.database import Database
+from shared.db.services.offer_summary_service import OfferSummaryService
+from shared.logger import logger, setup_logging
+
+
+def main():
+    '''
+    Rebuilds product_offer_summaries for all products, e.g. after creating the table.
+    PriceService keeps the summaries up to date incrementally afterwards.
+    '''
+    setup_logging()
+    db = Database()
+    db.init_db()
+    with db.get_session() as session:
+        OfferSummaryService(session).refresh()
+    logger.info('Refreshed product_offer_summaries')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import sys
+from pathlib import Path
+
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+import argparse, importlib, multiprocessing, os, random, time
+from typing import List
+from shared.db.database import Database
+from shared.db.services.scrape_job_service import ScrapeJobService
+from shared.schemas import RetailerConfig, ProductSchema, PriceSchema
+from shared.logger import logger, setup_logging
+
+
+class SimulatedScraper:
+    '''
+    Stands in for a retailer scraper to exercise the job queue without browsers: sleeps delay seconds per product
+    and returns a random price. With crash_rate > 0 the whole process exits mid-batch, leaving its leases to expire.
+    '''
+    def __init__(self, retailer_config: RetailerConfig, delay: float = 0.05, crash_rate: float = 0.0):
+        self.retailer_id = retailer_config.id
+        self.delay = delay
+        self.crash_rate = crash_rate
+
+
+    def run(self, products: List[ProductSchema]) -> List[PriceSchema]:
+        results = []
+        for product in products:
+            time.sleep(self.delay)
+            if random.random() < self.crash_rate:
+                logger.warning(f'Simulated crash of worker process {os.getpid()}')
+                os._exit(1)
+            results.append(PriceSchema(
+                product_id=product.id,
+                retailer_id=self.retailer_id,
+                price=round(random.uniform(10, 500), 2),
+                in_stock=True,
+                url=f'https://example.com/{product.id}'
+            ))
+        return results
+
+
+def load_scraper_factory(path: str):
+    '''
+    Imports a scraper class from "module:Class", e.g. "scrapers.example:ExampleScraper".
+    '''
+    module_name, class_name = path.split(':', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def run_worker(args: argparse.Namespace):
+    setup_logging()
+    from scraping.job_worker import ScrapeWorker
+    if args.scraper:
+        factory = load_scraper_factory(args.scraper)
+    else:
+        factory = lambda config: SimulatedScraper(config, args.delay, args.crash_rate)
+    worker = ScrapeWorker(
+        Database(),
+        args.retailer_id,
+        factory,
+        batch_size=args.batch_size,
+        lease_seconds=args.lease_seconds,
+        heartbeat_interval=args.heartbeat_interval
+    )
+    worker.run(idle_seconds=args.idle_seconds, max_batches=args.max_batches)
+
+
+def main():
+    '''
+    Starts several scraper worker processes for a retailer on this node, all pulling from the scrape_jobs table.
+    Run it on several machines against the same Postgres to scrape with more nodes. Without --scraper the workers
+    use SimulatedScraper, e.g. to check that workers get disjoint batches and that leases of crashed workers are reclaimed.
+    '''
+    setup_logging()
+    parser = argparse.ArgumentParser(description='Run scraper workers that claim jobs from the scrape_jobs table')
+    parser.add_argument('--retailer-id', type=int, required=True, help='Retailer to scrape')
+    parser.add_argument('--workers', type=int, default=4, help='Number of worker processes')
+    parser.add_argument('--scraper', help='Scraper class as module:Class, simulated if omitted')
+    parser.add_argument('--publish', action='store_true', help='Publish the scheduler queue of the retailer to scrape_jobs first')
+    parser.add_argument('--batch-size', type=int, help='Jobs per claim, defaults to the retailer\'s scrape_budget')
+    parser.add_argument('--lease-seconds', type=int, default=300, help='Lease duration of claimed jobs')
+    parser.add_argument('--heartbeat-interval', type=int, default=60, help='Seconds between lease extensions')
+    parser.add_argument('--idle-seconds', type=int, default=30, help='Seconds to wait when the queue is empty')
+    parser.add_argument('--max-batches', type=int, help='Batches per worker before it exits')
+    parser.add_argument('--delay', type=float, default=0.05, help='Seconds per product of the simulated scraper')
+    parser.add_argument('--crash-rate', type=float, default=0.0, help='Probability per product that a simulated worker crashes')
+    args = parser.parse_args()
+
+    db = Database()
+    db.init_db()
+    if args.publish:
+        from scraping.scheduler import ScrapeScheduler
+        ScrapeScheduler(db).publish(args.retailer_id)
+
+    processes = [multiprocessing.Process(target=run_worker, args=(args,)) for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    with db.get_session() as session:
+        logger.info('Scrape jobs', extra={'fields': ScrapeJobService(session).get_stats(args.retailer_id)})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+from typing import Optional, List, Dict, Iterable, Tuple, Set
+from collections import OrderedDict
+from dotenv import load_dotenv
+from shared.db.models import Product
+from shared.logger import logger
+import os, threading, time
+
+try:
+    import redis # type: ignore
+except ImportError:
+    redis = None
+
+
+class MemoryCache:
+    '''
+    In-process LRU cache with a TTL per entry and tag-based invalidation. Thread-safe.
+    '''
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Tuple[float, bytes, Tuple[str, ...]]] = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return None
+            expires, value, _ = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+
+    def set(self, key: str, value: bytes, ttl: int, tags: Iterable[str] = ()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            tags = tuple(tags)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+
+    def _remove(self, key: str):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisCache:
+    '''
+    Cache backed by a Redis-compatible server, shared by all API workers and scrapers.
+    Tags are stored as sets of keys, so a price write in a scraper process invalidates the API's cached responses.
+    '''
+    def __init__(self, url: str, prefix: str = 'api-cache:'):
+        if redis is None:
+            raise ImportError('The redis package is required for a redis:// CACHE_URL')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+
+    def set(self, key: str, value: bytes, ttl: int, tags: Iterable[str] = ()):
+        pipeline = self.client.pipeline()
+        pipeline.setex(self.prefix + key, ttl, value)
+        for tag in tags:
+            pipeline.sadd(f'{self.prefix}tag:{tag}', key)
+            pipeline.expire(f'{self.prefix}tag:{tag}', ttl)
+        pipeline.execute()
+
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        for tag in tags:
+            tag_key = f'{self.prefix}tag:{tag}'
+            keys = self.client.smembers(tag_key)
+            if keys:
+                self.client.delete(*[self.prefix + k.decode() for k in keys])
+            self.client.delete(tag_key)
+
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f'{self.prefix}*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_cache():
+    '''
+    Creates the cache backend from the CACHE_URL environment variable:
+    redis://... uses RedisCache, anything else an in-process MemoryCache.
+    With the MemoryCache, writes from other processes (scrapers) are only picked up after CACHE_TTL.
+    '''
+    load_dotenv()
+    url = os.getenv('CACHE_URL')
+    if url and url.startswith(('redis://', 'rediss://')):
+        try:
+            return RedisCache(url)
+        except Exception as e:
+            logger.error(f'Error connecting to cache at {url}, falling back to memory cache: {e}')
+    return MemoryCache(int(os.getenv('CACHE_MAX_ENTRIES', 10000)))
+
+
+cache = create_cache()
+CACHE_TTL = int(os.getenv('CACHE_TTL', 300))
+
+
+def product_tags(product_ids: Iterable[int], manufacturers: Iterable[str]) -> List[str]:
+    '''
+    Returns the cache tags to invalidate when prices or data of products change.
+    '''
+    return [f'product:{id}' for id in product_ids] + [f'manufacturer:{m}' for m in manufacturers] + ['best_offers']
+
+
+def invalidate_products(session, product_ids: Iterable[int], previous_manufacturers: Iterable[str] = ()):
+    '''
+    Invalidates cached responses for the given products and their manufacturers.
+
+    Args:
+        session: Database session to read the current manufacturers of the products
+        product_ids: IDs of the changed products
+        previous_manufacturers: Manufacturers the products had before the change, whose listings also contained them
+    '''
+    product_ids = list(set(product_ids))
+    if not product_ids:
+        return
+    manufacturers = {m for (m,) in session.query(Product.manufacturer).filter(Product.id.in_(product_ids)).distinct().all()}
+    manufacturers.update(m for m in previous_manufacturers if m)
+    try:
+        cache.invalidate_tags(product_tags(product_ids, manufacturers))
+    except Exception as e:
+        logger.error(f'Error invalidating cache: {e}')
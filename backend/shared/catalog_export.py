@@ -0,0 +1,139 @@
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from pathlib import Path
+from sqlalchemy import select # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+from shared.db.models import Product, ProductOfferSummary
+from shared.logger import logger
+import datetime, gzip, hashlib, itertools, json
+
+try:
+    import brotli # type: ignore
+except ImportError:
+    brotli = None
+
+
+MANIFEST_NAME = 'manifest.json'
+EXPORT_COLUMNS = [
+    Product.id, Product.manufacturer, Product.manufacturer_id, Product.name, Product.release_year, Product.base_image_url,
+    ProductOfferSummary.min_price, ProductOfferSummary.min_price_retailer_id, ProductOfferSummary.offer_count, ProductOfferSummary.discount
+]
+
+
+def iter_shards(session: Session, shard_size: int, batch_size: int = 5000) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    '''
+    Yields (index, products) for consecutive ID ranges of shard_size (shard i holds IDs i * shard_size to (i + 1) * shard_size - 1),
+    with each product's best in-stock offer from product_offer_summaries. Streams the products ordered by ID,
+    so only one shard is held in memory. Shards without products are skipped.
+
+    Fixed ID ranges keep shard boundaries stable: new products only change the last shards and a price change
+    only changes the shard of its product.
+    '''
+    query = select(*EXPORT_COLUMNS).outerjoin(ProductOfferSummary, ProductOfferSummary.product_id == Product.id).order_by(Product.id)
+    rows = session.execute(query.execution_options(yield_per=batch_size))
+    for index, shard_rows in itertools.groupby(rows, key=lambda row: row.id // shard_size):
+        yield index, [{key: value for key, value in row._asdict().items() if value is not None} for row in shard_rows]
+
+
+def serialize(products: List[Dict[str, Any]]) -> bytes:
+    '''
+    Serializes a shard deterministically, so unchanged contents produce the same bytes and hash.
+    '''
+    return json.dumps(products, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode()
+
+
+class CatalogExport:
+    '''
+    Writes the catalog (products with their best current price) as static, sharded JSON files with content-hashed names
+    (products-<index>.<hash>.json plus .json.gz and, with the brotli package, .json.br) and a manifest.json listing them.
+
+    Shard files never change once written, so they can be served with an immutable cache policy; only manifest.json
+    has to be revalidated. Each export compares the shard hashes with the previous manifest and only writes changed
+    shards. Files referenced by neither the new nor the previous manifest are removed, so clients that loaded the
+    previous manifest can still fetch its shards during a deploy.
+    '''
+    def __init__(self, output_dir: str, shard_size: int = 1000):
+        '''
+        Args:
+            output_dir: Directory for the shards and manifest, e.g. the frontend's static/catalog
+            shard_size: Product IDs per shard
+        '''
+        self.output_dir = Path(output_dir)
+        self.shard_size = shard_size
+
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        path = self.output_dir / MANIFEST_NAME
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+
+    def _write_shard(self, name: str, data: bytes) -> int:
+        '''
+        Writes a shard and its compressed variants. Returns the size of the gzipped file.
+        '''
+        (self.output_dir / name).write_bytes(data)
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        (self.output_dir / f'{name}.gz').write_bytes(compressed)
+        if brotli:
+            (self.output_dir / f'{name}.br').write_bytes(brotli.compress(data))
+        return len(compressed)
+
+
+    def run(self, session: Session) -> Dict[str, int]:
+        '''
+        Exports the catalog and returns the counts of written, unchanged and removed shards and exported products.
+        '''
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        previous = self._read_manifest()
+        if previous and previous.get('shard_size') != self.shard_size:
+            previous_shards = {}
+        else:
+            previous_shards = {shard['index']: shard for shard in (previous or {}).get('shards', [])}
+        if brotli is None:
+            logger.warning('The brotli package is not installed, writing gzip files only')
+
+        stats = {'written': 0, 'unchanged': 0, 'removed': 0, 'products': 0}
+        shards = []
+        for index, products in iter_shards(session, self.shard_size):
+            data = serialize(products)
+            content_hash = hashlib.sha256(data).hexdigest()[:16]
+            name = f'products-{index}.{content_hash}.json'
+            old = previous_shards.get(index)
+            if old and old['hash'] == content_hash and (self.output_dir / name).exists():
+                gzip_bytes = old['gzip_bytes']
+                stats['unchanged'] += 1
+            else:
+                gzip_bytes = self._write_shard(name, data)
+                stats['written'] += 1
+            shards.append({
+                'index': index,
+                'file': name,
+                'hash': content_hash,
+                'count': len(products),
+                'first_id': products[0]['id'],
+                'last_id': products[-1]['id'],
+                'bytes': len(data),
+                'gzip_bytes': gzip_bytes
+            })
+            stats['products'] += len(products)
+
+        manifest = {
+            'version': 1,
+            'generated_at': datetime.datetime.now(datetime.UTC).isoformat(),
+            'shard_size': self.shard_size,
+            'products': stats['products'],
+            'shards': shards
+        }
+        manifest_path = self.output_dir / MANIFEST_NAME
+        temporary_path = manifest_path.with_suffix('.json.tmp')
+        temporary_path.write_text(json.dumps(manifest, indent=1))
+        temporary_path.replace(manifest_path) # atomic, readers never see a partial manifest
+
+        keep = {shard['file'] for shard in shards} | {shard['file'] for shard in (previous or {}).get('shards', [])}
+        for path in self.output_dir.glob('products-*.json*'):
+            if path.name.removesuffix('.gz').removesuffix('.br') not in keep:
+                path.unlink()
+                stats['removed'] += path.suffix == '.json'
+        return stats
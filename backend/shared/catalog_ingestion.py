@@ -0,0 +1,201 @@
+from typing import List, Dict, Any, Iterable, Iterator, Callable, Tuple
+from sqlalchemy import Table, Column, MetaData, Integer, BigInteger, String, Text, Float, select, insert, update, delete, func, or_, literal # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+from pydantic import ValidationError
+from shared.db.database import Database
+from shared.db.models import Product
+from shared.db.services.offer_summary_service import OfferSummaryService
+from shared.cache import invalidate_products
+from shared.schemas import ProductSchema
+from shared.logger import logger
+import csv, datetime, gzip, io, itertools
+
+
+# Product columns a catalog source can set, updates keep the existing value where the source has none
+INGEST_COLUMNS = [
+    'manufacturer_id', 'name', 'manufacturer', 'category', 'base_image_url', 'description', 'piece_count',
+    'minifigures', 'release_year', 'ean', 'minifigs', 'age_recommendation', 'rrp'
+]
+PARSERS: Dict[str, Callable[[list], ProductSchema]] = {
+    'merlin': ProductSchema.from_merlin_product
+}
+
+
+def read_rows(path: str, delimiter: str = ',', skip_header: bool = True) -> Iterator[list]:
+    '''
+    Streams the rows of a CSV file (gzipped if it ends with .gz) without reading the whole file into memory.
+    '''
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        if skip_header:
+            next(reader, None)
+        yield from reader
+
+
+def staging_tables() -> Tuple[Table, Table]:
+    '''
+    Returns the temporary tables for an ingestion: product_staging with all valid source rows in file order,
+    and product_ingest with one row per product after deduplication, the ID of the matching existing product
+    and the source row number.
+    '''
+    metadata = MetaData()
+    columns = lambda: [
+        Column('manufacturer_id', String), Column('name', String), Column('manufacturer', String),
+        Column('category', String), Column('base_image_url', String), Column('description', Text),
+        Column('piece_count', Integer), Column('minifigures', Integer), Column('release_year', Integer),
+        Column('ean', String), Column('minifigs', Integer), Column('age_recommendation', String), Column('rrp', Float)
+    ]
+    staging = Table('product_staging', metadata, Column('row_number', BigInteger), *columns(), prefixes=['TEMPORARY'])
+    ingest = Table('product_ingest', metadata, Column('product_id', Integer), Column('row_number', BigInteger), *columns(), prefixes=['TEMPORARY'])
+    return staging, ingest
+
+
+class CatalogIngestion:
+    '''
+    Loads a catalog dump into the products table in one transaction, for files of any size.
+
+    Source rows are parsed into ProductSchemas in batches of batch_size and loaded into a temporary staging table,
+    with COPY on Postgres. Rows are then deduplicated (the last row per manufacturer and manufacturer_id, or EAN
+    without a manufacturer_id, wins), matched against existing products by manufacturer and manufacturer_id or by EAN,
+    and merged: matched products are updated where a value changed, all others are inserted. If several rows match
+    the same existing product (e.g. different manufacturer_ids with the same EAN), the last one wins and the others
+    are skipped.
+    '''
+    def __init__(self, db: Database, parser: Callable[[list], ProductSchema] = ProductSchema.from_merlin_product, batch_size: int = 5000):
+        '''
+        Args:
+            db: Database instance
+            parser: Turns a source row into a ProductSchema, e.g. ProductSchema.from_merlin_product
+            batch_size: Rows per validation batch and COPY
+        '''
+        self.db = db
+        self.parser = parser
+        self.batch_size = batch_size
+
+
+    def _validate(self, rows: List[list]) -> Tuple[List[Dict[str, Any]], int]:
+        '''
+        Parses a batch of source rows. Returns the valid rows as dicts of INGEST_COLUMNS and the number of invalid rows.
+        Rows without manufacturer_id and EAN cannot be matched and count as invalid.
+        '''
+        valid = []
+        for row in rows:
+            try:
+                product = self.parser(row)
+            except (ValidationError, IndexError, ValueError, TypeError):
+                continue
+            if product.manufacturer_id or product.ean:
+                valid.append(product.model_dump(include=set(INGEST_COLUMNS)))
+        return valid, len(rows) - len(valid)
+
+
+    def _load(self, session: Session, staging: Table, rows: List[Dict[str, Any]], first_row_number: int):
+        '''
+        Appends rows to the staging table, with COPY on Postgres and a multi-row INSERT elsewhere.
+        '''
+        values = [{'row_number': first_row_number + i, **row} for i, row in enumerate(rows)]
+        if session.get_bind().dialect.name != 'postgresql':
+            session.execute(insert(staging), values)
+            return
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        columns = [column.name for column in staging.columns]
+        for value in values:
+            writer.writerow([value[column] for column in columns]) # None is written unquoted, which COPY reads as NULL
+        buffer.seek(0)
+        with session.connection().connection.driver_connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY {staging.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+    def _merge(self, session: Session, staging: Table, ingest: Table) -> Dict[str, int]:
+        '''
+        Deduplicates the staging table into product_ingest, drops all but the last row matching the same
+        existing product, then updates matched and inserts new products. Refreshes the offer summaries of
+        updated products whose rrp changed, since their discount is computed from it.
+        '''
+        key = func.coalesce(staging.c.manufacturer_id, literal('ean:') + staging.c.ean)
+        ranked = select(
+            staging.c.row_number,
+            *[staging.c[column] for column in INGEST_COLUMNS],
+            func.row_number().over(partition_by=[staging.c.manufacturer, key], order_by=staging.c.row_number.desc()).label('rank')
+        ).subquery()
+        by_manufacturer_id = select(Product.id).where(
+            Product.manufacturer == ranked.c.manufacturer,
+            Product.manufacturer_id == ranked.c.manufacturer_id
+        ).limit(1).scalar_subquery()
+        by_ean = select(Product.id).where(Product.ean == ranked.c.ean).limit(1).scalar_subquery()
+        deduplicated = session.execute(insert(ingest).from_select(
+            ['product_id', 'row_number', *INGEST_COLUMNS],
+            select(
+                func.coalesce(by_manufacturer_id, by_ean), ranked.c.row_number, *[ranked.c[column] for column in INGEST_COLUMNS]
+            ).where(ranked.c.rank == 1)
+        )).rowcount
+        other = ingest.alias('other')
+        last_match = select(func.max(other.c.row_number)).where(other.c.product_id == ingest.c.product_id).scalar_subquery()
+        skipped = session.execute(
+            delete(ingest).where(ingest.c.product_id.isnot(None), ingest.c.row_number < last_match)
+        ).rowcount
+
+        now = datetime.datetime.now(datetime.UTC)
+        new_values = {column: func.coalesce(ingest.c[column], Product.__table__.c[column]) for column in INGEST_COLUMNS}
+        rrp_changed_ids = session.execute(
+            select(Product.id).where(Product.id == ingest.c.product_id, Product.rrp.is_distinct_from(new_values['rrp']))
+        ).scalars().all()
+        updated_ids = session.execute(
+            update(Product).where(
+                Product.id == ingest.c.product_id,
+                or_(*[Product.__table__.c[column].is_distinct_from(value) for column, value in new_values.items()])
+            ).values(**new_values, created_at=now).returning(Product.id)
+        ).scalars().all()
+        inserted_ids = session.execute(
+            insert(Product).from_select(
+                [*INGEST_COLUMNS, 'created_at'],
+                select(*[ingest.c[column] for column in INGEST_COLUMNS], literal(now)).where(ingest.c.product_id.is_(None))
+            ).returning(Product.id)
+        ).scalars().all()
+        for i in range(0, len(rrp_changed_ids), 1000):
+            OfferSummaryService(session).refresh(rrp_changed_ids[i:i + 1000])
+        matched = session.execute(select(func.count()).select_from(ingest).where(ingest.c.product_id.isnot(None))).scalar()
+        return {
+            'deduplicated': deduplicated,
+            'skipped': skipped,
+            'inserted': len(inserted_ids),
+            'updated': len(updated_ids),
+            'unchanged': matched - len(updated_ids),
+            'changed_ids': [*updated_ids, *inserted_ids]
+        }
+
+
+    def run(self, rows: Iterable[list]) -> Dict[str, int]:
+        '''
+        Ingests source rows and returns the counts of read, invalid, duplicate (within the source), skipped
+        (matching an existing product another row already matched), inserted, updated and unchanged rows. Nothing is written if the ingestion fails.
+        '''
+        staging, ingest = staging_tables()
+        stats = {'read': 0, 'invalid': 0}
+        iterator = iter(rows)
+        with self.db.get_session() as session:
+            connection = session.connection()
+            for table in (staging, ingest):
+                table.drop(connection, checkfirst=True)
+                table.create(connection)
+            staged = 0
+            while batch := list(itertools.islice(iterator, self.batch_size)):
+                valid, invalid = self._validate(batch)
+                stats['read'] += len(batch)
+                stats['invalid'] += invalid
+                if valid:
+                    self._load(session, staging, valid, staged)
+                    staged += len(valid)
+                logger.info(f'Staged {staged} of {stats["read"]} catalog rows')
+            merged = self._merge(session, staging, ingest)
+            changed_ids = merged.pop('changed_ids')
+            stats['duplicates'] = staged - merged.pop('deduplicated')
+            stats.update(merged)
+            for table in (ingest, staging):
+                table.drop(connection)
+            session.commit()
+            for i in range(0, len(changed_ids), 1000):
+                invalidate_products(session, changed_ids[i:i + 1000])
+        return stats
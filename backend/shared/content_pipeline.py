@@ -0,0 +1,86 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+from shared.db.database import Database
+from shared.db.services.product_content_service import ProductContentService
+from shared.schemas import ProductSchema
+from shared.logger import logger
+
+
+class ContentGenerator(ABC):
+    '''
+    Abstract class for content generators used by ContentPipeline.
+    A generator produces content of one content_type for a batch of products, e.g. with one LLM request per batch.
+    '''
+    content_type: str
+
+    @abstractmethod
+    def generate(self, products: List[ProductSchema]) -> Dict[int, Any]:
+        '''
+        Returns product ID -> content (dict or list) for the products it could generate content for.
+        Products missing from the result count as failed and are skipped until the checkpoint is reset.
+        '''
+        pass
+
+
+class StubContentGenerator(ContentGenerator):
+    '''
+    Local generator without external calls, for tests and dry runs of the pipeline.
+    '''
+    def __init__(self, content_type: str = 'stub'):
+        self.content_type = content_type
+
+    def generate(self, products: List[ProductSchema]) -> Dict[int, Any]:
+        return {
+            product.id: {'text': f'{product.manufacturer} {product.name}'.strip(), 'piece_count': product.piece_count}
+            for product in products
+        }
+
+
+class ContentPipeline:
+    '''
+    Generates missing ProductContent for the whole catalog in batches.
+
+    Products lacking the generator's content_type are read by ID in batches of batch_size, so memory stays bounded.
+    Every batch's content is bulk inserted and committed together with a checkpoint (the last product ID), so after a
+    crash the next run continues after the last finished batch instead of redoing work.
+    '''
+    def __init__(self, db: Database, generator: ContentGenerator, batch_size: int = 50):
+        self.db = db
+        self.generator = generator
+        self.batch_size = batch_size
+
+
+    def run(self, max_batches: Optional[int] = None, restart: bool = False) -> Dict[str, int]:
+        '''
+        Processes batches until no products are left or max_batches is reached. Returns the processed and failed counts of this run.
+
+        Args:
+            max_batches: Optional max number of batches to process in this run
+            restart: Ignore the checkpoint and retry all products without content, including ones that failed before
+        '''
+        content_type = self.generator.content_type
+        if restart:
+            with self.db.get_session() as session:
+                ProductContentService(session).reset_checkpoint(content_type)
+        with self.db.get_session() as session:
+            checkpoint = ProductContentService(session).get_checkpoint(content_type)
+            after_id = checkpoint.last_product_id if checkpoint else 0
+
+        stats = {'processed': 0, 'failed': 0, 'batches': 0}
+        while max_batches is None or stats['batches'] < max_batches:
+            with self.db.get_session() as session:
+                content_service = ProductContentService(session)
+                products = content_service.get_products_without_content_type(content_type, after_id, self.batch_size)
+                if not products:
+                    break
+                contents = self.generator.generate(products)
+                contents = {product.id: contents[product.id] for product in products if contents.get(product.id) is not None}
+                failed = len(products) - len(contents)
+                content_service.bulk_add_content(content_type, contents)
+                content_service.save_checkpoint(content_type, products[-1].id, len(contents), failed)
+            after_id = products[-1].id
+            stats['processed'] += len(contents)
+            stats['failed'] += failed
+            stats['batches'] += 1
+            logger.info(f'Generated {content_type} for {stats["processed"]} products ({stats["failed"]} failed), up to product {after_id}')
+        return stats
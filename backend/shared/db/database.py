@@ -1,41 +1,195 @@
-from contextlib import contextmanager
-from typing import Generator
-from sqlalchemy import create_engine
+from contextlib import contextmanager, asynccontextmanager
+from typing import Generator, AsyncGenerator, Dict, Any, Optional, List
+from sqlalchemy import create_engine, inspect, text, Column, Index
 from sqlalchemy.orm import Session, sessionmaker
-from .models import Base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession # type: ignore
+from .models import Base, Product, Prices
+from .instrumentation import QueryStats, track_queries, instrument_engine
 import os
 from dotenv import load_dotenv
 from shared.logger import logger
 
 
+def engine_options(connection_string: str) -> Dict[str, Any]:
+    '''
+    Returns connection pool settings from environment variables.
+    Pre-ping discards connections that were closed by the server, recycle replaces connections older than DB_POOL_RECYCLE seconds.
+    '''
+    if connection_string.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+
+
+def instrumentation_options() -> Dict[str, Any]:
+    '''
+    Returns the query instrumentation settings from environment variables. DB_INSTRUMENT=1 enables it.
+    '''
+    return {
+        'enabled': os.getenv('DB_INSTRUMENT', '0').lower() in ('1', 'true'),
+        'slow_query_ms': float(os.getenv('DB_SLOW_QUERY_MS', 200)),
+        'explain_slow': os.getenv('DB_EXPLAIN_SLOW', '1').lower() in ('1', 'true'),
+        'session_query_warning': int(os.getenv('DB_SESSION_QUERY_WARNING', 50))
+    }
+
+
+def log_session_stats(stats: QueryStats, threshold: int):
+    '''
+    Warns about sessions issuing many statements, which usually means an N+1 query pattern.
+    '''
+    if stats.count >= threshold:
+        logger.warning(
+            f'Session issued {stats.count} queries',
+            extra={'fields': {'queries': stats.count, 'db_time_ms': round(stats.duration * 1000, 1)}}
+        )
+
+
+def get_index(model, name: str) -> Index:
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+# Columns and indexes added to existing tables, which create_all does not alter. Columns must be nullable.
+ADDED_COLUMNS = [Prices.__table__.c.last_checked]
+ADDED_INDEXES = [
+    get_index(Prices, 'ix_prices_retailer_last_updated'),
+    get_index(Product, 'ix_products_release_year'),
+    get_index(Product, 'ix_products_ean'),
+    get_index(Product, 'ix_products_manufacturer_manufacturer_id')
+]
+
+
+def add_missing_columns(engine, columns: List[Column]) -> List[str]:
+    '''
+    Adds columns that are missing from existing tables with ALTER TABLE. Returns the added columns as table.column.
+    '''
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as connection:
+        for column in columns:
+            existing = {c['name'] for c in inspector.get_columns(column.table.name)}
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            connection.execute(text(f'ALTER TABLE {column.table.name} ADD COLUMN {column.name} {column_type}'))
+            added.append(f'{column.table.name}.{column.name}')
+    return added
+
+
+def create_missing_indexes(engine, indexes: List[Index]) -> List[str]:
+    '''
+    Creates indexes that are missing on existing tables. Returns the names of the created indexes.
+    Building an index blocks writes to its table until it is done.
+    '''
+    inspector = inspect(engine)
+    created = []
+    for index in indexes:
+        existing = {i['name'] for i in inspector.get_indexes(index.table.name)}
+        if index.name in existing:
+            continue
+        logger.info(f'Creating index {index.name} on {index.table.name}')
+        index.create(engine, checkfirst=True)
+        created.append(index.name)
+    return created
+
+
+def to_async_url(connection_string: str) -> str:
+    '''
+    Turns a DATABASE_URL into the equivalent URL for the asyncpg (or aiosqlite) driver.
+    '''
+    scheme, rest = connection_string.split('://', 1)
+    if scheme.startswith('postgres'):
+        return f'postgresql+asyncpg://{rest}'
+    if scheme.startswith('sqlite'):
+        return f'sqlite+aiosqlite://{rest}'
+    return connection_string
+
+
 class Database:
     '''
     Database connection manager that handles SQLAlchemy session lifecycle.
-    
+
     Exposes a context manager for handling database sessions with automatic commit/rollback
-    and cleanup.
+    and cleanup. With instrumentation enabled (DB_INSTRUMENT=1 or instrument=True), statements are
+    counted and timed per session (see shared/db/instrumentation.py) and slow queries are logged.
     '''
-    def __init__(self):
+    def __init__(self, instrument: Optional[bool] = None):
         load_dotenv()
         self.connection_string = os.getenv('DATABASE_URL')
         if not self.connection_string:
             logger.error('DATABASE_URL not found in environment variables')
             raise ValueError('DATABASE_URL not found in environment variables')
-        self.engine = create_engine(self.connection_string)
+        self.engine = create_engine(self.connection_string, **engine_options(self.connection_string))
         self.Session = sessionmaker(bind=self.engine)
-    
+        self.instrumentation = instrumentation_options()
+        if instrument is not None:
+            self.instrumentation['enabled'] = instrument
+        if self.instrumentation['enabled']:
+            instrument_engine(self.engine, self.instrumentation['slow_query_ms'], self.instrumentation['explain_slow'])
+
     def init_db(self):
         logger.info("Initializing database")
         Base.metadata.create_all(self.engine)
-    
+        for column in add_missing_columns(self.engine, ADDED_COLUMNS):
+            logger.info(f'Added column {column}')
+        create_missing_indexes(self.engine, ADDED_INDEXES)
+
     @contextmanager
     def get_session(self) -> Generator[Session, None, None]:
         session = self.Session()
-        try:
-            yield session
-            session.commit()
-        except Exception:
-            session.rollback()
-            raise
-        finally:
-            session.close() 
\ No newline at end of file
+        with track_queries() as stats:
+            try:
+                yield session
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+        if self.instrumentation['enabled']:
+            log_session_stats(stats, self.instrumentation['session_query_warning'])
+
+
+class AsyncDatabase:
+    '''
+    Async counterpart of Database for the API, using SQLAlchemy asyncio with asyncpg.
+
+    Uses ASYNC_DATABASE_URL or derives the URL from DATABASE_URL. Exposes an async context manager
+    for sessions with automatic commit/rollback and cleanup. Instrumented like Database.
+    '''
+    def __init__(self, instrument: Optional[bool] = None):
+        load_dotenv()
+        connection_string = os.getenv('ASYNC_DATABASE_URL') or os.getenv('DATABASE_URL')
+        if not connection_string:
+            logger.error('DATABASE_URL not found in environment variables')
+            raise ValueError('DATABASE_URL not found in environment variables')
+        self.connection_string = to_async_url(connection_string)
+        self.engine = create_async_engine(self.connection_string, **engine_options(self.connection_string))
+        self.Session = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        self.instrumentation = instrumentation_options()
+        if instrument is not None:
+            self.instrumentation['enabled'] = instrument
+        if self.instrumentation['enabled']:
+            instrument_engine(self.engine.sync_engine, self.instrumentation['slow_query_ms'], self.instrumentation['explain_slow'])
+
+    @asynccontextmanager
+    async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
+        session = self.Session()
+        with track_queries() as stats:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+            finally:
+                await session.close()
+        if self.instrumentation['enabled']:
+            log_session_stats(stats, self.instrumentation['session_query_warning'])
+
+    async def dispose(self):
+        await self.engine.dispose()
@@ -0,0 +1,84 @@
+from typing import Optional, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event # type: ignore
+from sqlalchemy.engine import Engine # type: ignore
+from shared.logger import logger
+import threading, time
+
+
+class QueryStats:
+    '''
+    Number of statements and total database time of a unit of work (a session, an API request).
+    Nested units add their queries to the enclosing ones as well.
+    '''
+    def __init__(self, parent: Optional['QueryStats'] = None):
+        self.parent = parent
+        self.count = 0
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, duration: float):
+        stats = self
+        while stats:
+            with stats._lock:
+                stats.count += 1
+                stats.duration += duration
+            stats = stats.parent
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar('current_query_stats', default=None)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    '''
+    Collects the statements executed in the current thread or task (and tasks started from it) on instrumented engines.
+    '''
+    stats = QueryStats(current_query_stats.get())
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+
+def instrument_engine(engine: Engine, slow_query_ms: float = 200, explain_slow: bool = True):
+    '''
+    Attaches event hooks that add every statement's duration to the current QueryStats and log statements slower
+    than slow_query_ms with their parameters and, for SELECTs on Postgres, their EXPLAIN plan.
+
+    Args:
+        engine: A sync engine, or AsyncEngine.sync_engine
+        slow_query_ms: Threshold for logging a statement
+        explain_slow: Run EXPLAIN for slow SELECTs (without ANALYZE, so the statement is not executed again)
+    '''
+    # The start time lives on the statement's execution context, so statements that raise leave nothing behind
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_query_start', None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        if conn.info.get('explaining'):
+            return
+        stats = current_query_stats.get()
+        if stats:
+            stats.add(duration)
+        if duration * 1000 < slow_query_ms:
+            return
+        fields = {'duration_ms': round(duration * 1000, 1), 'statement': statement, 'parameters': repr(parameters)[:1000]}
+        if explain_slow and not executemany and engine.dialect.name == 'postgresql' and statement.lstrip().upper().startswith('SELECT'):
+            conn.info['explaining'] = True
+            try:
+                fields['plan'] = '\n'.join(row[0] for row in conn.exec_driver_sql(f'EXPLAIN {statement}', parameters))
+            except Exception as e:
+                fields['plan'] = f'EXPLAIN failed: {e}'
+            finally:
+                conn.info['explaining'] = False
+        logger.warning('Slow query', extra={'fields': fields})
@@ -1,5 +1,5 @@
 import datetime
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, JSON, UniqueConstraint, Float, Boolean # type: ignore
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, JSON, UniqueConstraint, Float, Boolean, Index # type: ignore
 from sqlalchemy.ext.declarative import declarative_base # type: ignore
 from sqlalchemy.dialects.postgresql import ARRAY
 from pgvector.sqlalchemy import Vector  # Add this import
@@ -18,13 +18,28 @@ class Product(Base):
     description = Column(Text)
     piece_count = Column(Integer)
     minifigures = Column(Integer)
-    release_year = Column(Integer)
-    ean = Column(String)
+    release_year = Column(Integer, index=True)
+    ean = Column(String, index=True)
     minifigs = Column(Integer)
     age_recommendation = Column(String)
     rrp = Column(Float)
     created_at = Column(DateTime, default=datetime.datetime.now(datetime.UTC))
 
+    __table_args__ = (
+        # Matching of catalog rows to existing products in CatalogIngestion
+        Index('ix_products_manufacturer_manufacturer_id', 'manufacturer', 'manufacturer_id'),
+    )
+
+class ProductView(Base):
+    '''
+    Page view counter per product, used to prioritize scraping of popular products.
+    '''
+    __tablename__ = 'product_views'
+
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    view_count = Column(Integer, nullable=False, default=0)
+    last_viewed = Column(DateTime)
+
 class Prices(Base):
     __tablename__ = 'prices'
     
@@ -36,12 +51,47 @@ class Prices(Base):
     in_stock = Column(Boolean)
     url = Column(String)
     last_updated = Column(DateTime, default=datetime.datetime.now(datetime.UTC), index=True)
-    price_history = Column(JSON)
+    last_checked = Column(DateTime)  # Set by every scrape, last_updated only changes with price, in_stock or shipping_cost
+    price_history = Column(JSON)  # Deprecated: superseded by price_observations, only read by scripts/migrate_price_history.py
 
     __table_args__ = (
         UniqueConstraint('product_id', 'retailer_id', name='uix_product_retailer'),
+        # Fresh prices of a retailer for the anti-join in select_products_to_scrape, index-only on Postgres
+        Index('ix_prices_retailer_last_updated', 'retailer_id', 'last_updated', postgresql_include=['product_id']),
     )
 
+class PriceObservation(Base):
+    '''
+    Append-only price history. One row is inserted per observed price change.
+    '''
+    __tablename__ = 'price_observations'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    retailer_id = Column(Integer, ForeignKey('retailers.id'), nullable=False)
+    observed_at = Column(DateTime, nullable=False)
+    price = Column(Float)
+    shipping_cost = Column(Float)
+    in_stock = Column(Boolean)
+
+    __table_args__ = (
+        Index('ix_price_observations_product_retailer_observed', 'product_id', 'retailer_id', 'observed_at'),
+    )
+
+class ProductOfferSummary(Base):
+    '''
+    Best in-stock offer per product, maintained by OfferSummaryService whenever PriceService writes a change.
+    Only products with at least one in-stock price have a row.
+    '''
+    __tablename__ = 'product_offer_summaries'
+
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    min_price = Column(Float, index=True)
+    min_price_retailer_id = Column(Integer, ForeignKey('retailers.id'))
+    offer_count = Column(Integer, nullable=False)
+    discount = Column(Float, index=True) # (rrp - min_price) / rrp, None without rrp
+    last_change = Column(DateTime)
+
 class Retailer(Base):
     __tablename__ = 'retailers'
     
@@ -54,6 +104,23 @@ class Retailer(Base):
     excluded_brands = Column(JSON)  # List of brand names to exclude
     base_image_url = Column(String)
 
+class SitemapEntry(Base):
+    '''
+    Last seen lastmod per sitemap URL of a retailer, used to only refetch product pages that changed.
+    '''
+    __tablename__ = 'sitemap_entries'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    retailer_id = Column(Integer, ForeignKey('retailers.id'), nullable=False)
+    url = Column(String, nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=True)
+    lastmod = Column(DateTime)
+    last_fetched = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint('retailer_id', 'url', name='uix_retailer_url'),
+    )
+
 class ProductContent(Base):
     __tablename__ = 'product_content'
 
@@ -63,4 +130,53 @@ class ProductContent(Base):
     content = Column(JSON, nullable=False)         # Structured content (dict or list)
     embedding = Column(Vector(384), nullable=True) # Vector embedding (384 dims as a placeholder for now)
     created_at = Column(DateTime, default=datetime.datetime.now(datetime.UTC))
-    updated_at = Column(DateTime, default=datetime.datetime.now(datetime.UTC), onupdate=datetime.datetime.now(datetime.UTC))
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.datetime.now(datetime.UTC), onupdate=datetime.datetime.now(datetime.UTC))
+
+    __table_args__ = (
+        # ANN index for SimilarityService, cosine distance as used by get_similar_products
+        Index(
+            'ix_product_content_embedding_hnsw',
+            'embedding',
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding': 'vector_cosine_ops'}
+        ),
+    )
+
+class ContentPipelineCheckpoint(Base):
+    '''
+    Progress of the content pipeline per content type, saved in the same transaction as each batch of generated content.
+    '''
+    __tablename__ = 'content_pipeline_checkpoints'
+
+    content_type = Column(String, primary_key=True)
+    last_product_id = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
+class ScrapeJob(Base):
+    '''
+    Durable scrape work queue with one job per product and retailer. Workers claim pending jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED and hold them with a lease that expires if the worker stops heartbeating,
+    see ScrapeJobService.
+    '''
+    __tablename__ = 'scrape_jobs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    retailer_id = Column(Integer, ForeignKey('retailers.id'), nullable=False)
+    priority = Column(Float, nullable=False, default=0) # higher is claimed first
+    status = Column(String, nullable=False, default='pending') # pending, leased, done, failed
+    available_at = Column(DateTime, nullable=False) # not claimed before, set for retries
+    leased_by = Column(String)
+    lease_expires_at = Column(DateTime)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    updated_at = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint('product_id', 'retailer_id', name='uix_scrape_job_product_retailer'),
+        Index('ix_scrape_jobs_claim', 'retailer_id', 'status', 'priority'),
+        Index('ix_scrape_jobs_lease', 'status', 'lease_expires_at'),
+    )
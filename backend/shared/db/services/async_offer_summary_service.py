@@ -0,0 +1,28 @@
+from typing import Optional, List
+from sqlalchemy.ext.asyncio import AsyncSession # type: ignore
+from shared.schemas import ProductOfferSchema
+from .offer_summary_service import select_best_offers, to_offers
+
+
+class AsyncOfferSummaryService:
+    '''
+    Async read paths of OfferSummaryService for the API. Shares its queries with OfferSummaryService.
+    '''
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    async def get_best_offers(
+        self,
+        manufacturer: Optional[str] = None,
+        sort: str = 'price',
+        min_discount: Optional[float] = None,
+        max_price: Optional[float] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[ProductOfferSchema]:
+        '''
+        See OfferSummaryService.get_best_offers.
+        '''
+        query = select_best_offers(manufacturer, sort, min_discount, max_price, limit, offset)
+        return to_offers((await self.session.execute(query)).all())
@@ -0,0 +1,43 @@
+from typing import Optional, List, Dict
+from sqlalchemy import select # type: ignore
+from sqlalchemy.ext.asyncio import AsyncSession # type: ignore
+from ..models import Prices
+from shared.schemas import PriceSchema, PriceHistory
+from .price_service import PRICE_COLUMNS, select_history, to_history, to_price_schemas
+import datetime
+
+
+class AsyncPriceService:
+    '''
+    Async read paths of PriceService for the API. Shares its queries with PriceService.
+    '''
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    async def get_history(
+        self,
+        product_id: int,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        resolution: Optional[str] = None
+    ) -> Dict[int, PriceHistory]:
+        '''
+        See PriceService.get_history.
+        '''
+        return to_history((await self.session.execute(select_history(product_id, start, end, resolution))).all())
+
+
+    async def get_by_product_id(
+        self,
+        product_id: int,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        resolution: Optional[str] = None
+    ) -> List[PriceSchema]:
+        '''
+        See PriceService.get_by_product_id.
+        '''
+        rows = (await self.session.execute(select(*PRICE_COLUMNS).where(Prices.product_id == product_id))).all()
+        history = await self.get_history(product_id, start, end, resolution)
+        return to_price_schemas(rows, history)
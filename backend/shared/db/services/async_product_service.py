@@ -0,0 +1,52 @@
+from typing import Optional, List, Dict, Any, Tuple
+from sqlalchemy import select # type: ignore
+from sqlalchemy.ext.asyncio import AsyncSession # type: ignore
+from ..models import Product
+from shared.schemas import ProductSchema, ProductListingSchema
+from .product_service import (
+    PRODUCT_COLUMNS, to_product_schema, select_listings, to_listings, select_listing_count
+)
+
+
+class AsyncProductService:
+    '''
+    Async read paths of ProductService for the API. Shares its queries with ProductService.
+    '''
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    async def get_by_id(self, id: int) -> Optional[ProductSchema]:
+        '''
+        Gets a product by its ID. Returns None if it does not exist.
+        '''
+        row = (await self.session.execute(select(*PRODUCT_COLUMNS).where(Product.id == id))).first()
+        return to_product_schema(row) if row else None
+
+
+    async def get_available_products_by_manufacturer(
+        self,
+        manufacturer: str,
+        release_year: List[int] = [],
+        limit: Optional[int] = None,
+        offset: Optional[int] = 0,
+        cursor: Optional[str] = None,
+        include_total: bool = True
+    ) -> Tuple[List[ProductListingSchema], Optional[int], Optional[str]]:
+        '''
+        See ProductService.get_available_products_by_manufacturer.
+        '''
+        rows = (await self.session.execute(select_listings(manufacturer, release_year, limit, offset, cursor))).all()
+        product_listings, next_cursor = to_listings(rows, limit)
+        total_count = None
+        if include_total:
+            total_count = (await self.session.execute(select_listing_count(manufacturer, release_year))).scalar()
+        return product_listings, total_count, next_cursor
+
+
+    async def get_autocomplete(self) -> List[Dict[str, Any]]:
+        '''
+        Returns a list of product manufacturer, name and id for autocomplete.
+        '''
+        rows = (await self.session.execute(select(Product.id, Product.manufacturer, Product.name))).all()
+        return [{'id': p.id, 'manufacturer': p.manufacturer, 'name': p.name} for p in rows]
@@ -0,0 +1,30 @@
+from typing import Optional, List
+from sqlalchemy.ext.asyncio import AsyncSession # type: ignore
+from shared.schemas import SimilarProductSchema
+from .similarity_service import SimilarityService, DEFAULT_CONTENT_TYPE
+
+
+class AsyncSimilarityService:
+    '''
+    Async read paths of SimilarityService for the API. Runs SimilarityService on the async session's connection.
+    '''
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+
+    async def get_similar_products(
+        self,
+        product_id: int,
+        content_type: str = DEFAULT_CONTENT_TYPE,
+        k: int = 10,
+        manufacturer: Optional[str] = None,
+        in_stock: bool = False
+    ) -> List[SimilarProductSchema]:
+        '''
+        See SimilarityService.get_similar_products.
+        '''
+        return await self.session.run_sync(
+            lambda session: SimilarityService(session).get_similar_products(
+                product_id, content_type=content_type, k=k, manufacturer=manufacturer, in_stock=in_stock
+            )
+        )
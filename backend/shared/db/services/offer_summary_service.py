@@ -0,0 +1,155 @@
+from typing import Optional, List, Iterable, Any
+from sqlalchemy import select, Select, func, case, delete, exists, desc, literal, or_ # type: ignore
+from sqlalchemy.dialects.postgresql import insert as pg_insert # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+from ..models import Product, Prices, ProductOfferSummary
+from shared.schemas import ProductOfferSchema
+import datetime
+
+
+def select_best_offers(
+    manufacturer: Optional[str],
+    sort: str,
+    min_discount: Optional[float],
+    max_price: Optional[float],
+    limit: int,
+    offset: int
+) -> Select:
+    '''
+    Builds the query for OfferSummaryService.get_best_offers.
+    '''
+    query = select(
+        Product.id,
+        Product.manufacturer_id,
+        Product.name,
+        Product.manufacturer,
+        Product.base_image_url,
+        Product.release_year,
+        Product.rrp,
+        ProductOfferSummary.min_price,
+        ProductOfferSummary.min_price_retailer_id,
+        ProductOfferSummary.offer_count,
+        ProductOfferSummary.discount,
+        ProductOfferSummary.last_change
+    ).select_from(ProductOfferSummary).join(Product, Product.id == ProductOfferSummary.product_id)
+    if manufacturer:
+        query = query.where(Product.manufacturer == manufacturer)
+    if min_discount is not None:
+        query = query.where(ProductOfferSummary.discount >= min_discount)
+    if max_price is not None:
+        query = query.where(ProductOfferSummary.min_price <= max_price)
+    if sort == 'discount':
+        query = query.where(ProductOfferSummary.discount.isnot(None))
+        query = query.order_by(desc(ProductOfferSummary.discount), ProductOfferSummary.product_id)
+    elif sort == 'price':
+        query = query.order_by(ProductOfferSummary.min_price, ProductOfferSummary.product_id)
+    else:
+        raise ValueError(f'Invalid value for sort: {sort}')
+    return query.limit(limit).offset(offset)
+
+
+def to_offers(rows: List[Any]) -> List[ProductOfferSchema]:
+    return [ProductOfferSchema.model_validate(row._asdict()) for row in rows]
+
+
+class OfferSummaryService:
+    '''
+    Service for maintaining and querying the best in-stock offer per product (product_offer_summaries).
+    '''
+
+    def __init__(self, session: Session):
+        self.session = session
+
+
+    def refresh(self, product_ids: Optional[Iterable[int]] = None):
+        '''
+        Recomputes the summaries of the given products (all products if None) with one INSERT ... SELECT ... ON CONFLICT
+        and deletes the summaries of products without an in-stock offer. Rows are only rewritten if a value changed,
+        and last_change is only set if the best price or its retailer changed. Safe against concurrent refreshes of
+        the same products. Does not commit, so callers can refresh in the same transaction as their price writes.
+
+        Args:
+            product_ids: IDs of products whose prices changed
+        '''
+        if product_ids is not None:
+            product_ids = list(set(product_ids))
+            if not product_ids:
+                return
+        now = datetime.datetime.now(datetime.UTC)
+        self.session.flush()
+
+        in_stock = (Prices.in_stock == True) & Prices.price.isnot(None)
+        ranked = select(
+            Prices.product_id,
+            Prices.price.label('min_price'),
+            Prices.retailer_id.label('min_price_retailer_id'),
+            func.count().over(partition_by=Prices.product_id).label('offer_count'),
+            case((Product.rrp > 0, (Product.rrp - Prices.price) / Product.rrp), else_=None).label('discount'),
+            func.row_number().over(partition_by=Prices.product_id, order_by=(Prices.price, Prices.retailer_id)).label('rank')
+        ).join(
+            Product, Product.id == Prices.product_id
+        ).where(in_stock)
+        has_offer = exists().where(Prices.product_id == ProductOfferSummary.product_id, in_stock)
+        delete_statement = delete(ProductOfferSummary).where(~has_offer)
+        if product_ids is not None:
+            ranked = ranked.where(Prices.product_id.in_(product_ids))
+            delete_statement = delete_statement.where(ProductOfferSummary.product_id.in_(product_ids))
+        ranked = ranked.subquery()
+        best_offers = select(
+            ranked.c.product_id,
+            ranked.c.min_price,
+            ranked.c.min_price_retailer_id,
+            ranked.c.offer_count,
+            ranked.c.discount,
+            literal(now)
+        ).where(ranked.c.rank == 1)
+
+        statement = pg_insert(ProductOfferSummary).from_select(
+            ['product_id', 'min_price', 'min_price_retailer_id', 'offer_count', 'discount', 'last_change'],
+            best_offers
+        )
+        best_changed = or_(
+            ProductOfferSummary.min_price.is_distinct_from(statement.excluded.min_price),
+            ProductOfferSummary.min_price_retailer_id.is_distinct_from(statement.excluded.min_price_retailer_id)
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=['product_id'],
+            set_={
+                'min_price': statement.excluded.min_price,
+                'min_price_retailer_id': statement.excluded.min_price_retailer_id,
+                'offer_count': statement.excluded.offer_count,
+                'discount': statement.excluded.discount,
+                'last_change': case((best_changed, statement.excluded.last_change), else_=ProductOfferSummary.last_change)
+            },
+            where=or_(
+                best_changed,
+                ProductOfferSummary.offer_count.is_distinct_from(statement.excluded.offer_count),
+                ProductOfferSummary.discount.is_distinct_from(statement.excluded.discount)
+            )
+        )
+        self.session.execute(delete_statement)
+        self.session.execute(statement)
+
+
+    def get_best_offers(
+        self,
+        manufacturer: Optional[str] = None,
+        sort: str = 'price',
+        min_discount: Optional[float] = None,
+        max_price: Optional[float] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[ProductOfferSchema]:
+        '''
+        Returns products with their best in-stock offer sorted by lowest price or highest discount vs rrp.
+
+        Args:
+            manufacturer: Optional manufacturer to filter by
+            sort: 'price' (ascending) or 'discount' (descending)
+            min_discount: Optional minimum discount as a fraction of rrp, e.g. 0.2
+            max_price: Optional maximum price
+            limit: Max number of results to return
+            offset: Offset
+        '''
+        query = select_best_offers(manufacturer, sort, min_discount, max_price, limit, offset)
+        return to_offers(self.session.execute(query).all())
@@ -1,15 +1,77 @@
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple, Any
+from sqlalchemy import func, literal, literal_column, insert, update, select, exists, tuple_, or_, Select # type: ignore
+from sqlalchemy.dialects.postgresql import insert as pg_insert # type: ignore
 from sqlalchemy.orm import Session # type: ignore
-from ..models import Prices
-from shared.schemas import PriceSchema
+from ..models import Prices, PriceObservation
+from .offer_summary_service import OfferSummaryService
+from shared.schemas import PriceSchema, PriceHistory
+from shared.cache import invalidate_products
 import datetime
 
 
+HISTORY_RESOLUTIONS = ('hour', 'day', 'week', 'month')
+PRICE_COLUMNS = [
+    Prices.id, Prices.product_id, Prices.retailer_id, Prices.price,
+    Prices.shipping_cost, Prices.in_stock, Prices.url, Prices.last_updated
+]
+
+
+def select_history(
+    product_id: int,
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    resolution: Optional[str] = None
+) -> Select:
+    '''
+    Builds the query for the price history of a product, see PriceService.get_history.
+    '''
+    if resolution and resolution not in HISTORY_RESOLUTIONS:
+        raise ValueError(f'Invalid resolution: {resolution}. Valid options: {HISTORY_RESOLUTIONS}')
+    if resolution:
+        # Rendered as a literal so the SELECT and GROUP BY expressions are identical for Postgres
+        observed_at = func.date_trunc(literal_column(f"'{resolution}'"), PriceObservation.observed_at).label('observed_at')
+        query = select(PriceObservation.retailer_id, observed_at, func.min(PriceObservation.price))
+    else:
+        observed_at = PriceObservation.observed_at
+        query = select(PriceObservation.retailer_id, observed_at, PriceObservation.price)
+    query = query.where(PriceObservation.product_id == product_id)
+    if start:
+        query = query.where(PriceObservation.observed_at >= start)
+    if end:
+        query = query.where(PriceObservation.observed_at < end)
+    if resolution:
+        query = query.group_by(PriceObservation.retailer_id, observed_at)
+    return query.order_by(observed_at)
+
+
+def to_history(rows: List[Any]) -> Dict[int, PriceHistory]:
+    '''
+    Groups the (retailer_id, observed_at, price) rows of select_history into a PriceHistory per retailer.
+    The entries come typed from the database, so the histories are built without validating every entry.
+    '''
+    history: Dict[int, List[Tuple[datetime.datetime, float]]] = {}
+    for retailer_id, observed, price in rows:
+        history.setdefault(retailer_id, []).append((observed, price))
+    return {retailer_id: PriceHistory.model_construct(history=entries) for retailer_id, entries in history.items()}
+
+
+def to_price_schemas(rows: List[Any], history: Dict[int, PriceHistory]) -> List[PriceSchema]:
+    '''
+    Builds PriceSchemas from rows of PRICE_COLUMNS and the history of their retailers.
+    The PriceHistory instances are passed through as they are instead of validating every entry again.
+    '''
+    empty = PriceHistory.model_construct(history=[])
+    return [
+        PriceSchema.model_validate({**row._asdict(), 'price_history': history.get(row.retailer_id, empty)})
+        for row in rows
+    ]
+
+
 class PriceService:
     '''
     Service for handling Price-related database operations.
     '''
-    
+
     def __init__(self, session: Session):
         self.session = session
 
@@ -17,7 +79,7 @@ class PriceService:
     def price_exists(self, product_id: int, retailer_id: int) -> bool:
         '''
         Checks if a price entry exists for the given product and retailer.
-        
+
         Args:
             product_id: Product ID
             retailer_id: Retailer ID
@@ -26,28 +88,70 @@ class PriceService:
             product_id=product_id,
             retailer_id=retailer_id
         ).first() is not None
-    
+
+
+    def _add_observation(self, price: Prices, observed_at: datetime.datetime):
+        '''
+        Appends a single row to price_observations for the current state of a price entry.
+        '''
+        self.session.add(PriceObservation(
+            product_id=price.product_id,
+            retailer_id=price.retailer_id,
+            observed_at=observed_at,
+            price=price.price,
+            shipping_cost=price.shipping_cost,
+            in_stock=price.in_stock
+        ))
+
+
+    def _record_baselines(self, pairs: List[Tuple[int, int]], now: datetime.datetime):
+        '''
+        Appends the current state of existing price entries without any observation as their first observation,
+        before it is overwritten. Entries written before price_observations existed only have their history in the
+        legacy JSON column, which scripts/migrate_price_history.py copies up to the first observation, so their
+        last value before the change would be lost otherwise.
+        '''
+        observed = exists().where(
+            PriceObservation.product_id == Prices.product_id,
+            PriceObservation.retailer_id == Prices.retailer_id
+        )
+        self.session.execute(insert(PriceObservation).from_select(
+            ['product_id', 'retailer_id', 'observed_at', 'price', 'shipping_cost', 'in_stock'],
+            select(
+                Prices.product_id,
+                Prices.retailer_id,
+                func.coalesce(Prices.last_updated, literal(now)),
+                Prices.price,
+                Prices.shipping_cost,
+                Prices.in_stock
+            ).where(tuple_(Prices.product_id, Prices.retailer_id).in_(pairs), ~observed)
+        ))
+
 
     def add_price(self, price_schema: PriceSchema) -> Prices:
         '''
-        Creates a new price entry.
-        
+        Creates a new price entry and records it as the first observation in the price history.
+
         Args:
             price_schema: PriceSchema object
         '''
-        price_data = price_schema.model_dump(exclude={'id'})
-        price_data['last_updated'] = datetime.datetime.now(datetime.UTC)
+        price_data = price_schema.model_dump(exclude={'id', 'price_history'})
+        price_data['last_updated'] = price_data['last_checked'] = datetime.datetime.now(datetime.UTC)
         new_price = Prices(**price_data)
         self.session.add(new_price)
+        self._add_observation(new_price, price_data['last_updated'])
+        OfferSummaryService(self.session).refresh([new_price.product_id])
         self.session.commit()
+        invalidate_products(self.session, [new_price.product_id])
         return new_price
-    
+
 
     def update_price(self, price_schema: PriceSchema) -> Optional[Prices]:
         '''
-        Updates an existing price if it is different than an existing price.
-        Returns None if no price exists.
-        
+        Updates an existing price if its price, in_stock or shipping_cost is different from the existing one.
+        A change is appended to price_observations with a single-row insert. last_checked is set either way.
+        Returns None if no price exists or nothing changed.
+
         Args:
             price_schema: Validated PriceSchema object
         '''
@@ -55,32 +159,161 @@ class PriceService:
             product_id=price_schema.product_id,
             retailer_id=price_schema.retailer_id
         ).first()
-        
+
         if not existing_price:
             return None
-            
-        # Only update if price has changed
-        if existing_price.price != price_schema.price:
-            history = existing_price.price_history or []
-            history.append({
-                'price': existing_price.price,
-                'datetime': existing_price.last_updated.isoformat()
-            })
-            price_schema.price_history = history
-            
-            # Update only changed fields
+
+        now = datetime.datetime.now(datetime.UTC)
+        existing_price.last_checked = now
+        # Only update if price, availability or shipping has changed
+        if (
+            existing_price.price != price_schema.price
+            or existing_price.in_stock != price_schema.in_stock
+            or existing_price.shipping_cost != price_schema.shipping_cost
+        ):
+            self._record_baselines([(existing_price.product_id, existing_price.retailer_id)], now)
             existing_price.price = price_schema.price
-            existing_price.price_history = price_schema.price_history
-            existing_price.last_updated = datetime.datetime.now(datetime.UTC)
+            existing_price.in_stock = price_schema.in_stock
+            existing_price.shipping_cost = price_schema.shipping_cost
+            existing_price.last_updated = now
+            self._add_observation(existing_price, now)
+            OfferSummaryService(self.session).refresh([existing_price.product_id])
             self.session.commit()
+            invalidate_products(self.session, [existing_price.product_id])
             return existing_price
-            
+
+        self.session.commit()
         return None  # Return None if no changes were made
-    
 
-    def get_by_product_id(self, product_id: int) -> List[PriceSchema]:
+
+    def mark_checked(self, pairs: List[Tuple[int, int]], checked_at: Optional[datetime.datetime] = None) -> int:
+        '''
+        Sets last_checked of existing price entries that were scraped (or found unchanged) without changes,
+        so the scrape scheduler does not pick them again right away. Returns the number of updated entries.
+
+        Args:
+            pairs: List of (product_id, retailer_id)
+            checked_at: Time of the check, defaults to now
+        '''
+        if not pairs:
+            return 0
+        result = self.session.execute(
+            update(Prices)
+            .where(tuple_(Prices.product_id, Prices.retailer_id).in_(pairs))
+            .values(last_checked=checked_at or datetime.datetime.now(datetime.UTC))
+        )
+        self.session.commit()
+        return result.rowcount
+
+
+    def bulk_upsert(self, prices: List[PriceSchema], chunk_size: int = 500) -> Dict[str, int]:
+        '''
+        Persists scraper results with one INSERT ... ON CONFLICT statement per chunk against uix_product_retailer.
+        Existing entries are only updated if their price, in_stock or shipping_cost changed, and only new and changed
+        entries are appended to price_observations and refreshed in product_offer_summaries. Entries without any
+        observation get their previous state recorded first, see _record_baselines. Unchanged entries only get
+        their last_checked set, see mark_checked. Commits once per chunk.
+
+        Returns counts of inserted, changed and unchanged entries.
+
+        Args:
+            prices: List of PriceSchema objects, e.g. the result of BaseScraper.run
+            chunk_size: Number of entries per statement
+        '''
+        # ON CONFLICT cannot touch the same row twice in one statement, the last result per product and retailer wins
+        deduplicated = {(p.product_id, p.retailer_id): p for p in prices}
+        rows = list(deduplicated.values())
+        counts = {'inserted': 0, 'changed': 0, 'unchanged': 0}
+
+        for i in range(0, len(rows), chunk_size):
+            chunk = rows[i:i + chunk_size]
+            now = datetime.datetime.now(datetime.UTC)
+            values = [
+                {**p.model_dump(exclude={'id', 'price_history'}), 'last_updated': now, 'last_checked': now}
+                for p in chunk
+            ]
+            self._record_baselines([(p.product_id, p.retailer_id) for p in chunk], now)
+            statement = pg_insert(Prices).values(values)
+            statement = statement.on_conflict_do_update(
+                constraint='uix_product_retailer',
+                set_={
+                    'price': statement.excluded.price,
+                    'in_stock': statement.excluded.in_stock,
+                    'shipping_cost': statement.excluded.shipping_cost,
+                    'last_updated': statement.excluded.last_updated,
+                    'last_checked': statement.excluded.last_checked
+                },
+                where=or_(
+                    Prices.price.is_distinct_from(statement.excluded.price),
+                    Prices.in_stock.is_distinct_from(statement.excluded.in_stock),
+                    Prices.shipping_cost.is_distinct_from(statement.excluded.shipping_cost)
+                )
+            ).returning(
+                Prices.product_id,
+                Prices.retailer_id,
+                literal_column('xmax = 0').label('inserted')  # xmax is 0 for freshly inserted rows
+            )
+            written = self.session.execute(statement).all()
+
+            observations = []
+            for product_id, retailer_id, inserted in written:
+                p = deduplicated[(product_id, retailer_id)]
+                observations.append({
+                    'product_id': product_id,
+                    'retailer_id': retailer_id,
+                    'observed_at': now,
+                    'price': p.price,
+                    'shipping_cost': p.shipping_cost,
+                    'in_stock': p.in_stock
+                })
+                counts['inserted' if inserted else 'changed'] += 1
+            if observations:
+                self.session.execute(insert(PriceObservation), observations)
+                OfferSummaryService(self.session).refresh([o['product_id'] for o in observations])
+            counts['unchanged'] += len(chunk) - len(written)
+            written_pairs = {(product_id, retailer_id) for product_id, retailer_id, _ in written}
+            self.mark_checked([key for key in ((p.product_id, p.retailer_id) for p in chunk) if key not in written_pairs], now)
+            self.session.commit()
+            invalidate_products(self.session, [o['product_id'] for o in observations])
+
+        return counts
+
+
+    def get_history(
+        self,
+        product_id: int,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        resolution: Optional[str] = None
+    ) -> Dict[int, PriceHistory]:
         '''
-        Returns a list of prices for a given product.
+        Returns the price history of a product keyed by retailer ID.
+
+        Args:
+            product_id: Product ID
+            start: Optional lower bound for observed_at (inclusive)
+            end: Optional upper bound for observed_at (exclusive)
+            resolution: Optional date_trunc unit (hour, day, week, month) to downsample to. Keeps the lowest price per bucket.
+        '''
+        return to_history(self.session.execute(select_history(product_id, start, end, resolution)).all())
+
+
+    def get_by_product_id(
+        self,
+        product_id: int,
+        start: Optional[datetime.datetime] = None,
+        end: Optional[datetime.datetime] = None,
+        resolution: Optional[str] = None
+    ) -> List[PriceSchema]:
+        '''
+        Returns a list of prices for a given product including their price history from price_observations.
+
+        Args:
+            product_id: Product ID
+            start: Optional lower bound for the price history
+            end: Optional upper bound for the price history
+            resolution: Optional date_trunc unit to downsample the price history to
         '''
-        prices = self.session.query(Prices).filter_by(product_id=product_id).all()
-        return [PriceSchema.model_validate(price.__dict__) for price in prices]
+        rows = self.session.execute(select(*PRICE_COLUMNS).where(Prices.product_id == product_id)).all()
+        history = self.get_history(product_id, start, end, resolution)
+        return to_price_schemas(rows, history)
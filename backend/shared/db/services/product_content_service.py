@@ -1,5 +1,10 @@
+from typing import List, Dict, Any, Optional
+from sqlalchemy import insert, exists # type: ignore
 from sqlalchemy.orm import Session
-from ..models import ProductContent
+from ..models import Product, ProductContent, ContentPipelineCheckpoint
+from shared.schemas import ProductSchema
+from .product_service import PRODUCT_COLUMNS, to_product_schema
+import datetime
 
 
 class ProductContentService:
@@ -15,4 +20,61 @@ class ProductContentService:
             Set of product IDs
         '''
         results = self.session.query(ProductContent.product_id).filter(ProductContent.content_type == content_type).distinct().all()
-        return set(r[0] for r in results)
\ No newline at end of file
+        return set(r[0] for r in results)
+
+    def get_products_without_content_type(self, content_type: str, after_id: int = 0, limit: int = 100) -> List[ProductSchema]:
+        '''
+        Returns the next products by ID without a ProductContent entry of the given content_type.
+        Pages by ID (keyset), so the whole catalog can be processed with bounded memory.
+        Args:
+            content_type: The content_type the products are missing
+            after_id: Only return products with a higher ID
+            limit: Max number of products to return
+        '''
+        has_content = exists().where(ProductContent.product_id == Product.id, ProductContent.content_type == content_type)
+        rows = self.session.query(*PRODUCT_COLUMNS).filter(
+            Product.id > after_id,
+            ~has_content
+        ).order_by(Product.id).limit(limit).all()
+        return [to_product_schema(row) for row in rows]
+
+    def bulk_add_content(self, content_type: str, contents: Dict[int, Any]):
+        '''
+        Inserts ProductContent entries with one executemany INSERT. Does not commit.
+        Args:
+            content_type: The content_type of all entries
+            contents: Product ID -> content (dict or list)
+        '''
+        if not contents:
+            return
+        now = datetime.datetime.now(datetime.UTC)
+        self.session.execute(
+            insert(ProductContent),
+            [
+                {'product_id': product_id, 'content_type': content_type, 'content': content, 'created_at': now, 'updated_at': now}
+                for product_id, content in contents.items()
+            ]
+        )
+
+    def get_checkpoint(self, content_type: str) -> Optional[ContentPipelineCheckpoint]:
+        return self.session.get(ContentPipelineCheckpoint, content_type)
+
+    def save_checkpoint(self, content_type: str, last_product_id: int, processed: int, failed: int):
+        '''
+        Adds the batch's counts to the checkpoint of a content type and moves it to last_product_id. Does not commit.
+        '''
+        checkpoint = self.get_checkpoint(content_type)
+        if checkpoint is None:
+            checkpoint = ContentPipelineCheckpoint(content_type=content_type, last_product_id=0, processed=0, failed=0)
+            self.session.add(checkpoint)
+        checkpoint.last_product_id = last_product_id
+        checkpoint.processed += processed
+        checkpoint.failed += failed
+        checkpoint.updated_at = datetime.datetime.now(datetime.UTC)
+
+    def reset_checkpoint(self, content_type: str):
+        '''
+        Deletes the checkpoint, so products that failed before are retried on the next run.
+        '''
+        self.session.query(ContentPipelineCheckpoint).filter(ContentPipelineCheckpoint.content_type == content_type).delete()
+        self.session.commit()
@@ -1,13 +1,146 @@
 import datetime
-from typing import Optional, List, Dict, Any, Tuple
-from sqlalchemy import or_, func, desc # type: ignore
+from typing import Optional, List, Dict, Any, Tuple, Iterator, Set
+from sqlalchemy import or_, func, desc, tuple_, literal_column, select, exists, Select # type: ignore
 from sqlalchemy.orm import Session # type: ignore
-from ..models import Product, Prices, Retailer
-from shared.schemas import ProductSchema, ProductListingSchema, PriceSchema
+from sqlalchemy.dialects.postgresql import insert as pg_insert # type: ignore
+from ..models import Product, Prices, Retailer, ProductView
+from shared.schemas import ProductSchema, ProductListingSchema
+from shared.cache import invalidate_products
+from .offer_summary_service import OfferSummaryService
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+LISTING_PRICE_COLUMNS = [
+    Prices.id, Prices.product_id, Prices.retailer_id, Prices.price,
+    Prices.shipping_cost, Prices.in_stock, Prices.url, Prices.last_updated
+]
+# All columns of products, selected instead of the Product entity so reads skip the ORM identity map
+PRODUCT_COLUMNS = list(Product.__table__.columns)
+
+
+def to_product_schema(row: Any) -> ProductSchema:
+    '''
+    Builds a ProductSchema from a row of PRODUCT_COLUMNS. Validating a plain dict is faster than
+    model_construct or from_attributes with pydantic's compiled validators.
+    '''
+    return ProductSchema.model_validate(row._asdict())
+
+
+def decode_listing_cursor(cursor: str) -> Tuple[int, int]:
+    '''
+    Decodes a cursor returned by get_available_products_by_manufacturer into (num_prices, id).
+    Raises ValueError for malformed cursors.
+    '''
+    num_prices, id = cursor.split('-')
+    return int(num_prices), int(id)
+
+
+def select_listings(
+    manufacturer: str,
+    release_year: List[int],
+    limit: Optional[int],
+    offset: Optional[int],
+    cursor: Optional[str]
+) -> Select:
+    '''
+    Builds the single query for get_available_products_by_manufacturer: products with their in-stock prices
+    aggregated with json_agg, ordered and paged by (num_prices, id). Fetches one extra row to detect a next page.
+    '''
+    num_prices = func.count(Prices.id)
+    query = select(
+        Product.id,
+        Product.manufacturer_id,
+        Product.name,
+        Product.manufacturer,
+        Product.category,
+        Product.base_image_url,
+        Product.description,
+        Product.release_year,
+        num_prices.label('num_prices'),
+        func.json_agg(func.json_build_object(
+            *[arg for column in LISTING_PRICE_COLUMNS for arg in (literal_column(f"'{column.key}'"), column)]
+        )).label('prices')
+    )
+    query = query.join(Prices, (Product.id == Prices.product_id) & (Prices.in_stock == True))
+    query = query.where(Product.manufacturer == manufacturer)
+    if release_year:
+        query = query.where(Product.release_year.in_(release_year))
+    query = query.group_by(Product.id)
+    if cursor:
+        cursor_num_prices, cursor_id = decode_listing_cursor(cursor)
+        query = query.having(tuple_(num_prices, Product.id) < tuple_(cursor_num_prices, cursor_id))
+    query = query.order_by(desc('num_prices'), desc(Product.id))
+    if limit:
+        query = query.limit(limit + 1)
+    if offset and not cursor:
+        query = query.offset(offset)
+    return query
+
+
+def to_listings(rows: List[Any], limit: Optional[int]) -> Tuple[List[ProductListingSchema], Optional[str]]:
+    '''
+    Turns the rows of select_listings into ProductListingSchemas and the cursor for the next page.
+    '''
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f'{rows[-1].num_prices}-{rows[-1].id}'
+    product_listings = [
+        ProductListingSchema.model_validate({
+            'id': row.id,
+            'manufacturer_id': row.manufacturer_id,
+            'name': row.name,
+            'manufacturer': row.manufacturer,
+            'category': row.category,
+            'base_image_url': row.base_image_url,
+            'description': row.description,
+            'release_year': row.release_year,
+            'prices': row.prices
+        })
+        for row in rows
+    ]
+    return product_listings, next_cursor
+
+
+def select_listing_count(manufacturer: str, release_year: List[int]) -> Select:
+    '''
+    Builds the count of products with at least one in-stock price for a manufacturer and release years.
+    '''
+    query = select(func.count(func.distinct(Product.id)))
+    query = query.join(Prices, (Product.id == Prices.product_id) & (Prices.in_stock == True))
+    query = query.where(Product.manufacturer == manufacturer)
+    if release_year:
+        query = query.where(Product.release_year.in_(release_year))
+    return query
+
+
+def select_products_to_scrape(scrape_interval: tuple[str, int], retailer_id: int, excluded_brands: List[str]) -> Select:
+    '''
+    Builds the query for ProductService.iter_products_to_scrape. Products with a fresh price are excluded with
+    NOT EXISTS, an anti-join on ix_prices_retailer_last_updated, instead of outer joining all products to prices.
+    '''
+    interval_name, interval_duration = scrape_interval
+    current_year = datetime.datetime.now().year
+    if interval_name == 'current_year':
+        year_filter = Product.release_year == current_year
+    elif interval_name == 'previous_year':
+        year_filter = Product.release_year == current_year - 1
+    else: # older
+        year_filter = Product.release_year < current_year - 1
+
+    fresh_price = exists().where(
+        Prices.product_id == Product.id,
+        Prices.retailer_id == retailer_id,
+        Prices.last_updated >= datetime.datetime.now() - datetime.timedelta(seconds=interval_duration)
+    )
+    query = select(*PRODUCT_COLUMNS).where(year_filter, ~fresh_price)
+    if excluded_brands:
+        query = query.where(~Product.manufacturer.in_(excluded_brands))
+    return query.order_by(Product.id)
+
+
 class ProductService:
     '''
     Service for handling Product-related database operations.
@@ -20,20 +153,61 @@ class ProductService:
         '''
         Gets a product by its ID.
         '''
-        product = self.session.query(Product).filter(Product.id == id).first()
-        return ProductSchema.model_validate(product.__dict__)
+        row = self.session.execute(select(*PRODUCT_COLUMNS).where(Product.id == id)).first()
+        return to_product_schema(row)
     
 
+    def get_by_ids(self, ids: List[int]) -> List[ProductSchema]:
+        '''
+        Gets products by their IDs in one query. Unknown IDs are ignored.
+        '''
+        if not ids:
+            return []
+        rows = self.session.execute(select(*PRODUCT_COLUMNS).where(Product.id.in_(ids))).all()
+        return [to_product_schema(row) for row in rows]
+
+
+    def record_views(self, view_counts: Dict[int, int]):
+        '''
+        Adds buffered page views to the view counters of products in one statement.
+
+        Args:
+            view_counts: Product ID -> number of new views
+        '''
+        if not view_counts:
+            return
+        now = datetime.datetime.now(datetime.UTC)
+        statement = pg_insert(ProductView).values([
+            {'product_id': product_id, 'view_count': count, 'last_viewed': now}
+            for product_id, count in view_counts.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[ProductView.product_id],
+            set_={
+                'view_count': ProductView.view_count + statement.excluded.view_count,
+                'last_viewed': statement.excluded.last_viewed
+            }
+        )
+        self.session.execute(statement)
+        self.session.commit()
+
+
     def get_available_products_by_manufacturer(
         self, 
         manufacturer: str, 
         release_year: List[int] = [],
         limit: Optional[int] = None,
-        offset: Optional[int] = 0
-    ) -> Tuple[List[ProductListingSchema], int]:
+        offset: Optional[int] = 0,
+        cursor: Optional[str] = None,
+        include_total: bool = True
+    ) -> Tuple[List[ProductListingSchema], Optional[int], Optional[str]]:
         '''
-        Gets products for which at least one price exists by manufacturer
-        using limit and offset for one or more specified release years.
+        Gets products for which at least one price is in stock by manufacturer for one or more specified release years,
+        ordered by the number of in-stock prices. Products and their in-stock prices are fetched in a single query
+        that aggregates the prices per product with json_agg.
+
+        Pages through the results with a keyset cursor on (num_prices, id). The returned next_cursor is None on the last page.
+        offset is only used if no cursor is given. Pass include_total=False for follow-up pages to skip the count.
 
         Used in /manufacturers/{manufacturer}/product_listings API endpoint for the /marken/[manufacturer] route.
         
@@ -42,48 +216,15 @@ class ProductService:
             release_year: One or more release years to filter by
             limit: Optional max number of results to return
             offset: Optional offset
+            cursor: Optional cursor from a previous call to continue after
+            include_total: Whether to return the total count, None otherwise
         '''
-        query = self.session.query(Product, func.count(Prices.id).label('num_prices'))
-        query = query.filter(Product.manufacturer == manufacturer)
-        query = query.join(Prices, (Product.id == Prices.product_id) & (Prices.in_stock == True))
-        if release_year:
-            query = query.filter(Product.release_year.in_(release_year))
-        query = query.group_by(Product.id)
-        total_count = query.count()
-
-        query = query.order_by(desc('num_prices'))
-        if limit:
-            query = query.limit(limit)
-        if offset:
-            query = query.offset(offset)
-        products = query.all()
-
-        product_ids = [product.id for product, _ in products]
-        if not product_ids:
-            return [], total_count
-        prices = self.session.query(Prices).filter(Prices.product_id.in_(product_ids), Prices.in_stock == True).all()
-
-        prices_by_product = {}
-        for price in prices:
-            prices_by_product.setdefault(price.product_id, []).append(PriceSchema.model_validate(price.__dict__))
-
-        product_listings = []
-        for product, num_prices in products:
-            in_stock_prices = prices_by_product.get(product.id, [])
-            if in_stock_prices:
-                product_dict = {
-                    'id': product.id,
-                    'manufacturer_id': product.manufacturer_id,
-                    'name': product.name,
-                    'manufacturer': product.manufacturer,
-                    'category': product.category,
-                    'base_image_url': product.base_image_url,
-                    'description': product.description,
-                    'release_year': product.release_year,
-                    'prices': in_stock_prices
-                }
-                product_listings.append(ProductListingSchema.model_validate(product_dict))
-        return product_listings, total_count
+        rows = self.session.execute(select_listings(manufacturer, release_year, limit, offset, cursor)).all()
+        product_listings, next_cursor = to_listings(rows, limit)
+        total_count = None
+        if include_total:
+            total_count = self.session.execute(select_listing_count(manufacturer, release_year)).scalar()
+        return product_listings, total_count, next_cursor
 
 
     def get_autocomplete(self) -> List[Dict[str, Any]]:
@@ -96,48 +237,68 @@ class ProductService:
         ]
     
 
+    def get_search_documents(self, changed_since: Optional[datetime.datetime] = None, after_id: int = 0) -> List[Dict[str, Any]]:
+        '''
+        Returns the fields indexed by ProductSearchIndex for all products, or only for products
+        changed since changed_since (update_entry bumps created_at) or added after after_id.
+
+        Args:
+            changed_since: Optional created_at lower bound for incremental updates
+            after_id: Products with a higher ID are always returned, only these without changed_since
+        '''
+        query = self.session.query(
+            Product.id, Product.manufacturer, Product.manufacturer_id, Product.name, Product.ean, Product.created_at
+        )
+        if changed_since:
+            query = query.filter(or_(Product.created_at > changed_since, Product.id > after_id))
+        elif after_id:
+            query = query.filter(Product.id > after_id)
+        return [row._asdict() for row in query.all()]
+
+
+    def get_ids(self) -> Set[int]:
+        '''
+        Returns the IDs of all products, e.g. to drop deleted products from the search index.
+        '''
+        return set(self.session.execute(select(Product.id)).scalars())
+
+
     def get_products_to_scrape(self, scrape_interval: tuple[str, int], retailer_id: int) -> List[ProductSchema]:
         '''
-        Returns a list of products that need to be scraped for this retailer:
+        Returns a list of products that need to be scraped for this retailer, see iter_products_to_scrape.
+
+        Args:
+            scrape_interval: Tuple of interval_name (current_year, previous_year, older) and interval to check for new prices again (in seconds)
+            retailer_id: The ID of the retailer to check prices for
+        '''
+        return list(self.iter_products_to_scrape(scrape_interval, retailer_id))
+
+
+    def iter_products_to_scrape(self, scrape_interval: tuple[str, int], retailer_id: int, batch_size: int = 1000) -> Iterator[ProductSchema]:
+        '''
+        Yields the products that need to be scraped for this retailer ordered by ID, fetched from a server-side cursor
+        in batches of batch_size rows, so scraping can start with the first batch and memory stays flat for large catalogs:
         Filters products by release_year depending on the first value in scrape_interval (current_year, previous_year, older).
         Excludes products by excluded brands set in retailer.
         Gets products where there is no price at all for this retailer or the last price was updated more than interval_duration seconds ago.
 
+        The cursor keeps the session's transaction open until the generator is exhausted or closed.
+
         Args:
-            scrape_ interval: Tuple of interval_name (current_year, previous_year, older) and interval to check for new prices again (in seconds)
+            scrape_interval: Tuple of interval_name (current_year, previous_year, older) and interval to check for new prices again (in seconds)
             retailer_id: The ID of the retailer to check prices for
+            batch_size: Rows per fetch from the cursor
         '''
-        interval_name, interval_duration = scrape_interval
-        current_year = datetime.datetime.now().year
-        
-        retailer = self.session.query(Retailer).filter(Retailer.id == retailer_id).first()
-        excluded_brands = retailer.excluded_brands
-        
-        if interval_name == 'current_year':
-            year_filter = Product.release_year == current_year
-        elif interval_name == 'previous_year':
-            year_filter = Product.release_year == current_year - 1
-        else: # older
-            year_filter = Product.release_year < current_year - 1
-        
-        products = self.session.query(Product).outerjoin(
-            Prices,
-            (Product.id == Prices.product_id) & (Prices.retailer_id == retailer_id)
-        ).filter(
-            year_filter,
-            ~Product.manufacturer.in_(excluded_brands),
-            or_(
-                Prices.id == None,
-                Prices.last_updated < datetime.datetime.now() - datetime.timedelta(seconds=interval_duration)
-            )
-        ).all()
-        
-        return [ProductSchema.model_validate(product.__dict__) for product in products]
+        excluded_brands = self.session.execute(select(Retailer.excluded_brands).where(Retailer.id == retailer_id)).scalar()
+        query = select_products_to_scrape(scrape_interval, retailer_id, excluded_brands or [])
+        for row in self.session.execute(query.execution_options(yield_per=batch_size)):
+            yield to_product_schema(row)
 
 
     def update_entry(self, product_id: int, updates: Dict[str, Any]) -> Optional[ProductSchema]:
         '''
         Updates a product entry in the products table. When changing a value, the created_at value is updated to now.
+        A changed rrp also refreshes the product's offer summary, whose discount is computed from it.
         
         Returns the updated ProductSchema or none if nothing has changed.
         
@@ -150,10 +311,15 @@ class ProductService:
         if not product:
             logger.warning(f'No product found with id={product_id}')
             return None
+        previous_manufacturer, previous_rrp = product.manufacturer, product.rrp
         for key, value in updates.items():
             if hasattr(product, key):
                 logger.info(f'Updating {key} from {getattr(product, key)} to {value}')
                 setattr(product, key, value)
         product.created_at = datetime.datetime.now(datetime.UTC)
+        if product.rrp != previous_rrp:
+            self.session.flush()
+            OfferSummaryService(self.session).refresh([product_id])
         self.session.commit()
-        return ProductSchema.model_validate(product.__dict__)
\ No newline at end of file
+        invalidate_products(self.session, [product_id], previous_manufacturers=[previous_manufacturer])
+        return ProductSchema.model_validate(product, from_attributes=True)
\ No newline at end of file
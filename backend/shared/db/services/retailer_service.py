@@ -4,6 +4,19 @@ from ..models import Retailer
 from shared.schemas import RetailerSchema
 
 
+def to_retailer_schema(retailer: Retailer) -> RetailerSchema:
+    return RetailerSchema.model_validate({
+        'id': retailer.id,
+        'name': retailer.name,
+        'base_url': retailer.base_url,
+        'scraping_config': retailer.scraping_config,
+        'affiliate_tag': retailer.affiliate_tag,
+        'scrape_intervals': retailer.scrape_intervals,
+        'excluded_brands': retailer.excluded_brands,
+        'base_image_url': retailer.base_image_url
+    })
+
+
 class RetailerService:
     '''
     Service for handling Retailer-related database operations.
@@ -38,24 +51,11 @@ class RetailerService:
         Get a retailer by ID.
         '''
         retailer = self.session.query(Retailer).filter(Retailer.id == retailer_id).first()
-        return RetailerSchema.model_validate(retailer.__dict__) if retailer else None
+        return to_retailer_schema(retailer) if retailer else None
 
 
     def get_all(self) -> List[RetailerSchema]:
         '''
         Returns all retailers.
         '''
-        retailers = self.session.query(Retailer).all()
-        return [
-            RetailerSchema.model_validate({
-                'id': r.id,
-                'name': r.name,
-                'base_url': r.base_url,
-                'scraping_config': r.scraping_config,
-                'affiliate_tag': r.affiliate_tag,
-                'scrape_intervals': r.scrape_intervals,
-                'excluded_brands': r.excluded_brands,
-                'base_image_url': r.base_image_url
-            })
-            for r in retailers
-        ]
+        return [to_retailer_schema(r) for r in self.session.query(Retailer).all()]
@@ -0,0 +1,193 @@
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import select, update, func, case, and_, or_ # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+from sqlalchemy.dialects.postgresql import insert as pg_insert # type: ignore
+from ..models import ScrapeJob
+import datetime
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+class ScrapeJobService:
+    '''
+    Service for the scrape_jobs work queue shared by scraper workers on any number of nodes.
+
+    Jobs are enqueued per product and retailer (e.g. by ScrapeScheduler.publish), claimed in batches with
+    SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers get disjoint batches, and held with a lease that
+    workers extend with heartbeat. Leases of crashed workers expire and their jobs are handed out again.
+    Timestamps come from the workers' clocks (UTC), so lease_seconds should be well above the clock skew between nodes.
+    Every method commits.
+    '''
+    def __init__(self, session: Session):
+        self.session = session
+
+
+    def enqueue(self, jobs: List[Tuple[int, int, float]], reopen_after: int = 0, chunk_size: int = 1000) -> int:
+        '''
+        Adds jobs or updates the priority of pending ones. Done and failed jobs become pending again with their
+        attempts reset if they finished more than reopen_after seconds ago, leased jobs are left to their worker.
+
+        Returns the number of jobs added or updated.
+
+        Args:
+            jobs: List of (product_id, retailer_id, priority)
+            reopen_after: Seconds after which done and failed jobs are handed out again
+            chunk_size: Number of jobs per statement
+        '''
+        now = utcnow()
+        reopen = ScrapeJob.status.in_(['done', 'failed'])
+        written = 0
+        for i in range(0, len(jobs), chunk_size):
+            # ON CONFLICT cannot touch the same row twice in one statement
+            chunk = {(product_id, retailer_id): priority for product_id, retailer_id, priority in jobs[i:i + chunk_size]}
+            statement = pg_insert(ScrapeJob).values([
+                {
+                    'product_id': product_id,
+                    'retailer_id': retailer_id,
+                    'priority': priority,
+                    'status': 'pending',
+                    'available_at': now,
+                    'attempts': 0,
+                    'updated_at': now
+                }
+                for (product_id, retailer_id), priority in chunk.items()
+            ])
+            statement = statement.on_conflict_do_update(
+                index_elements=[ScrapeJob.product_id, ScrapeJob.retailer_id],
+                set_={
+                    'priority': statement.excluded.priority,
+                    'status': 'pending',
+                    'available_at': case((reopen, statement.excluded.available_at), else_=ScrapeJob.available_at),
+                    'attempts': case((reopen, 0), else_=ScrapeJob.attempts),
+                    'updated_at': statement.excluded.updated_at
+                },
+                where=and_(
+                    ScrapeJob.status != 'leased',
+                    or_(~reopen, ScrapeJob.updated_at <= now - datetime.timedelta(seconds=reopen_after))
+                )
+            )
+            written += self.session.execute(statement).rowcount
+            self.session.commit()
+        return written
+
+
+    def claim(self, retailer_id: int, worker_id: str, limit: int, lease_seconds: int = 300) -> List[Dict[str, Any]]:
+        '''
+        Leases up to limit pending jobs of a retailer to a worker, highest priority first.
+        Rows locked by a concurrent claim are skipped instead of waited for, so workers never get the same job.
+
+        Returns a list of {'id', 'product_id', 'attempts'}.
+
+        Args:
+            retailer_id: The ID of the retailer
+            worker_id: Unique ID of the worker, e.g. hostname and process ID
+            limit: Max number of jobs
+            lease_seconds: Seconds until the jobs are handed out again without a heartbeat
+        '''
+        now = utcnow()
+        claimable = select(ScrapeJob.id).where(
+            ScrapeJob.retailer_id == retailer_id,
+            ScrapeJob.status == 'pending',
+            ScrapeJob.available_at <= now
+        ).order_by(ScrapeJob.priority.desc(), ScrapeJob.id).limit(limit).with_for_update(skip_locked=True)
+        statement = update(ScrapeJob).where(
+            ScrapeJob.id.in_(claimable.scalar_subquery())
+        ).values(
+            status='leased',
+            leased_by=worker_id,
+            lease_expires_at=now + datetime.timedelta(seconds=lease_seconds),
+            attempts=ScrapeJob.attempts + 1,
+            updated_at=now
+        ).returning(ScrapeJob.id, ScrapeJob.product_id, ScrapeJob.attempts)
+        rows = self.session.execute(statement).all()
+        self.session.commit()
+        return [row._asdict() for row in rows]
+
+
+    def heartbeat(self, job_ids: List[int], worker_id: str, lease_seconds: int = 300) -> int:
+        '''
+        Extends the leases of a worker's jobs. Returns the number of jobs the worker still holds,
+        fewer than job_ids means leases expired and the jobs may have been claimed by another worker.
+        '''
+        if not job_ids:
+            return 0
+        now = utcnow()
+        result = self.session.execute(
+            update(ScrapeJob).where(
+                ScrapeJob.id.in_(job_ids),
+                ScrapeJob.leased_by == worker_id,
+                ScrapeJob.status == 'leased'
+            ).values(lease_expires_at=now + datetime.timedelta(seconds=lease_seconds), updated_at=now)
+        )
+        self.session.commit()
+        return result.rowcount
+
+
+    def complete(self, job_ids: List[int], worker_id: str) -> int:
+        '''
+        Marks jobs of a worker as done. Jobs whose lease was lost to another worker are left alone.
+        Returns the number of completed jobs.
+        '''
+        return self._finish(job_ids, worker_id, {'status': 'done', 'last_error': None})
+
+
+    def fail(self, job_ids: List[int], worker_id: str, error: str, retry_after: int = 600, max_attempts: int = 3) -> int:
+        '''
+        Returns jobs of a worker to the queue to be retried after retry_after seconds,
+        or marks them as failed once they were attempted max_attempts times.
+        Returns the number of jobs.
+        '''
+        return self._finish(job_ids, worker_id, {
+            'status': case((ScrapeJob.attempts >= max_attempts, 'failed'), else_='pending'),
+            'available_at': utcnow() + datetime.timedelta(seconds=retry_after),
+            'last_error': error[:1000]
+        })
+
+
+    def _finish(self, job_ids: List[int], worker_id: str, values: Dict[str, Any]) -> int:
+        if not job_ids:
+            return 0
+        result = self.session.execute(
+            update(ScrapeJob).where(
+                ScrapeJob.id.in_(job_ids),
+                ScrapeJob.leased_by == worker_id,
+                ScrapeJob.status == 'leased'
+            ).values(**values, leased_by=None, lease_expires_at=None, updated_at=utcnow())
+        )
+        self.session.commit()
+        return result.rowcount
+
+
+    def expire_leases(self, max_attempts: int = 3) -> int:
+        '''
+        Returns jobs whose lease expired (their worker crashed or hung) to the queue, or marks them as failed
+        once they were attempted max_attempts times. Safe to call from every worker, e.g. before each claim.
+        Returns the number of expired leases.
+        '''
+        now = utcnow()
+        result = self.session.execute(
+            update(ScrapeJob).where(
+                ScrapeJob.status == 'leased',
+                ScrapeJob.lease_expires_at < now
+            ).values(
+                status=case((ScrapeJob.attempts >= max_attempts, 'failed'), else_='pending'),
+                last_error='Lease expired',
+                leased_by=None,
+                lease_expires_at=None,
+                updated_at=now
+            )
+        )
+        self.session.commit()
+        return result.rowcount
+
+
+    def get_stats(self, retailer_id: Optional[int] = None) -> Dict[str, int]:
+        '''
+        Returns the number of jobs per status, optionally for one retailer.
+        '''
+        query = select(ScrapeJob.status, func.count()).group_by(ScrapeJob.status)
+        if retailer_id is not None:
+            query = query.where(ScrapeJob.retailer_id == retailer_id)
+        return {status: count for status, count in self.session.execute(query).all()}
@@ -0,0 +1,149 @@
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from sqlalchemy import select, Select, func, case, cast, exists, literal, or_, true, ColumnElement # type: ignore
+from sqlalchemy.dialects.postgresql import JSONB # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+from ..models import Product, Prices, Retailer
+from .retailer_service import RetailerService
+from shared.schemas import RetailerSchema
+import datetime, math
+
+
+BUCKETS = ('current_year', 'previous_year', 'older')
+DEFAULT_INTERVALS: Dict[str, int] = RetailerSchema.model_fields['scrape_intervals'].default
+# Rough seconds per product and worker by scraping_method, used until measured values are passed to get_plan
+DEFAULT_SECONDS_PER_PRODUCT = {'ui': 8.0, 'api': 1.0, 'sitemap': 1.0}
+
+
+def brand_excluded(dialect: str) -> ColumnElement:
+    '''
+    Whether a product is excluded by its retailer's excluded_brands JSON list. Same rule as
+    ~Product.manufacturer.in_(excluded_brands) in select_products_to_scrape, where NOT IN is NULL for products
+    without a manufacturer: these are excluded whenever the list is not empty.
+    '''
+    if dialect == 'postgresql':
+        brands = cast(Retailer.excluded_brands, JSONB)
+        has_brands = case((func.jsonb_typeof(brands) == 'array', func.jsonb_array_length(brands)), else_=0) > 0
+        listed = brands.has_key(Product.manufacturer)
+    else:
+        elements = func.json_each(Retailer.excluded_brands).table_valued('value')
+        has_brands = func.coalesce(func.json_array_length(Retailer.excluded_brands), 0) > 0
+        listed = exists().select_from(elements).where(elements.c.value == Product.manufacturer)
+    return has_brands & or_(Product.manufacturer.is_(None), listed)
+
+
+def age_seconds(column: ColumnElement, now: datetime.datetime, dialect: str) -> ColumnElement:
+    if dialect == 'postgresql':
+        return func.extract('epoch', literal(now) - column)
+    return (func.julianday(literal(now)) - func.julianday(column)) * 86400
+
+
+def select_due_work(dialect: str, now: Optional[datetime.datetime] = None) -> Select:
+    '''
+    Builds one query for the due (retailer_id, product_id, bucket) pairs of all retailers: products by release_year
+    bucket, with no price at the retailer or a price older than the retailer's scrape_intervals for the bucket,
+    excluding the retailer's excluded_brands. Same rules as ProductService.iter_products_to_scrape, for every retailer
+    and bucket in a single scan of products and prices instead of one query per retailer and bucket.
+
+    Args:
+        dialect: The session's dialect name, the JSON functions differ between postgresql and sqlite
+        now: The reference time, defaults to now
+    '''
+    now = now or datetime.datetime.now()
+    current_year = now.year
+    bucket_conditions = {
+        'current_year': Product.release_year == current_year,
+        'previous_year': Product.release_year == current_year - 1,
+        'older': Product.release_year < current_year - 1
+    }
+    bucket = case(*[(condition, literal(name)) for name, condition in bucket_conditions.items()]).label('bucket')
+    interval = case(*[
+        (condition, func.coalesce(Retailer.scrape_intervals[name].as_integer(), DEFAULT_INTERVALS[name]))
+        for name, condition in bucket_conditions.items()
+    ])
+    return select(
+        Retailer.id.label('retailer_id'),
+        Product.id.label('product_id'),
+        bucket
+    ).select_from(Product).join(Retailer, true()).outerjoin(
+        Prices,
+        (Prices.product_id == Product.id) & (Prices.retailer_id == Retailer.id)
+    ).where(
+        Product.release_year <= current_year, # in one of the buckets
+        ~brand_excluded(dialect),
+        or_(Prices.last_updated.is_(None), age_seconds(Prices.last_updated, now, dialect) > interval)
+    )
+
+
+def estimate_seconds(due: int, retailer: RetailerSchema, seconds_per_product: Optional[float] = None) -> float:
+    '''
+    Estimates the time to scrape due products for a retailer: seconds per product divided by the number of
+    parallel workers (drivers for ui, HTTP workers for api and sitemap).
+    '''
+    config = retailer.scraping_config
+    seconds = seconds_per_product or DEFAULT_SECONDS_PER_PRODUCT.get(config.scraping_method, DEFAULT_SECONDS_PER_PRODUCT['ui'])
+    parallel = config.concurrency if config.scraping_method == 'ui' else config.http_settings.get('workers', 8)
+    return due * seconds / max(1, parallel)
+
+
+class ScrapePlanService:
+    '''
+    Service for planning a scrape cycle across all retailers and release_year buckets with one set-based query.
+    '''
+    def __init__(self, session: Session):
+        self.session = session
+
+
+    def _dialect(self) -> str:
+        return self.session.get_bind().dialect.name
+
+
+    def get_due_counts(self, now: Optional[datetime.datetime] = None) -> Dict[int, Dict[str, int]]:
+        '''
+        Returns the number of due products per retailer ID and bucket (current_year, previous_year, older).
+        '''
+        due_work = select_due_work(self._dialect(), now).subquery()
+        rows = self.session.execute(
+            select(due_work.c.retailer_id, due_work.c.bucket, func.count()).group_by(due_work.c.retailer_id, due_work.c.bucket)
+        ).all()
+        counts: Dict[int, Dict[str, int]] = {}
+        for retailer_id, bucket, count in rows:
+            counts.setdefault(retailer_id, {name: 0 for name in BUCKETS})[bucket] = count
+        return counts
+
+
+    def get_plan(self, seconds_per_product: Optional[Dict[int, float]] = None, now: Optional[datetime.datetime] = None) -> List[Dict[str, Any]]:
+        '''
+        Returns the plan for a scrape cycle, one entry per retailer with its due products per bucket, the total,
+        the number of batches of scrape_budget products and the estimated runtime in seconds.
+
+        Args:
+            seconds_per_product: Measured seconds per product by retailer ID (e.g. the p50_s of recent runs),
+                DEFAULT_SECONDS_PER_PRODUCT for the scraping_method otherwise
+            now: The reference time, defaults to now
+        '''
+        seconds_per_product = seconds_per_product or {}
+        counts = self.get_due_counts(now)
+        plan = []
+        for retailer in RetailerService(self.session).get_all():
+            due = counts.get(retailer.id, {name: 0 for name in BUCKETS})
+            total = sum(due.values())
+            plan.append({
+                'retailer_id': retailer.id,
+                'name': retailer.name,
+                'scraping_method': retailer.scraping_config.scraping_method,
+                **due,
+                'total': total,
+                'batches': math.ceil(total / max(1, retailer.scraping_config.scrape_budget)),
+                'estimated_seconds': round(estimate_seconds(total, retailer, seconds_per_product.get(retailer.id)), 1)
+            })
+        return plan
+
+
+    def iter_due_work(self, batch_size: int = 1000, now: Optional[datetime.datetime] = None) -> Iterator[Tuple[int, int, str]]:
+        '''
+        Yields all due (retailer_id, product_id, bucket) pairs ordered by retailer and product, streamed in batches
+        of batch_size rows, e.g. to enqueue them with ScrapeJobService.enqueue.
+        '''
+        query = select_due_work(self._dialect(), now).order_by(Retailer.id, Product.id)
+        for row in self.session.execute(query.execution_options(yield_per=batch_size)):
+            yield row.retailer_id, row.product_id, row.bucket
@@ -0,0 +1,85 @@
+from typing import List, Dict, Any
+from sqlalchemy import func, case, and_ # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+from ..models import Product, Prices, Retailer, PriceObservation, ProductView
+import datetime
+
+
+class ScrapeScheduleService:
+    '''
+    Service for reading the signals the scrape scheduler uses to prioritize products.
+    '''
+
+    def __init__(self, session: Session):
+        self.session = session
+
+
+    def get_candidates(self, retailer_id: int, window_days: int = 30) -> List[Dict[str, Any]]:
+        '''
+        Returns one entry per product that can be scraped for a retailer (excluding the retailer's excluded brands) with:
+        last_checked (when the price was last scraped, changed or not; None if never scraped), price_changes and stock_flips within the last window_days, and view_count.
+
+        Args:
+            retailer_id: The ID of the retailer
+            window_days: Number of days of price_observations to consider for volatility and in-stock flips
+        '''
+        retailer = self.session.query(Retailer).filter(Retailer.id == retailer_id).first()
+        excluded_brands = retailer.excluded_brands or []
+        since = datetime.datetime.now(datetime.UTC) - datetime.timedelta(days=window_days)
+
+        window = {'partition_by': PriceObservation.product_id, 'order_by': PriceObservation.observed_at}
+        observations = self.session.query(
+            PriceObservation.product_id,
+            PriceObservation.price,
+            PriceObservation.in_stock,
+            func.lag(PriceObservation.price).over(**window).label('previous_price'),
+            func.lag(PriceObservation.in_stock).over(**window).label('previous_in_stock')
+        ).filter(
+            PriceObservation.retailer_id == retailer_id,
+            PriceObservation.observed_at >= since
+        ).subquery()
+        volatility = self.session.query(
+            observations.c.product_id,
+            func.sum(case(
+                (and_(
+                    observations.c.previous_price.isnot(None),
+                    observations.c.price.is_distinct_from(observations.c.previous_price)
+                ), 1),
+                else_=0
+            )).label('price_changes'),
+            func.sum(case(
+                (and_(
+                    observations.c.previous_in_stock.isnot(None),
+                    observations.c.in_stock.is_distinct_from(observations.c.previous_in_stock)
+                ), 1),
+                else_=0
+            )).label('stock_flips')
+        ).group_by(observations.c.product_id).subquery()
+
+        rows = self.session.query(
+            Product.id,
+            func.coalesce(Prices.last_checked, Prices.last_updated),
+            func.coalesce(volatility.c.price_changes, 0),
+            func.coalesce(volatility.c.stock_flips, 0),
+            func.coalesce(ProductView.view_count, 0)
+        ).outerjoin(
+            Prices,
+            (Product.id == Prices.product_id) & (Prices.retailer_id == retailer_id)
+        ).outerjoin(
+            volatility, Product.id == volatility.c.product_id
+        ).outerjoin(
+            ProductView, Product.id == ProductView.product_id
+        ).filter(
+            ~Product.manufacturer.in_(excluded_brands)
+        ).all()
+
+        return [
+            {
+                'product_id': product_id,
+                'last_checked': last_checked,
+                'price_changes': price_changes,
+                'stock_flips': stock_flips,
+                'view_count': view_count
+            }
+            for product_id, last_checked, price_changes, stock_flips, view_count in rows
+        ]
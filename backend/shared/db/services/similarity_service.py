@@ -0,0 +1,222 @@
+from typing import Optional, List, Dict, Any, Callable, Sequence, Tuple
+from sqlalchemy import select, Select, update, exists, text # type: ignore
+from sqlalchemy.orm import Session # type: ignore
+from ..models import Product, Prices, ProductContent
+from shared.schemas import SimilarProductSchema
+from shared.logger import logger
+import numpy as np
+
+DEFAULT_CONTENT_TYPE = 'ai_description'
+INDEX_METHODS = ('hnsw', 'ivfflat')
+SIMILAR_PRODUCT_COLUMNS = (
+    Product.id,
+    Product.manufacturer_id,
+    Product.name,
+    Product.manufacturer,
+    Product.base_image_url,
+    Product.release_year
+)
+
+
+def select_embeddings(content_type: str, exclude_product_id: Optional[int], manufacturer: Optional[str], in_stock: bool) -> Select:
+    '''
+    Builds the query for the embeddings of all candidate products, used by both the ANN and the brute-force search.
+    Assumes one ProductContent row per product and content_type.
+    '''
+    query = select(*SIMILAR_PRODUCT_COLUMNS, ProductContent.embedding).join(
+        ProductContent, ProductContent.product_id == Product.id
+    ).where(
+        ProductContent.content_type == content_type,
+        ProductContent.embedding.isnot(None)
+    )
+    if exclude_product_id is not None:
+        query = query.where(Product.id != exclude_product_id)
+    if manufacturer:
+        query = query.where(Product.manufacturer == manufacturer)
+    if in_stock:
+        query = query.where(exists().where(Prices.product_id == Product.id, Prices.in_stock == True))
+    return query
+
+
+def cosine_top_k(target: Sequence[float], matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Exact nearest neighbours by cosine similarity. Returns the row indices and similarities of the top k rows, best first.
+    '''
+    if len(matrix) == 0:
+        return np.array([], dtype=int), np.array([])
+    target = np.asarray(target, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(target)
+    similarities = (matrix @ target) / np.where(norms == 0, 1, norms)
+    k = min(k, len(similarities))
+    top = np.argpartition(-similarities, k - 1)[:k]
+    top = top[np.argsort(-similarities[top])]
+    return top, similarities[top]
+
+
+def content_text(content: Any) -> str:
+    '''
+    Flattens structured ProductContent.content (dicts, lists, strings) into the text that is embedded.
+    '''
+    if isinstance(content, dict):
+        return ' '.join(content_text(value) for value in content.values())
+    if isinstance(content, (list, tuple)):
+        return ' '.join(content_text(value) for value in content)
+    return '' if content is None else str(content)
+
+
+class SimilarityService:
+    '''
+    Service for "similar products" by the embeddings in product_content.
+
+    On Postgres, queries use pgvector's cosine distance operator so they are served by the HNSW (or IVFFlat) index.
+    On other databases (sqlite in tests), embeddings are loaded and ranked exactly with NumPy.
+    '''
+
+    def __init__(self, session: Session):
+        self.session = session
+
+
+    def _is_postgres(self) -> bool:
+        return self.session.get_bind().dialect.name == 'postgresql'
+
+
+    def get_embedding(self, product_id: int, content_type: str = DEFAULT_CONTENT_TYPE) -> Optional[List[float]]:
+        embedding = self.session.execute(
+            select(ProductContent.embedding).where(
+                ProductContent.product_id == product_id,
+                ProductContent.content_type == content_type,
+                ProductContent.embedding.isnot(None)
+            ).limit(1)
+        ).scalar_one_or_none()
+        return None if embedding is None else [float(value) for value in embedding]
+
+
+    def get_similar_products(
+        self,
+        product_id: int,
+        content_type: str = DEFAULT_CONTENT_TYPE,
+        k: int = 10,
+        manufacturer: Optional[str] = None,
+        in_stock: bool = False,
+        ef_search: Optional[int] = None,
+        exact: bool = False
+    ) -> List[SimilarProductSchema]:
+        '''
+        Returns the k products whose embedding is most similar to the product's embedding, most similar first.
+        Returns an empty list if the product has no embedding for the content type.
+
+        Args:
+            product_id: ID of the product to find similar products for
+            content_type: Which ProductContent embedding to compare
+            k: Max number of results
+            manufacturer: Optional manufacturer to restrict results to
+            in_stock: Only return products with at least one price in stock
+            ef_search: HNSW candidate list size (pgvector default 40). Filters are applied to the candidates,
+                so raise it when filtering by a small manufacturer. Defaults to max(40, 4 * k).
+            exact: Skip the ANN index and rank all embeddings exactly (used by the recall benchmark)
+        '''
+        target = self.get_embedding(product_id, content_type)
+        if target is None:
+            return []
+        return self.get_nearest(target, content_type, k, product_id, manufacturer, in_stock, ef_search, exact)
+
+
+    def get_nearest(
+        self,
+        target: Sequence[float],
+        content_type: str = DEFAULT_CONTENT_TYPE,
+        k: int = 10,
+        exclude_product_id: Optional[int] = None,
+        manufacturer: Optional[str] = None,
+        in_stock: bool = False,
+        ef_search: Optional[int] = None,
+        exact: bool = False
+    ) -> List[SimilarProductSchema]:
+        '''
+        Returns the k products nearest to an embedding. See get_similar_products.
+        '''
+        query = select_embeddings(content_type, exclude_product_id, manufacturer, in_stock)
+        if self._is_postgres() and not exact:
+            distance = ProductContent.embedding.cosine_distance(target)
+            self.session.execute(text(f'SET LOCAL hnsw.ef_search = {int(ef_search or max(40, 4 * k))}'))
+            rows = self.session.execute(
+                query.with_only_columns(*SIMILAR_PRODUCT_COLUMNS, (1 - distance).label('similarity')).order_by(distance).limit(k)
+            ).all()
+            return [SimilarProductSchema.model_validate(row._asdict()) for row in rows]
+
+        rows = self.session.execute(query).all()
+        if not rows:
+            return []
+        matrix = np.array([row.embedding for row in rows], dtype=np.float32)
+        top, similarities = cosine_top_k(target, matrix, k)
+        return [
+            SimilarProductSchema.model_validate({**rows[index]._asdict(), 'similarity': float(similarity)})
+            for index, similarity in zip(top, similarities)
+        ]
+
+
+    def backfill_embeddings(
+        self,
+        embed: Callable[[List[str]], Sequence[Sequence[float]]],
+        content_type: Optional[str] = None,
+        batch_size: int = 100
+    ) -> int:
+        '''
+        Computes embeddings for all product_content rows with embedding IS NULL in batches and commits after every batch,
+        so an interrupted backfill continues where it stopped. Returns the number of rows updated.
+
+        Args:
+            embed: Function returning one embedding per text, e.g. a sentence-transformers model's encode
+            content_type: Optional content type to restrict the backfill to
+            batch_size: Number of rows embedded and written per batch
+        '''
+        updated = 0
+        after_id = 0
+        while True:
+            query = select(ProductContent.id, ProductContent.content).where(
+                ProductContent.embedding.is_(None),
+                ProductContent.id > after_id
+            )
+            if content_type:
+                query = query.where(ProductContent.content_type == content_type)
+            rows = self.session.execute(query.order_by(ProductContent.id).limit(batch_size)).all()
+            if not rows:
+                break
+            embeddings = embed([content_text(row.content) for row in rows])
+            self.session.execute(
+                update(ProductContent),
+                [{'id': row.id, 'embedding': [float(value) for value in embedding]} for row, embedding in zip(rows, embeddings)]
+            )
+            self.session.commit()
+            after_id = rows[-1].id
+            updated += len(rows)
+            logger.info(f'Backfilled {updated} embeddings')
+        return updated
+
+
+    def create_index(self, method: str = 'hnsw', lists: Optional[int] = None):
+        '''
+        Creates the ANN index on product_content.embedding for existing databases (create_all creates the HNSW index for new ones).
+        HNSW has better recall/latency and needs no training, IVFFlat builds faster and smaller but should be created
+        after the backfill, with about rows / 1000 lists.
+
+        Args:
+            method: 'hnsw' or 'ivfflat'
+            lists: Number of IVFFlat lists, defaults to rows / 1000
+        '''
+        if method not in INDEX_METHODS:
+            raise ValueError(f'Invalid index method: {method}')
+        if method == 'hnsw':
+            self.session.execute(text(
+                'CREATE INDEX IF NOT EXISTS ix_product_content_embedding_hnsw ON product_content '
+                'USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)'
+            ))
+        else:
+            if lists is None:
+                count = self.session.execute(text('SELECT count(*) FROM product_content WHERE embedding IS NOT NULL')).scalar()
+                lists = max(1, count // 1000)
+            self.session.execute(text(
+                'CREATE INDEX IF NOT EXISTS ix_product_content_embedding_ivfflat ON product_content '
+                f'USING ivfflat (embedding vector_cosine_ops) WITH (lists = {int(lists)})'
+            ))
+        self.session.commit()
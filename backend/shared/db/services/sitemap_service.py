@@ -0,0 +1,50 @@
+from typing import Optional, Dict, Tuple
+from sqlalchemy.orm import Session # type: ignore
+from sqlalchemy.dialects.postgresql import insert as pg_insert # type: ignore
+from ..models import SitemapEntry
+import datetime
+
+
+class SitemapService:
+    '''
+    Service for handling SitemapEntry-related database operations.
+    '''
+
+    def __init__(self, session: Session):
+        self.session = session
+
+
+    def get_lastmods(self, retailer_id: int) -> Dict[str, Optional[datetime.datetime]]:
+        '''
+        Returns the lastmod of every known sitemap URL of a retailer.
+        '''
+        entries = self.session.query(SitemapEntry.url, SitemapEntry.lastmod).filter(SitemapEntry.retailer_id == retailer_id).all()
+        return {url: lastmod for url, lastmod in entries}
+
+
+    def save_lastmods(self, retailer_id: int, entries: Dict[str, Tuple[int, Optional[datetime.datetime]]], chunk_size: int = 1000):
+        '''
+        Inserts or updates sitemap entries after their pages were scraped.
+
+        Args:
+            retailer_id: Retailer ID
+            entries: URL -> (product_id, lastmod), e.g. BaseScraper.scraped_lastmods
+            chunk_size: Number of entries per statement
+        '''
+        now = datetime.datetime.now(datetime.UTC)
+        rows = [
+            {'retailer_id': retailer_id, 'url': url, 'product_id': product_id, 'lastmod': lastmod, 'last_fetched': now}
+            for url, (product_id, lastmod) in entries.items()
+        ]
+        for i in range(0, len(rows), chunk_size):
+            statement = pg_insert(SitemapEntry).values(rows[i:i + chunk_size])
+            statement = statement.on_conflict_do_update(
+                constraint='uix_retailer_url',
+                set_={
+                    'product_id': statement.excluded.product_id,
+                    'lastmod': statement.excluded.lastmod,
+                    'last_fetched': statement.excluded.last_fetched
+                }
+            )
+            self.session.execute(statement)
+        self.session.commit()
@@ -1,12 +1,118 @@
-import logging
+import logging, logging.handlers, atexit, copy, datetime, json, os, queue, random, sys
 
 
-def setup_logging():
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
-    return logging.getLogger(__name__)
+# Noisy libraries are kept at WARNING unless LOG_LEVELS says otherwise
+DEFAULT_MODULE_LEVELS = {
+    'sqlalchemy.engine': 'WARNING',
+    'apscheduler': 'WARNING',
+    'urllib3': 'WARNING',
+    'seleniumwire': 'WARNING',
+    'selenium': 'WARNING',
+    'aiosqlite': 'WARNING',
+    'asyncio': 'WARNING'
+}
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
 
-logger = setup_logging()
\ No newline at end of file
+class JsonFormatter(logging.Formatter):
+    '''
+    Formats records as one JSON object per line with the fields passed as extra={'fields': {...}} merged in.
+    '''
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.UTC).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text: # formatted by StructuredQueueHandler
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    '''
+    The plain text format for local development, with the fields appended as "message | {fields}".
+    '''
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = getattr(record, 'fields', None)
+        return f'{text} | {fields}' if fields else text
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    '''
+    QueueHandler that keeps the traceback apart from the message. The default prepare folds the formatted
+    traceback into msg and drops exc_info, so JsonFormatter could not write it as the exception field.
+    '''
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None # tracebacks hold references to frames, only the text is queued
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    '''
+    Keeps a record passed with extra={'sample_rate': r} with probability r, e.g. 0.01 for per-product events.
+    Warnings and errors are sampled too, so only pass a sample_rate for events that are also counted as metrics.
+    '''
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, 'sample_rate', 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+def module_levels() -> dict:
+    '''
+    Returns the per-logger levels from DEFAULT_MODULE_LEVELS and LOG_LEVELS, e.g. LOG_LEVELS="sqlalchemy.engine=INFO,scraping=DEBUG".
+    '''
+    levels = dict(DEFAULT_MODULE_LEVELS)
+    for entry in os.getenv('LOG_LEVELS', '').split(','):
+        if '=' in entry:
+            name, level = entry.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging() -> logging.Logger:
+    '''
+    Configures the root logger from the environment:
+    LOG_LEVEL (default INFO), LOG_FORMAT (json or text, default json) and LOG_LEVELS for per-module levels.
+    Called once by the entrypoints (the API and scripts), further calls in the same process do nothing.
+    A forked child process (e.g. a scraper worker) has no listener thread and is configured again.
+
+    Records are put on a queue by a QueueHandler and written to stdout by a QueueListener thread,
+    so scraping and API threads never block on I/O.
+    '''
+    global _configured_pid
+    if _configured_pid == os.getpid():
+        return logger
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if os.getenv('LOG_FORMAT', 'json') == 'json' else TextFormatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    for name, level in module_levels().items():
+        logging.getLogger(name).setLevel(level)
+    _configured_pid = os.getpid()
+    return logger
+
+
+_configured_pid = None
+logger = logging.getLogger(__name__)
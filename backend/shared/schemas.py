@@ -1,4 +1,4 @@
-import datetime
+import datetime, functools
 from pydantic import BaseModel, field_validator, ConfigDict
 from typing import Optional, Dict, Any, List, Tuple
 
@@ -54,13 +54,21 @@ class ProductSchema(BaseModel):
     @classmethod
     def release_year_to_int(cls, v):
         if isinstance(v, str):
-            return None
+            return int(v) if v.strip().isdigit() else None
         else:
             return v
 
     model_config = ConfigDict(coerce_numbers_to_str=True)
 
 
+@functools.lru_cache(maxsize=65536)
+def parse_timestamp(value: str) -> datetime.datetime:
+    '''
+    Parses an ISO timestamp of a legacy price history. Cached, since the same histories are read on every request.
+    '''
+    return datetime.datetime.fromisoformat(value)
+
+
 class PriceHistory(BaseModel):
     history: List[Tuple[datetime.datetime, float]] = []
 
@@ -79,10 +87,15 @@ class PriceSchema(BaseModel):
     @field_validator('price_history', mode='before')
     @classmethod
     def parse_price_history(cls, v):
-        if v:
-            return PriceHistory(history=[(datetime.datetime.fromisoformat(x['datetime']), x['price']) for x in v])
+        '''
+        Accepts a PriceHistory built from price_observations or the legacy JSON list of {'datetime', 'price'} dicts.
+        '''
+        if isinstance(v, PriceHistory):
+            return v
+        elif v:
+            return PriceHistory.model_construct(history=[(parse_timestamp(x['datetime']), x['price']) for x in v])
         else:
-            return PriceHistory(history=[])
+            return PriceHistory.model_construct(history=[])
 
 
 class RetailerConfig(BaseModel):
@@ -90,10 +103,27 @@ class RetailerConfig(BaseModel):
     base_url: str
     scraping_method: str # valid options: ui, api, sitemap
     take_screenshots: bool = False
+    concurrency: int = 1 # number of drivers scraping in parallel
+    scrape_budget: int = 500 # max number of products the scheduler hands out per batch
+    driver_recycle_after: Optional[int] = None # restart a driver after this many pages, None to never restart
     selenium_settings: Dict[str, Any] = {
         'mode': 'uc',
         'headed': True,
-        'proxy': None
+        'proxy': None,
+        'page_load_strategy': 'normal', # eager returns at DOMContentLoaded, without waiting for images and scripts
+        'block_resources': [], # e.g. ['image', 'media', 'font'], see scraping/resource_policy.py
+        'blocked_domains': [], # e.g. ['trackers', 'cdn.example.com']
+        'wait_for_selector': None # CSS selector of the price element to wait for after opening a page
+    }
+    http_settings: Dict[str, Any] = {
+        'max_connections_per_host': 4,
+        'workers': 8,
+        'timeout': 15,
+        'fallback_to_ui': True # scrape products with the driver if their plain HTTP request failed
+    }
+    sitemap_settings: Dict[str, Any] = {
+        'url': None, # sitemap or sitemap index URL
+        'product_url_pattern': None # regex with a named group manufacturer_id or ean, e.g. r'/(?P<manufacturer_id>\d+)-'
     }
 
 
@@ -127,4 +157,34 @@ class ProductListingSchema(BaseModel):
     base_image_url: Optional[str] = None
     description: Optional[str] = None
     release_year: Optional[int] = None
-    prices: List[PriceSchema] = []
\ No newline at end of file
+    prices: List[PriceSchema] = []
+
+
+class ProductOfferSchema(BaseModel):
+    '''
+    Schema for a product with its best in-stock offer from the product_offer_summaries table.
+    '''
+    id: int
+    manufacturer_id: Optional[str] = None
+    name: Optional[str] = None
+    manufacturer: Optional[str] = None
+    base_image_url: Optional[str] = None
+    release_year: Optional[int] = None
+    rrp: Optional[float] = None
+    min_price: float
+    min_price_retailer_id: int
+    offer_count: int
+    discount: Optional[float] = None
+    last_change: Optional[datetime.datetime] = None
+
+class SimilarProductSchema(BaseModel):
+    '''
+    Schema for a product similar to another product by the cosine similarity of their content embeddings.
+    '''
+    id: int
+    manufacturer_id: Optional[str] = None
+    name: Optional[str] = None
+    manufacturer: Optional[str] = None
+    base_image_url: Optional[str] = None
+    release_year: Optional[int] = None
+    similarity: float
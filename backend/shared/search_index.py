@@ -0,0 +1,216 @@
+from typing import List, Dict, Any, Optional, Set, Iterable
+from collections import Counter
+import bisect, heapq, re, threading, unicodedata
+
+
+def normalize(text: Optional[str]) -> str:
+    '''
+    Lowercases text and strips accents and punctuation for matching.
+    '''
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text).lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r'[^a-z0-9]+', ' ', text).strip()
+
+
+def trigrams(word: str) -> Set[str]:
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    '''
+    In-memory search index over products for autocomplete and search.
+
+    Every product is indexed by the words of its manufacturer, name and manufacturer_id.
+    A query matches products in tiers: exact manufacturer_id/EAN, all words as whole words,
+    all words as prefixes (bisect over the sorted vocabulary), then partial matches. Words without
+    any prefix match are corrected to similar vocabulary words by trigram similarity, so typos still
+    match. Words shorter than min_prefix_length only match whole words, since a one or two character
+    prefix (e.g. a digit of a set number) expands to a large part of the vocabulary. All tiers are set
+    operations on posting lists, so lookups stay in the low milliseconds.
+    Products can be added or updated incrementally with upsert and dropped with remove or retain. Thread-safe.
+    '''
+    def __init__(self, max_fuzzy_words: int = 5, min_similarity: float = 0.3, min_prefix_length: int = 3):
+        '''
+        Args:
+            max_fuzzy_words: Max number of vocabulary words a misspelled word is corrected to
+            min_similarity: Min trigram similarity (Jaccard) for a correction
+            min_prefix_length: Min length of a word to match it as a prefix or correct it
+        '''
+        self.max_fuzzy_words = max_fuzzy_words
+        self.min_similarity = min_similarity
+        self.min_prefix_length = min_prefix_length
+        self.documents: Dict[int, Dict[str, Any]] = {}
+        self._words: Dict[str, Set[int]] = {}
+        self._vocabulary: List[str] = [] # sorted keys of _words
+        self._word_trigrams: Dict[str, Set[str]] = {}
+        self._identifiers: Dict[str, Set[int]] = {} # normalized manufacturer_id and EAN
+        self._lock = threading.RLock()
+
+
+    def _document_terms(self, document: Dict[str, Any]):
+        text = normalize(f"{document.get('manufacturer') or ''} {document.get('name') or ''} {document.get('manufacturer_id') or ''}")
+        identifiers = {normalize(document.get(key)).replace(' ', '') for key in ('manufacturer_id', 'ean') if document.get(key)}
+        return set(text.split()), identifiers
+
+
+    def _add_word(self, word: str, product_id: int):
+        if word not in self._words:
+            self._words[word] = set()
+            bisect.insort(self._vocabulary, word)
+            for gram in trigrams(word):
+                self._word_trigrams.setdefault(gram, set()).add(word)
+        self._words[word].add(product_id)
+
+
+    def _remove_word(self, word: str, product_id: int):
+        ids = self._words.get(word)
+        if ids is None:
+            return
+        ids.discard(product_id)
+        if ids:
+            return
+        del self._words[word]
+        index = bisect.bisect_left(self._vocabulary, word)
+        if index < len(self._vocabulary) and self._vocabulary[index] == word:
+            self._vocabulary.pop(index)
+        for gram in trigrams(word):
+            words = self._word_trigrams.get(gram)
+            if words is not None:
+                words.discard(word)
+                if not words:
+                    del self._word_trigrams[gram]
+
+
+    def _remove(self, product_id: int):
+        document = self.documents.pop(product_id, None)
+        if not document:
+            return
+        words, identifiers = self._document_terms(document)
+        for word in words:
+            self._remove_word(word, product_id)
+        for identifier in identifiers:
+            ids = self._identifiers.get(identifier)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._identifiers[identifier]
+
+
+    def upsert(self, documents: Iterable[Dict[str, Any]]):
+        '''
+        Adds or replaces products. Each document needs an id and may have manufacturer, name, manufacturer_id and ean.
+        '''
+        with self._lock:
+            for document in documents:
+                self._remove(document['id'])
+                self.documents[document['id']] = document
+                words, identifiers = self._document_terms(document)
+                for word in words:
+                    self._add_word(word, document['id'])
+                for identifier in identifiers:
+                    self._identifiers.setdefault(identifier, set()).add(document['id'])
+
+
+    def remove(self, product_ids: Iterable[int]):
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+
+
+    def retain(self, product_ids: Set[int]) -> int:
+        '''
+        Removes all products whose ID is not in product_ids, e.g. deleted products. Returns the number removed.
+        '''
+        with self._lock:
+            removed = [product_id for product_id in self.documents if product_id not in product_ids]
+            self.remove(removed)
+        return len(removed)
+
+
+    def _similar_words(self, word: str) -> List[str]:
+        '''
+        Returns the vocabulary words most similar to a (misspelled) word by trigram Jaccard similarity.
+        '''
+        grams = trigrams(word)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._word_trigrams.get(gram, ()))
+        similar = []
+        for candidate, count in shared.items():
+            similarity = count / (len(grams) + len(trigrams(candidate)) - count)
+            if similarity >= self.min_similarity:
+                similar.append((similarity, candidate))
+        return [candidate for _, candidate in heapq.nlargest(self.max_fuzzy_words, similar)]
+
+
+    def _word_matches(self, word: str) -> Set[int]:
+        '''
+        Returns products with a word starting with the given word, or with a similar word if there is none.
+        Words shorter than min_prefix_length only match whole words. Numbers (set numbers, EANs) are not corrected.
+        '''
+        if len(word) < self.min_prefix_length:
+            return set(self._words.get(word, ()))
+        matches: Set[int] = set()
+        index = bisect.bisect_left(self._vocabulary, word)
+        while index < len(self._vocabulary) and self._vocabulary[index].startswith(word):
+            matches |= self._words[self._vocabulary[index]]
+            index += 1
+        if not matches and not word.isdigit():
+            for similar in self._similar_words(word):
+                matches |= self._words[similar]
+        return matches
+
+
+    def search(self, query: str, k: int = 10, manufacturer: Optional[str] = None) -> List[Dict[str, Any]]:
+        '''
+        Returns the top k documents for a query, best match first. Within a tier, lower IDs come first.
+
+        Args:
+            query: Search text, a manufacturer_id or an EAN
+            k: Max number of results
+            manufacturer: Optional manufacturer to restrict results to
+        '''
+        text = normalize(query)
+        if not text:
+            return []
+        words = list(dict.fromkeys(text.split()))
+        results: List[int] = []
+        seen: Set[int] = set()
+
+        def allowed(product_id: int) -> bool:
+            return not manufacturer or (self.documents[product_id].get('manufacturer') or '').lower() == manufacturer.lower()
+
+        def add_tier(candidates: Iterable[int]):
+            if manufacturer:
+                candidates = [product_id for product_id in candidates if product_id not in seen and allowed(product_id)]
+            elif seen:
+                # at most len(seen) of the smallest candidates are already in the results
+                candidates = [product_id for product_id in heapq.nsmallest(k - len(results) + len(seen), candidates) if product_id not in seen]
+            for product_id in heapq.nsmallest(k - len(results), candidates):
+                seen.add(product_id)
+                results.append(product_id)
+
+        with self._lock:
+            add_tier(self._identifiers.get(text.replace(' ', ''), ()))
+            exact = [self._words.get(word, set()) for word in words]
+            if len(results) < k and all(exact):
+                add_tier(set.intersection(*sorted(exact, key=len)))
+            matches = sorted((self._word_matches(word) for word in words), key=len)
+            if len(results) < k and matches and all(matches):
+                add_tier(set.intersection(*matches))
+            partial = [word_matches for word_matches in matches if word_matches]
+            if len(results) < k and len(matches) > 1 and len(partial) == 1:
+                add_tier(partial[0])
+            elif len(results) < k and len(matches) > 1:
+                # partial matches, products matching more words first
+                counts = Counter()
+                for word_matches in partial:
+                    counts.update(word_matches)
+                for number in range(len(partial) - 1 if len(partial) == len(matches) else len(partial), 0, -1):
+                    if len(results) >= k:
+                        break
+                    add_tier(product_id for product_id, count in counts.items() if count == number)
+            return [self.documents[product_id] for product_id in results]
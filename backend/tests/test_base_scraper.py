@@ -0,0 +1,103 @@
+from typing import Any, Dict, List, Optional
+from scraping.base_scraper import BaseScraper
+from scraping.fake_driver import FakeDriver
+from shared.schemas import RetailerConfig, ProductSchema, PriceSchema
+import threading
+
+
+BASE_URL = 'https://shop.example.com'
+
+
+def product_url(product: ProductSchema) -> str:
+    return f'{BASE_URL}/product/{product.manufacturer_id}'
+
+
+class FakeScraper(BaseScraper):
+    '''
+    Opens the product page with the driver and reads the price from its source. Products in fail_on raise an error.
+    '''
+    def __init__(self, retailer_config: RetailerConfig, drivers: List[FakeDriver], fail_on: Optional[set] = None, **kwargs):
+        self.drivers = drivers
+        self.fail_on = fail_on or set()
+        self.threads: Dict[str, set] = {}
+        super().__init__(retailer_config, **kwargs)
+
+
+    def scrape_product_ui(self, driver: FakeDriver, product: ProductSchema) -> Optional[PriceSchema]:
+        self.threads.setdefault(threading.current_thread().name, set()).add(product.id)
+        if product.manufacturer_id in self.fail_on:
+            raise ValueError('Price element not found')
+        driver.get(product_url(product))
+        return self._parse_price_schema(product, {'html': driver.page_source})
+
+
+    def _parse_price_schema(self, product: ProductSchema, data: Dict[str, Any]) -> Optional[PriceSchema]:
+        if not data['html']:
+            return None
+        return PriceSchema(product_id=product.id, retailer_id=1, price=float(data['html']), in_stock=True, url=product_url(product))
+
+
+def make_products(count: int) -> List[ProductSchema]:
+    return [ProductSchema(id=i, manufacturer_id=str(1000 + i), name=f'Set {i}', manufacturer='LEGO') for i in range(1, count + 1)]
+
+
+def make_scraper(products: List[ProductSchema], crash_on: Optional[set] = None, fail_on: Optional[set] = None, **config) -> FakeScraper:
+    pages = {product_url(product): str(10.0 + product.id) for product in products}
+    drivers: List[FakeDriver] = []
+    lock = threading.Lock()
+
+    def factory() -> FakeDriver:
+        driver = FakeDriver(pages, crash_on=crash_on)
+        with lock:
+            drivers.append(driver)
+        return driver
+
+    retailer_config = RetailerConfig(id=1, base_url=BASE_URL, scraping_method='ui', **config)
+    return FakeScraper(retailer_config, drivers, fail_on=fail_on, driver_factory=factory)
+
+
+def test_run_shards_products_across_workers():
+    products = make_products(10)
+    scraper = make_scraper(products, concurrency=3)
+
+    results = scraper.run(products)
+
+    assert sorted(result.product_id for result in results) == list(range(1, 11))
+    assert len(scraper.drivers) == 3
+    assert sorted(len(driver.visited) for driver in scraper.drivers) == [3, 3, 4]
+    visited = [url for driver in scraper.drivers for url in driver.visited]
+    assert len(visited) == len(set(visited)) == 10
+    assert all(driver.quit_called for driver in scraper.drivers)
+
+
+def test_run_recycles_driver_after_pages():
+    products = make_products(7)
+    scraper = make_scraper(products, driver_recycle_after=3)
+
+    results = scraper.run(products)
+
+    assert len(results) == 7
+    assert [len(driver.visited) for driver in scraper.drivers] == [3, 3, 1]
+    assert all(driver.quit_called for driver in scraper.drivers)
+
+
+def test_run_restarts_crashed_driver():
+    products = make_products(5)
+    scraper = make_scraper(products, crash_on={product_url(products[1])})
+
+    results = scraper.run(products)
+
+    assert sorted(result.product_id for result in results) == [1, 3, 4, 5]
+    assert len(scraper.drivers) == 2
+    assert scraper.drivers[0].crashed
+    assert scraper.drivers[1].visited == [product_url(product) for product in products[2:]]
+
+
+def test_run_isolates_errors_per_product():
+    products = make_products(4)
+    scraper = make_scraper(products, fail_on={products[0].manufacturer_id, products[2].manufacturer_id})
+
+    results = scraper.run(products)
+
+    assert sorted(result.product_id for result in results) == [2, 4]
+    assert len(scraper.drivers) == 1 # the driver is still alive, it is not replaced
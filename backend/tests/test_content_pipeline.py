@@ -0,0 +1,72 @@
+from typing import Any, Dict, List
+from shared.content_pipeline import ContentPipeline, StubContentGenerator
+from shared.db.database import Database
+from shared.db.models import Product, ProductContent
+from shared.schemas import ProductSchema
+import pytest # type: ignore
+
+
+class CrashingGenerator(StubContentGenerator):
+    '''
+    StubContentGenerator that records its batches, skips products in fail_on and raises on batch crash_on_batch.
+    '''
+    def __init__(self, fail_on: set = frozenset(), crash_on_batch: int = 0):
+        super().__init__()
+        self.fail_on = fail_on
+        self.crash_on_batch = crash_on_batch
+        self.batches: List[List[int]] = []
+
+
+    def generate(self, products: List[ProductSchema]) -> Dict[int, Any]:
+        self.batches.append([product.id for product in products])
+        if len(self.batches) == self.crash_on_batch:
+            raise RuntimeError('Generator crashed')
+        return {product_id: content for product_id, content in super().generate(products).items() if product_id not in self.fail_on}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch) -> Database:
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "content.db"}')
+    db = Database(instrument=False)
+    db.init_db()
+    with db.get_session() as session:
+        session.add_all([Product(id=product_id, name=f'Set {product_id}', manufacturer='LEGO') for product_id in range(1, 11)])
+    return db
+
+
+def content_ids(db: Database) -> List[int]:
+    with db.get_session() as session:
+        return sorted(product_id for (product_id,) in session.query(ProductContent.product_id).filter(ProductContent.content_type == 'stub'))
+
+
+def test_run_generates_stub_content_in_batches(db):
+    generator = CrashingGenerator(fail_on={4})
+
+    stats = ContentPipeline(db, generator, batch_size=3).run()
+
+    assert stats == {'processed': 9, 'failed': 1, 'batches': 4}
+    assert generator.batches == [[1, 2, 3], [4, 5, 6], [7, 8, 9], [10]]
+    assert content_ids(db) == [1, 2, 3, 5, 6, 7, 8, 9, 10]
+
+
+def test_run_resumes_after_checkpoint(db):
+    with pytest.raises(RuntimeError):
+        ContentPipeline(db, CrashingGenerator(crash_on_batch=3), batch_size=3).run()
+    assert content_ids(db) == [1, 2, 3, 4, 5, 6]
+
+    generator = CrashingGenerator()
+    stats = ContentPipeline(db, generator, batch_size=3).run()
+
+    assert generator.batches == [[7, 8, 9], [10]]
+    assert stats == {'processed': 4, 'failed': 0, 'batches': 2}
+    assert content_ids(db) == list(range(1, 11))
+
+
+def test_restart_retries_failed_products(db):
+    ContentPipeline(db, CrashingGenerator(fail_on={2, 5}), batch_size=3).run()
+
+    generator = CrashingGenerator()
+    stats = ContentPipeline(db, generator, batch_size=3).run(restart=True)
+
+    assert generator.batches == [[2, 5]]
+    assert stats == {'processed': 2, 'failed': 0, 'batches': 1}
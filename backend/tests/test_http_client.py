@@ -0,0 +1,144 @@
+from typing import Any, Dict, List, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from scraping.base_scraper import BaseScraper
+from scraping.driver_pool import DriverPool, DriverKey
+from scraping.fake_driver import FakeDriver
+from scraping.http_client import HttpClient
+from shared.schemas import RetailerConfig, ProductSchema, PriceSchema
+import gzip, json, re, threading
+import pytest # type: ignore
+
+
+class ShopHandler(BaseHTTPRequestHandler):
+    '''
+    Serves /products/<id>.json with an ETag, gzipped if requested. Products with an ID of 500 and above answer
+    with 500, /always-304 answers every conditional request with 304.
+    '''
+    protocol_version = 'HTTP/1.1' # keep-alive
+
+    def do_GET(self):
+        self.server.requests.append({'path': self.path, 'client': self.client_address, 'headers': dict(self.headers)})
+        if self.path == '/always-304' and self.headers.get('If-None-Match'):
+            return self._send(304)
+        match = re.fullmatch(r'/products/(\d+)\.json', self.path)
+        if self.path != '/always-304' and not match:
+            return self._send(404)
+        if match and int(match.group(1)) >= 500:
+            return self._send(500)
+        body = json.dumps({'price': 10.0 + int(match.group(1)) if match else 1.0}).encode()
+        etag = f'"{hash(body)}"'
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, headers={'ETag': etag})
+        headers = {'ETag': etag, 'Content-Type': 'application/json'}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        self._send(200, body, headers)
+
+
+    def _send(self, status: int, body: bytes = b'', headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), ShopHandler)
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def base_url(server) -> str:
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def test_get_reuses_connection(server):
+    client = HttpClient(max_connections_per_host=1, retries=0)
+
+    for product_id in range(1, 4):
+        client.get(f'{base_url(server)}/products/{product_id}.json')
+
+    assert len({request['client'] for request in server.requests}) == 1
+
+
+def test_get_decodes_gzip(server):
+    client = HttpClient(retries=0)
+
+    assert client.get_json(f'{base_url(server)}/products/1.json') == {'price': 11.0}
+    assert 'gzip' in server.requests[0]['headers']['Accept-Encoding']
+
+
+def test_get_revalidates_with_etag(server):
+    client = HttpClient(retries=0)
+    url = f'{base_url(server)}/products/2.json'
+
+    first = client.get(url)
+    second = client.get(url)
+
+    assert first == second
+    assert 'If-None-Match' in server.requests[1]['headers']
+    assert client.stats == {'requests': 2, 'not_modified': 1}
+
+
+def test_get_retries_not_modified_without_cached_body(server):
+    client = HttpClient(retries=0)
+
+    body = client.get(f'{base_url(server)}/always-304', headers={'If-None-Match': '"stale"'})
+
+    assert json.loads(body) == {'price': 1.0}
+    assert 'If-None-Match' not in server.requests[1]['headers']
+
+
+def test_validators_are_bounded(server):
+    client = HttpClient(retries=0, max_cached_urls=2)
+
+    for product_id in range(1, 5):
+        client.get(f'{base_url(server)}/products/{product_id}.json')
+
+    assert list(client._validators) == [f'{base_url(server)}/products/{product_id}.json' for product_id in (3, 4)]
+
+
+class ApiScraper(BaseScraper):
+    def get_product_url(self, product: ProductSchema) -> Optional[str]:
+        return f'{self.retailer_config.base_url}/products/{product.id}.json'
+
+
+    def scrape_product_ui(self, driver: FakeDriver, product: ProductSchema) -> Optional[PriceSchema]:
+        driver.get(self.get_product_url(product))
+        return self._parse_price_schema(product, {'price': 1.0})
+
+
+    def _parse_price_schema(self, product: ProductSchema, data: Dict[str, Any]) -> PriceSchema:
+        return PriceSchema(product_id=product.id, retailer_id=1, price=data['price'], in_stock=True, url=self.get_product_url(product))
+
+
+def test_run_falls_back_to_driver_for_failed_urls(server):
+    products = [ProductSchema(id=product_id, manufacturer_id=str(product_id), name=f'Set {product_id}') for product_id in (1, 2, 500)]
+    drivers: List[FakeDriver] = []
+
+    def factory(key: DriverKey) -> FakeDriver:
+        drivers.append(FakeDriver())
+        return drivers[-1]
+
+    # default selenium_settings (uc mode), which cannot capture API requests but can scrape the fallback products
+    retailer_config = RetailerConfig(id=1, base_url=base_url(server), scraping_method='api', http_settings={'workers': 2})
+    scraper = ApiScraper(retailer_config, driver_pool=DriverPool(factory, max_memory_mb=None))
+
+    results = {result.product_id: result.price for result in scraper.run(products)}
+
+    assert results == {1: 11.0, 2: 12.0, 500: 1.0}
+    assert len(drivers) == 1
+    assert drivers[0].visited[0] == f'{base_url(server)}/products/500.json' # then about:blank when the pool resets it
@@ -0,0 +1,122 @@
+'''
+Tests for the scrape_jobs queue on SQLite. SQLite has no FOR UPDATE SKIP LOCKED and serializes writers,
+so these tests cover the claim, lease and retry logic, not concurrent claims on Postgres.
+'''
+from typing import List, Set
+from scraping.job_worker import ScrapeWorker
+from shared.db.database import Database
+from shared.db.models import Product, Retailer, ScrapeJob
+from shared.db.services.scrape_job_service import ScrapeJobService
+from shared.schemas import PriceSchema, ProductSchema, RetailerConfig
+import pytest # type: ignore
+
+
+class EmptyScraper:
+    '''
+    Scraper that finds no prices, except that the products in skipped_product_ids count as skipped like in sitemap mode.
+    '''
+    def __init__(self, retailer_config: RetailerConfig, skipped_product_ids: Set[int] = frozenset(), error: str = ''):
+        self.skipped_product_ids = set(skipped_product_ids)
+        self.error = error
+
+
+    def run(self, products: List[ProductSchema]) -> List[PriceSchema]:
+        if self.error:
+            raise RuntimeError(self.error)
+        return []
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch) -> Database:
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "jobs.db"}')
+    db = Database(instrument=False)
+    db.init_db()
+    with db.get_session() as session:
+        session.add(Retailer(
+            id=1,
+            name='Shop',
+            base_url='https://shop.example',
+            scraping_config={'base_url': 'https://shop.example', 'scraping_method': 'ui'},
+            scrape_intervals={},
+            excluded_brands=[]
+        ))
+        session.add_all([Product(id=product_id, name=f'Set {product_id}', manufacturer='LEGO') for product_id in range(1, 7)])
+        session.flush()
+        ScrapeJobService(session).enqueue([(product_id, 1, float(product_id)) for product_id in range(1, 7)])
+    return db
+
+
+def jobs_by_product(db: Database) -> dict:
+    with db.get_session() as session:
+        return {job.product_id: (job.status, job.attempts, job.leased_by) for job in session.query(ScrapeJob)}
+
+
+def test_claims_are_exclusive(db):
+    with db.get_session() as session:
+        service = ScrapeJobService(session)
+        first = service.claim(1, 'worker-a', 4)
+        second = service.claim(1, 'worker-b', 4)
+        third = service.claim(1, 'worker-c', 4)
+    assert sorted(job['product_id'] for job in first) == [3, 4, 5, 6] # the highest priorities
+    assert sorted(job['product_id'] for job in second) == [1, 2]
+    assert third == []
+    assert {job['id'] for job in first}.isdisjoint(job['id'] for job in second)
+    assert {leased_by for _, _, leased_by in jobs_by_product(db).values()} == {'worker-a', 'worker-b'}
+
+
+def test_expired_lease_is_claimed_again(db):
+    with db.get_session() as session:
+        service = ScrapeJobService(session)
+        expired = service.claim(1, 'worker-a', 1, lease_seconds=-1)
+        assert service.expire_leases() == 1
+        reclaimed = service.claim(1, 'worker-b', 1)
+        assert reclaimed[0]['id'] == expired[0]['id']
+        assert reclaimed[0]['attempts'] == 2
+        # the crashed worker cannot extend or finish the job anymore
+        assert service.heartbeat([expired[0]['id']], 'worker-a') == 0
+        assert service.complete([expired[0]['id']], 'worker-a') == 0
+        assert service.heartbeat([expired[0]['id']], 'worker-b') == 1
+    assert jobs_by_product(db)[6] == ('leased', 2, 'worker-b')
+
+
+def test_expired_lease_fails_after_max_attempts(db):
+    with db.get_session() as session:
+        service = ScrapeJobService(session)
+        for _ in range(2):
+            service.claim(1, 'worker-a', 1, lease_seconds=-1)
+            service.expire_leases(max_attempts=2)
+        assert service.get_stats(1) == {'failed': 1, 'pending': 5}
+
+
+def test_worker_retries_missing_prices_until_max_attempts(db):
+    worker = ScrapeWorker(db, 1, EmptyScraper, 'worker-a', batch_size=6, max_attempts=3, retry_after=0)
+    for attempt in range(1, 4):
+        stats = worker.run_once()
+        assert stats['claimed'] == 6 and stats['retried'] == 6 and stats['completed'] == 0
+        expected = 'failed' if attempt == 3 else 'pending'
+        assert set(jobs_by_product(db).values()) == {(expected, attempt, None)}
+    assert worker.run_once() == {'claimed': 0}
+    with db.get_session() as session:
+        assert session.query(ScrapeJob.last_error).distinct().all() == [('No price scraped',)]
+
+
+def test_worker_waits_retry_after_before_retrying(db):
+    worker = ScrapeWorker(db, 1, EmptyScraper, 'worker-a', batch_size=6, retry_after=600)
+    assert worker.run_once()['retried'] == 6
+    assert worker.run_once() == {'claimed': 0}
+
+
+def test_worker_fails_batch_when_scraper_raises(db):
+    worker = ScrapeWorker(db, 1, lambda config: EmptyScraper(config, error='Browser crashed'), 'worker-a', batch_size=2, retry_after=0)
+    assert worker.run_once() == {'claimed': 2, 'completed': 0, 'retried': 2}
+    with db.get_session() as session:
+        assert session.query(ScrapeJob.last_error).filter(ScrapeJob.product_id.in_([5, 6])).distinct().all() == [('Browser crashed',)]
+
+
+def test_worker_completes_skipped_products(db):
+    worker = ScrapeWorker(db, 1, lambda config: EmptyScraper(config, skipped_product_ids={5, 6}), 'worker-a', batch_size=4)
+    stats = worker.run_once()
+    assert stats['claimed'] == 4 and stats['completed'] == 2 and stats['skipped'] == 2 and stats['retried'] == 2
+    jobs = jobs_by_product(db)
+    assert jobs[5][0] == jobs[6][0] == 'done'
+    assert jobs[3][0] == jobs[4][0] == 'pending'
@@ -0,0 +1,86 @@
+from typing import Any, Dict, List
+from shared.search_index import ProductSearchIndex
+import pytest # type: ignore
+
+
+DOCUMENTS = [
+    {'id': 1, 'manufacturer': 'LEGO', 'name': 'Millennium Falcon', 'manufacturer_id': '75192', 'ean': '5702015869935'},
+    {'id': 2, 'manufacturer': 'LEGO', 'name': 'Falcon Fighter', 'manufacturer_id': '75300'},
+    {'id': 3, 'manufacturer': 'LEGO', 'name': 'Millennium Falcon Microfighter', 'manufacturer_id': '75295'},
+    {'id': 4, 'manufacturer': 'Cobi', 'name': 'Falcon Ship', 'manufacturer_id': '2410'},
+    {'id': 5, 'manufacturer': 'LEGO', 'name': 'Hogwarts Castle', 'manufacturer_id': '71043'},
+    {'id': 6, 'manufacturer': 'LEGO', 'name': 'Falconer Tower', 'manufacturer_id': '10305'},
+]
+
+
+@pytest.fixture
+def index() -> ProductSearchIndex:
+    index = ProductSearchIndex()
+    index.upsert(DOCUMENTS)
+    return index
+
+
+def ids(results: List[Dict[str, Any]]) -> List[int]:
+    return [document['id'] for document in results]
+
+
+def test_identifier_match_comes_first(index):
+    assert ids(index.search('75192'))[0] == 1
+    assert ids(index.search('5702015869935')) == [1]
+
+
+def test_whole_words_before_prefixes(index):
+    # 'falcon' is a whole word of 1-4, only a prefix of 'falconer' in 6
+    assert ids(index.search('falcon')) == [1, 2, 3, 4, 6]
+
+
+def test_all_words_before_partial_matches(index):
+    assert ids(index.search('millennium falcon')) == [1, 3, 2, 4, 6]
+    assert ids(index.search('millennium falcon', k=2)) == [1, 3]
+
+
+def test_partial_matches_with_more_words_first(index):
+    assert ids(index.search('falcon microfighter hogwarts')) == [3, 1, 2, 4, 5, 6]
+
+
+def test_typo_correction(index):
+    assert ids(index.search('hogwrats')) == [5]
+    assert ids(index.search('milenium')) == [1, 3]
+
+
+def test_numbers_are_not_corrected(index):
+    assert index.search('75999') == []
+
+
+def test_short_words_only_match_whole_words(index):
+    index.upsert([{'id': 7, 'manufacturer': 'LEGO', 'name': 'R2 D2', 'manufacturer_id': '75379'}])
+    assert ids(index.search('7')) == []
+    assert ids(index.search('75')) == []
+    assert ids(index.search('752')) == [3]
+    assert ids(index.search('r2')) == [7]
+    assert ids(index.search('fa')) == []
+
+
+def test_manufacturer_filter(index):
+    assert ids(index.search('falcon', manufacturer='cobi')) == [4]
+    assert ids(index.search('falcon', manufacturer='LEGO')) == [1, 2, 3, 6]
+
+
+def test_upsert_replaces_document(index):
+    index.upsert([{'id': 5, 'manufacturer': 'LEGO', 'name': 'Diagon Alley', 'manufacturer_id': '75978'}])
+    assert index.search('hogwarts') == []
+    assert ids(index.search('diagon')) == [5]
+    assert index.search('71043') == []
+
+
+def test_remove_drops_words_and_identifiers(index):
+    index.remove([1, 3])
+    assert ids(index.search('millennium')) == []
+    assert index.search('5702015869935') == []
+    assert 'millennium' not in index._vocabulary
+
+
+def test_retain(index):
+    assert index.retain({1, 2}) == 4
+    assert sorted(index.documents) == [1, 2]
+    assert ids(index.search('falcon')) == [1, 2]
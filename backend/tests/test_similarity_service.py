@@ -0,0 +1,82 @@
+from typing import List
+from shared.db.database import Database
+from shared.db.models import Product, Prices, Retailer, ProductContent
+from shared.db.services.similarity_service import SimilarityService, cosine_top_k
+import numpy as np
+import pytest # type: ignore
+
+
+DIMENSIONS = 384
+
+
+def brute_force(target: np.ndarray, matrix: np.ndarray, k: int) -> List[int]:
+    '''
+    Ranks all rows by cosine similarity with a plain Python sort.
+    '''
+    similarities = [float(row @ target / (np.linalg.norm(row) * np.linalg.norm(target))) for row in matrix]
+    return sorted(range(len(matrix)), key=lambda index: -similarities[index])[:k]
+
+
+@pytest.fixture
+def embeddings() -> np.ndarray:
+    return np.random.default_rng(7).normal(size=(50, DIMENSIONS)).astype(np.float32)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch, embeddings) -> Database:
+    '''
+    SQLite database with 50 products and their embeddings, so SimilarityService uses the NumPy fallback.
+    Odd products are by Cobi, products 1 to 10 are in stock.
+    '''
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "similarity.db"}')
+    db = Database(instrument=False)
+    db.init_db()
+    with db.get_session() as session:
+        session.add(Retailer(id=1, name='Shop'))
+        for product_id, embedding in enumerate(embeddings, start=1):
+            session.add(Product(id=product_id, name=f'Set {product_id}', manufacturer='Cobi' if product_id % 2 else 'LEGO'))
+            session.add(ProductContent(
+                product_id=product_id,
+                content_type='ai_description',
+                content={'text': f'Set {product_id}'},
+                embedding=embedding.tolist()
+            ))
+        session.flush()
+        session.add_all([Prices(product_id=product_id, retailer_id=1, price=10, in_stock=True) for product_id in range(1, 11)])
+    return db
+
+
+def test_cosine_top_k_matches_brute_force(embeddings):
+    target = embeddings[0] + embeddings[1]
+    top, similarities = cosine_top_k(target, embeddings, 10)
+    assert top.tolist() == brute_force(target, embeddings, 10)
+    assert np.all(np.diff(similarities) <= 0)
+
+
+def test_cosine_top_k_edge_cases(embeddings):
+    top, _ = cosine_top_k(embeddings[0], embeddings[:3], 10)
+    assert sorted(top.tolist()) == [0, 1, 2]
+    top, similarities = cosine_top_k(embeddings[0], np.zeros((2, DIMENSIONS), dtype=np.float32), 1)
+    assert similarities.tolist() == [0]
+    top, _ = cosine_top_k(embeddings[0], np.empty((0, DIMENSIONS), dtype=np.float32), 5)
+    assert top.tolist() == []
+
+
+def test_similar_products_exclude_product_and_match_brute_force(db, embeddings):
+    with db.get_session() as session:
+        similar = SimilarityService(session).get_similar_products(5, k=5)
+    others = [index for index in range(len(embeddings)) if index != 4]
+    expected = [others[index] + 1 for index in brute_force(embeddings[4], embeddings[others], 5)]
+    assert [product.id for product in similar] == expected
+    assert all(a.similarity >= b.similarity for a, b in zip(similar, similar[1:]))
+
+
+def test_similar_products_filters(db, embeddings):
+    with db.get_session() as session:
+        service = SimilarityService(session)
+        by_manufacturer = service.get_similar_products(2, k=50, manufacturer='LEGO')
+        in_stock = service.get_similar_products(2, k=50, in_stock=True)
+        missing = service.get_similar_products(999)
+    assert sorted(product.id for product in by_manufacturer) == list(range(4, 51, 2))
+    assert sorted(product.id for product in in_stock) == [1, *range(3, 11)]
+    assert missing == []
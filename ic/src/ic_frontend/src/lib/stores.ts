@@ -1,8 +1,6 @@
 import { writable, readable } from "svelte/store";
-import type { ProductAutocomplete } from "./types/types";
 
 
-export const autocompleteProducts = writable<ProductAutocomplete[]>([]);
 export const retailersStore = writable([]);
 
 export const manufacturers = readable({